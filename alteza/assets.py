@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Tuple
+
+from .cache import DiskCache, hashFile
+from .fs import DirNode, FileNode, PageNode
+from .util import StopWatch
+
+# The number of hex digits of an asset's content hash that are put in its name (e.g. `squirrel.3f9a1c2b.png`):
+fingerprintLength: int = 8
+
+
+class AssetHashCache(DiskCache):
+	"""
+	Content hashes of static assets, keyed by full path, and valid for as long as the asset's size & modification
+	time are unchanged (so that unchanged assets are never re-read). Entries are kept in memory, and if a cache
+	directory is given, they are also saved (as a single entry) for later builds.
+	"""
+
+	entryKey: str = 'hashes'
+
+	def __init__(self, cacheDir: Optional[str]) -> None:
+		super().__init__(cacheDir, 'assets')
+		stored = self.get(self.entryKey)
+		self.memory: Dict[str, Tuple[int, Optional[float], str]] = stored if isinstance(stored, dict) else {}
+		self.modified: bool = False
+
+	def hash(self, fileNode: FileNode) -> str:
+		entry = self.memory.get(fileNode.fullPath)
+		if entry is not None and entry[0] == fileNode.size and entry[1] == fileNode.mtime:
+			self.hits += 1
+			return entry[2]
+		self.misses += 1
+		digest = hashFile(fileNode.absoluteFilePath)
+		self.memory[fileNode.fullPath] = (fileNode.size, fileNode.mtime, digest)
+		self.modified = True
+		return digest
+
+	def save(self) -> None:
+		if self.persistent and self.modified:
+			self.put(self.entryKey, self.memory)
+			self.modified = False
+
+
+def isStaticAsset(fileNode: FileNode, configFileName: str) -> bool:
+	return not isinstance(fileNode, PageNode) and fileNode.fileName != configFileName
+
+
+def fingerprintAssets(rootDir: DirNode, hashCache: AssetHashCache, configFileName: str) -> str:
+	"""
+	Give every static asset a content-hashed name (e.g. `squirrel.3f9a1c2b.png`), and point each asset at a
+	canonical asset: the first (by full path) of the assets with identical content, which is the only one of them
+	that is published. Returns a summary of what was done.
+	"""
+	with StopWatch() as sw:
+		assets: List[FileNode] = []
+		worklist: List[DirNode] = [rootDir]
+		while worklist:
+			dirNode = worklist.pop()
+			assets.extend(f for f in dirNode.files if isStaticAsset(f, configFileName))
+			worklist.extend(dirNode.subDirs)
+		assets.sort(key=lambda asset: asset.pathParts)
+
+		hitsBefore, missesBefore = hashCache.hits, hashCache.misses
+		canonicalAssets: Dict[str, FileNode] = {}
+		for asset in assets:
+			digest = hashCache.hash(asset)
+			canonicalAsset = canonicalAssets.setdefault(digest, asset)
+			asset.canonicalAsset = canonicalAsset
+			if canonicalAsset is asset:
+				asset.fingerprintedName = f'{asset.baseName}.{digest[:fingerprintLength]}{asset.extension}'
+				asset.linksTo = []
+			else:
+				asset.fingerprintedName = None
+				asset.linksTo = [canonicalAsset]  # So that a duplicate being public publishes its canonical asset.
+		hashCache.save()
+
+	return (
+		f'Fingerprinted {len(assets)} assets ({len(assets) - len(canonicalAssets)} of them duplicates)'
+		f' in {sw.t / 10**6:.2f} ms, reading {hashCache.misses - missesBefore} of them'
+		f' ({hashCache.hits - hitsBefore} hashes were unchanged).'
+	)
@@ -0,0 +1,119 @@
+import importlib.util
+import marshal
+import os
+import sys
+import types
+from typing import Dict, Optional, Set, Tuple
+
+from .cache import DiskCache, hashText
+
+
+class LocatedExpression(str):
+	"""An expression (of a PyPage block tag, e.g. `{% if ... %}`), along with the file & line it comes from."""
+
+	fileName: str
+	lineNumber: int
+
+	def __new__(cls, expression: str, fileName: str, lineNumber: int) -> 'LocatedExpression':
+		located = super().__new__(cls, expression)
+		located.fileName = fileName
+		located.lineNumber = lineNumber
+		return located
+
+
+# Compiled code is keyed (within the bundle of the file it is from) by its source, compilation mode, and line:
+CodeKey = Tuple[str, str, int]
+
+
+class CodeCache(DiskCache):
+	"""
+	Compiled code (of config files, and of the code in pages & templates), kept in memory (so that it is reused
+	across builds in --watch mode), and if a cache directory is given, also stored there as marshalled bytecode. Like
+	in `__pycache__`, the code of each file is stored as a single bundle (which is loaded when code from the file is
+	first needed), keyed by the file's path and the Python version (since bytecode is specific to it). Code is compiled
+	as being at its line in the file, so that tracebacks point at the original file & line.
+	"""
+
+	def __init__(self, cacheDir: Optional[str]) -> None:
+		super().__init__(cacheDir, 'bytecode')
+		self.bundles: Dict[str, Dict[CodeKey, types.CodeType]] = {}  # Compiled code, by file name.
+		self.used: Dict[str, Set[CodeKey]] = {}  # The code used in the current build, by file name.
+		self.compiledFileNames: Set[str] = set()  # The files that code was compiled for in the current build.
+
+	def begin(self) -> None:
+		"""Start a new build."""
+		self.hits, self.misses = 0, 0
+		self.used, self.compiledFileNames = {}, set()
+
+	def finish(self, completeBuild: bool) -> None:
+		"""
+		Finish a build. The bundles of files that code was compiled for are pruned to the code used in this build (so
+		that the code of earlier versions of files does not accumulate), and stored. After a complete build (rather than
+		an incremental one), the bundles of files that were not used at all are dropped from memory too.
+		"""
+		for fileName in self.compiledFileNames:
+			used = self.used[fileName]
+			bundle = {key: code for key, code in self.bundles[fileName].items() if key in used}
+			self.bundles[fileName] = bundle
+			if self.persistent:
+				self.store(fileName, bundle)
+		if completeBuild:
+			self.bundles = {fileName: self.bundles[fileName] for fileName in self.used}
+		self.compiledFileNames = set()
+
+	def exportBuild(self) -> bytes:
+		"""
+		The code used (and which files code was compiled for) in this build so far, to be merged into the cache of
+		another process with `mergeBuild`. (It is marshalled, since code objects cannot be pickled.)
+		"""
+		usedCode = {
+			fileName: {key: self.bundles[fileName][key] for key in keys} for fileName, keys in self.used.items()
+		}
+		return marshal.dumps((usedCode, list(self.compiledFileNames)))
+
+	def mergeBuild(self, data: bytes) -> None:
+		usedCode, compiledFileNames = marshal.loads(data)  # nosec B302 -- this comes from a forked worker process.
+		for fileName, code in usedCode.items():
+			self.bundles.setdefault(fileName, {}).update(code)
+			self.used.setdefault(fileName, set()).update(code)
+		self.compiledFileNames.update(compiledFileNames)
+
+	def bundlePath(self, fileName: str) -> str:
+		key = hashText(sys.implementation.cache_tag or sys.version, importlib.util.MAGIC_NUMBER.hex(), fileName)
+		return self.entryPath(key, '.marshal')
+
+	def load(self, fileName: str) -> Dict[CodeKey, types.CodeType]:
+		try:
+			with open(self.bundlePath(fileName), 'rb') as bundleFile:
+				# (Reading the file at once is much faster than having `marshal.load` read it piece by piece.)
+				bundle = marshal.loads(bundleFile.read())  # nosec B302 -- the cache directory is written only by Alteza itself.
+		except (OSError, EOFError, ValueError, TypeError):
+			return {}
+		return bundle if isinstance(bundle, dict) else {}
+
+	def store(self, fileName: str, bundle: Dict[CodeKey, types.CodeType]) -> None:
+		bundlePath = self.bundlePath(fileName)
+		os.makedirs(os.path.dirname(bundlePath), exist_ok=True)
+		tmpPath = f'{bundlePath}.{os.getpid()}.tmp'
+		with open(tmpPath, 'wb') as bundleFile:
+			bundleFile.write(marshal.dumps(bundle))
+		os.replace(tmpPath, bundlePath)
+
+	def compile(self, source: str, fileName: str, mode: str, lineNumber: int = 1) -> types.CodeType:
+		"""Compile `source` (in the given `mode`, like `compile` does), as being at `lineNumber` in `fileName`."""
+		if mode == 'eval':
+			source = source.lstrip(' \t')  # Like `eval` does.
+		bundle = self.bundles.get(fileName)
+		if bundle is None:
+			bundle = self.bundles[fileName] = self.load(fileName) if self.persistent else {}
+		key = (str(source), mode, lineNumber)
+		code = bundle.get(key)
+		if isinstance(code, types.CodeType):
+			self.hits += 1
+		else:
+			self.misses += 1
+			# The source is preceded by blank lines, so that its line numbers are those in the original file:
+			code = bundle[key] = compile('\n' * (lineNumber - 1) + source, fileName, mode, dont_inherit=True)
+			self.compiledFileNames.add(fileName)
+		self.used.setdefault(fileName, set()).add(key)
+		return code
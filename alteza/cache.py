@@ -0,0 +1,200 @@
+import datetime
+import hashlib
+import os
+import pickle
+import types
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pypage import pypage_version  # type: ignore
+
+from .util import AltezaException, packageVersion
+from .version import version as alteza_version
+
+# The name of this package (whose own functions are fingerprinted by name, see `fingerprint`):
+altezaPackage: str = __name__.partition('.')[0]
+
+
+def hashText(*parts: str) -> str:
+	digest = hashlib.sha256()
+	for part in parts:
+		digest.update(part.encode('utf-8'))
+		digest.update(b'\0')
+	return digest.hexdigest()
+
+
+def hashFile(filePath: str) -> str:
+	digest = hashlib.sha256()
+	with open(filePath, 'rb') as someFile:
+		for chunk in iter(lambda: someFile.read(1 << 16), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+# Values nested deeper than this are not fingerprinted (which also guards against cyclic values):
+maxFingerprintDepth: int = 32
+
+
+def fingerprint(value: Any, depth: int = 0) -> Optional[str]:
+	"""
+	Produce a string that identifies `value` across separate runs of Alteza, or `None` if `value` cannot be identified
+	by its contents (e.g. instances of arbitrary classes), in which case nothing that depends on it should be cached.
+	Unlike `repr`, this never includes memory addresses, so it is suitable for use in persistent cache keys.
+	"""
+	# pylint: disable=too-many-return-statements, too-many-branches
+	if depth > maxFingerprintDepth:
+		return None
+	if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+		return repr(value)
+	if isinstance(value, (datetime.date, datetime.time, datetime.timedelta, datetime.tzinfo)):
+		return repr(value)  # (This includes `datetime.datetime`, which is a subclass of `datetime.date`.)
+	if isinstance(value, (list, tuple)):
+		return fingerprintAll(f'{type(value).__name__}[', (fingerprint(v, depth + 1) for v in value), ']')
+	if isinstance(value, (set, frozenset)):
+		return fingerprintAll(f'{type(value).__name__}{{', (fingerprint(v, depth + 1) for v in value), '}', True)
+	if isinstance(value, dict):
+		items = ((fingerprint(k, depth + 1), fingerprint(v, depth + 1)) for k, v in value.items())
+		return fingerprintAll(
+			'dict{', (f'{k}:{v}' if k is not None and v is not None else None for k, v in items), '}', True
+		)
+	if isinstance(value, types.ModuleType):
+		return f'module:{value.__name__}'
+	if callable(value) and str(getattr(value, '__module__', None)).partition('.')[0] == altezaPackage:
+		# Alteza's own helpers (e.g. `link`) behave the same for a given version of Alteza:
+		return f'{altezaPackage}:{value.__qualname__}'
+	if isinstance(value, types.FunctionType):
+		# Besides its code, a function's behavior depends on the variables it closes over, and its default arguments:
+		try:
+			cells = [cell.cell_contents for cell in value.__closure__ or ()]
+		except ValueError:  # (A closed over variable that is not assigned yet.)
+			return None
+		return fingerprintAll(
+			f'function:{value.__qualname__}:',
+			(
+				fingerprint(part, depth + 1)
+				for part in (value.__code__, cells, value.__defaults__, value.__kwdefaults__)
+			),
+			'',
+		)
+	if isinstance(value, types.MethodType):
+		return fingerprintAll(
+			'method:', (fingerprint(value.__func__, depth + 1), fingerprint(value.__self__, depth + 1)), ''
+		)
+	if isinstance(value, types.CodeType):
+		return fingerprintAll(
+			'code:' + hashlib.sha256(value.co_code).hexdigest(), (fingerprint(value.co_consts, depth + 1),), ''
+		)
+	if isinstance(value, (type, types.BuiltinFunctionType)) and isinstance(
+		getattr(value, '__self__', None), (types.NoneType, types.ModuleType)
+	):
+		# Classes & built-in functions (e.g. `datetime.date` or `len`) are identified by their qualified names:
+		return f'{type(value).__name__}:{value.__module__}.{value.__qualname__}'
+	fullPath = getattr(value, 'fullPath', None)
+	if isinstance(fullPath, str):
+		# Nodes (e.g. `dir`) are identified by their paths. What is read from them is recorded as dependencies instead:
+		return f'{type(value).__name__}:{fullPath}'
+	return None
+
+
+def fingerprintAll(
+	prefix: str, fingerprints: Iterable[Optional[str]], suffix: str, unordered: bool = False
+) -> Optional[str]:
+	"""Join the fingerprints of the parts of a value, or return `None` if any of the parts has no fingerprint."""
+	parts: List[str] = []
+	for part in fingerprints:
+		if part is None:
+			return None
+		parts.append(part)
+	return prefix + ','.join(sorted(parts) if unordered else parts) + suffix
+
+
+class DiskCache:
+	"""
+	A persistent key-value store of pickled values, kept in a namespaced directory inside the cache directory.
+	Without a cache directory, the store is not persistent: nothing is stored in it, and nothing is found in it.
+	"""
+
+	def __init__(self, cacheDir: Optional[str], namespace: str) -> None:
+		self.persistent: bool = cacheDir is not None
+		self.path: Optional[str] = os.path.join(cacheDir, namespace) if cacheDir is not None else None
+		# Hits & misses are counted by users of the cache, since only they can tell if an entry is still valid:
+		self.hits: int = 0
+		self.misses: int = 0
+		if self.path is not None:
+			if os.path.isfile(self.path):
+				raise AltezaException(f'The cache path {self.path} is a file, not a directory.')
+			os.makedirs(self.path, exist_ok=True)
+
+	def entryPath(self, key: str, extension: str = '.pickle') -> str:
+		assert self.path is not None, 'A cache without a cache directory has no entries.'
+		return os.path.join(self.path, key[:2], key + extension)
+
+	def get(self, key: str) -> Optional[Any]:
+		if not self.persistent:
+			return None
+		entryPath = self.entryPath(key)
+		if not os.path.isfile(entryPath):
+			return None
+		try:
+			with open(entryPath, 'rb') as entryFile:
+				return pickle.load(entryFile)  # nosec B301 -- the cache directory is written only by Alteza itself.
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+			return None
+
+	def put(self, key: str, value: Any) -> bool:
+		"""Store `value` under `key`. Returns `False` (and stores nothing) if `value` cannot be pickled."""
+		if not self.persistent:
+			return True
+		try:
+			data = pickle.dumps(value)
+		except (pickle.PicklingError, TypeError, AttributeError):
+			return False
+		entryPath = self.entryPath(key)
+		os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+		tmpPath = f'{entryPath}.{os.getpid()}.tmp'
+		with open(tmpPath, 'wb') as entryFile:
+			entryFile.write(data)
+		os.replace(tmpPath, entryPath)
+		return True
+
+
+@dataclass
+class RenderedPage:
+	"""Everything recorded about a rendered page that is needed to skip rendering it in a later build."""
+
+	output: str
+	envDelta: Dict[str, Any]  # Variables defined by the page itself (including YAML front matter fields).
+	linksTo: List[str]  # Full paths of the files linked to from this page.
+	warning: Optional[str]
+	# Maps a dependency (a `file:` path or a `name:` lookup) to its fingerprint at the time of rendering:
+	dependencies: Dict[str, str]
+
+
+class RenderCache(DiskCache):
+	def __init__(self, cacheDir: str) -> None:
+		super().__init__(cacheDir, 'render')
+
+	def getPage(self, key: str, isUnchanged: Callable[[Dict[str, str]], bool]) -> Optional[RenderedPage]:
+		"""The render stored under `key`, if there is one, and if `isUnchanged` holds for its dependencies."""
+		renderedPage = self.get(key)
+		if not isinstance(renderedPage, RenderedPage) or not isUnchanged(renderedPage.dependencies):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return renderedPage
+
+	@staticmethod
+	def key(fullPath: str, source: str, env: Dict[str, Any], *extra: str) -> Optional[str]:
+		"""The key of a page's render, or `None` if the page's variables cannot be fingerprinted (see `fingerprint`)."""
+		envFingerprint = fingerprint(env)
+		if envFingerprint is None:
+			return None
+		return hashText(
+			alteza_version,
+			pypage_version,
+			packageVersion('Markdown'),
+			fullPath,
+			source,
+			envFingerprint,
+			*extra,
+		)
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import importlib.util
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union
+
+from .cache import DiskCache
+from .util import StopWatch
+
+if TYPE_CHECKING:
+	from .output import OutputWriter
+
+# Outputs with these extensions get precompressed copies (e.g. `index.html.gz`), for web servers to serve directly:
+compressibleExtensions: Tuple[str, ...] = ('.html', '.htm', '.css', '.js', '.mjs', '.json', '.svg', '.xml')
+
+gzipLevel: int = 9
+brotliQuality: int = 11
+
+
+def compressFile(
+	source: Union[str, bytes], cachePath: Optional[str], formats: Tuple[str, ...]
+) -> Tuple[Dict[str, bytes], List[str], int]:
+	"""
+	Compress `source` (the path of a file, or the content itself) into each of `formats`. If a `cachePath` is given,
+	compressed copies are reused from (or else, stored in) the cache directory there, keyed by the hash of the content.
+	Returns the compressed copies, the names of the cache entries used, and the number of copies that had to be
+	compressed (i.e. that were not in the cache already). This runs in a worker process.
+	"""
+	if isinstance(source, bytes):
+		data = source
+	else:
+		with open(source, 'rb') as srcFile:
+			data = srcFile.read()
+	digest = hashlib.sha256(data).hexdigest()
+	compressedCopies: Dict[str, bytes] = {}
+	entryNames: List[str] = []
+	compressedCount = 0
+	for compressionFormat in formats:
+		level = gzipLevel if compressionFormat == 'gz' else brotliQuality
+		entryName = os.path.join(digest[:2], f'{digest}-{level}.{compressionFormat}')
+		compressed = readCachedCopy(os.path.join(cachePath, entryName)) if cachePath is not None else None
+		if compressed is None:
+			if compressionFormat == 'gz':
+				compressed = gzip.compress(data, compresslevel=level, mtime=0)
+			else:
+				import brotli  # type: ignore # pylint: disable=import-outside-toplevel,import-error
+
+				compressed = brotli.compress(data, quality=level)
+			if cachePath is not None:
+				storeCachedCopy(os.path.join(cachePath, entryName), compressed)
+			compressedCount += 1
+		compressedCopies[compressionFormat] = compressed
+		entryNames.append(entryName)
+	return compressedCopies, entryNames, compressedCount
+
+
+def readCachedCopy(entryPath: str) -> Optional[bytes]:
+	try:
+		with open(entryPath, 'rb') as compressedFile:
+			return compressedFile.read()
+	except FileNotFoundError:
+		return None
+
+
+def storeCachedCopy(entryPath: str, compressed: bytes) -> None:
+	os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+	tmpPath = f'{entryPath}.{os.getpid()}.tmp'
+	with open(tmpPath, 'wb') as compressedFile:
+		compressedFile.write(compressed)
+	os.replace(tmpPath, entryPath)
+
+
+class Precompressor(DiskCache):  # pylint: disable=too-many-instance-attributes
+	"""
+	Writes gzip (and brotli, if it is installed) compressed copies of text outputs next to them, for web servers
+	(e.g. nginx with `gzip_static` & `brotli_static`) to serve as they are. Outputs are compressed in a pool of worker
+	processes while the site is being generated. If a cache directory is given, compressed copies are also stored
+	there, keyed by the hash of the output's content, so an output that is unchanged since a previous build is not
+	compressed again. (Copies that were not used by a build are deleted from the cache directory after it.)
+	"""
+
+	def __init__(self, cacheDir: Optional[str], jobs: int) -> None:
+		super().__init__(cacheDir, 'compressed')
+		self.formats: Tuple[str, ...] = ('gz', 'br') if importlib.util.find_spec('brotli') is not None else ('gz',)
+		self.jobs: Optional[int] = jobs if jobs > 0 else None
+		self.pool: Optional[ProcessPoolExecutor] = None
+		self.pending: List[Tuple[str, 'Future[Tuple[Dict[str, bytes], List[str], int]]']] = []
+		self.usedEntryNames: Set[str] = set()  # The cache entries used by this build.
+
+	@staticmethod
+	def isCompressible(relPath: str) -> bool:
+		return relPath.endswith(compressibleExtensions)
+
+	def submit(self, relPath: str, source: Union[str, bytes]) -> None:
+		"""Start compressing the output at `relPath`, given its absolute path (or its content), if it is compressible."""
+		if not self.isCompressible(relPath):
+			return
+		if self.pool is None:
+			self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+		self.pending.append((relPath, self.pool.submit(compressFile, source, self.path, self.formats)))
+
+	def shutdown(self) -> None:
+		if self.pool is not None:
+			self.pool.shutdown(cancel_futures=True)
+			self.pool = None
+
+	def prune(self) -> int:
+		"""Delete the compressed copies in the cache directory that were not used by this build."""
+		assert self.path is not None
+		prunedCount = 0
+		for subDir in os.scandir(self.path):
+			if not subDir.is_dir():
+				continue
+			for entry in os.scandir(subDir.path):
+				if os.path.join(subDir.name, entry.name) not in self.usedEntryNames:
+					os.remove(entry.path)
+					prunedCount += 1
+		return prunedCount
+
+	def finish(self, writer: 'OutputWriter') -> str:
+		"""Wait for all outputs to be compressed, write the compressed copies, and return a summary."""
+		compressedCount = 0
+		try:
+			with StopWatch() as sw:
+				for relPath, future in self.pending:
+					compressedCopies, entryNames, newlyCompressedCount = future.result()
+					compressedCount += newlyCompressedCount
+					self.usedEntryNames.update(entryNames)
+					for compressionFormat, compressed in compressedCopies.items():
+						writer.writeBytes(f'{relPath}.{compressionFormat}', compressed)
+		finally:
+			self.shutdown()
+		copyCount = len(self.pending) * len(self.formats)
+		self.pending = []
+		brotliNote = '' if 'br' in self.formats else ' (install `brotli` for .br copies too)'
+		cacheNote = ''
+		if self.persistent:
+			cacheNote = (
+				f', of which {copyCount - compressedCount} were reused from the cache'
+				f' ({self.prune()} unused copies were deleted from it)'
+			)
+		return (
+			f'Precompressed {copyCount} copies ({", ".join("." + f for f in self.formats)}) of outputs{brotliNote}'
+			f'{cacheNote}. Waited {sw.t / 10**6:.2f} ms for compression to finish.'
+		)
@@ -1,88 +1,202 @@
-import contextlib
-import itertools
 import json
 import os
 import sys
 import types
-from typing import List, Dict, Set, Any, Union, Optional, Generator, Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import List, Dict, Set, Any, Union, Optional, Callable, Tuple
 
 from tap import Tap
-import sh  # type: ignore
-from pypage import pypage  # type: ignore
 from colored import Fore, Style  # type: ignore
 
-from .fs import AltezaException, PublicNodeCounts, FsNode, FileNode, DirNode, PageNode, PyPageNode, Md, NonMd
+from .fs import (
+	AltezaException,
+	PublicNodeCounts,
+	FsNode,
+	FileNode,
+	DirNode,
+	PageNode,
+	PyPageNode,
+	Md,
+	NonMd,
+	getFileNodesByFullPath,
+)
 from .crawl import NameRegistry, CrawlResult, CrawlConfig, ProgressBar, pr
-from .util import StopWatch, MultiRunTimes
+from .util import StopWatch, MultiRunTimes, LazyModule, readfile, enterDir
+from .env import Env, getEnvDelta
+from .cache import RenderCache, RenderedPage
+from .assets import AssetHashCache, fingerprintAssets
+from .images import ResponsiveImage, ResponsiveImages, imageTag, isResizableImage
+from .minify import MinificationStats, minifyOutput
+from .deps import DependencyRecorder, recordingImports
+from .links import Linker
+from .mdpool import Conversion, MarkdownPool
+from .templates import TemplateCache, runPyPage
+from .bytecode import CodeCache
+from .highlight import HighlightCache, highlightingWith
+from .staging import Stager
+from .profiling import Profiler
+from .parallel import canFork, processDirsInParallel
+from .publicity import tracePublic
+
+# The `sh` helper available to pages (which is imported when a page first uses it):
+sh = LazyModule('sh')
 
 
 class Args(Tap):  # pyre-ignore[13]
 	content: str  # Directory to read the input content from.
-	output: str  # Directory to write the generated site to.
+	output: Optional[str] = None  # Directory to write the generated site to (required, unless using --serve).
+	archive: Optional[str] = None  # Archive (.zip, .tar, .tar.gz, .tar.zst, etc) to write the site into, instead.
 	clear_output_dir: bool = False  # Delete the output directory, if it already exists.
+	sync_output: bool = False  # Update the output directory in place, writing only changed files.
+	atomic_output: bool = False  # Write each build to a new directory, and atomically point a `current` symlink to it.
 	copy_assets: bool = False  # Copy static assets instead of symlinking to them.
 	seed: str = '{}'  # Seed JSON data to add to the initial root env.
 	watch: bool = False  # Watch for content changes, and rebuild.
+	serve: bool = False  # Serve the site from memory on a local server, reloading pages on changes (implies --watch).
+	host: str = '127.0.0.1'  # Host to serve the site on, with --serve.
+	port: int = 8000  # Port to serve the site on, with --serve.
 	ignore: List[str] = []  # Paths to completely ignore.
+	ignore_patterns: List[str] = []  # Gitignore-style patterns (e.g. `*.psd` or `drafts/`) of paths to ignore.
+	crawl_threads: int = 1  # Number of threads to crawl the content directory with.
 	config: str = '__config__.py'
+	cache: bool = False  # Reuse rendered pages from previous builds, when their inputs are unchanged.
+	cache_dir: str = '.alteza-cache'  # Directory to store persistent caches in.
+	jobs: int = 1  # Number of processes to use for processing sibling directories in parallel.
+	markdown_jobs: int = 0  # Number of processes to convert Markdown with, alongside PyPage processing (0 to disable).
+	profile: int = 0  # Show the N slowest pages (with a breakdown of their processing times) after the build.
+	profile_json: Optional[str] = None  # Write the processing times of every file to this JSON file.
+	pipeline_output: int = 0  # Number of threads to write out pages with, as soon as they are processed (0 to disable).
+	no_git_dates: bool = False  # Do not use git history for dates (file modification times are used instead).
+	fingerprint_assets: bool = False  # Publish static assets under content-hashed names, deduplicating identical ones.
+	responsive_images: bool = False  # Publish resized variants of images, and add `srcset`s for them (needs Pillow).
+	image_widths: List[int] = [480, 960, 1600]  # Widths of the resized variants of images.
+	image_quality: int = 82  # JPEG & WebP quality of the resized variants of images.
+	image_jobs: int = 0  # Number of processes to resize images with (0 for one per CPU).
+	precompress: bool = False  # Also write gzip (& brotli, if installed) copies of HTML, CSS, JS, SVG & XML outputs.
+	precompress_jobs: int = 0  # Number of processes to compress outputs with (0 for one per CPU).
+	minify: bool = False  # Minify the HTML, CSS & JS outputs of pages (leaving e.g. `pre` blocks as they are).
+	search_index: Optional[str] = None  # Directory (in the site) to write a client-side search index into.
+
+	def process_args(self) -> None:
+		# Content is processed from inside the content directory, so relative paths must be resolved now.
+		self.cache_dir = os.path.abspath(self.cache_dir)  # pylint: disable=invalid-name
+
+
+@dataclass
+class PendingPage:  # pylint: disable=too-many-instance-attributes
+	"""A page that PyPage has been run on, which is waiting for the rest of its processing (see `finishPyPage`)."""
+
+	pyPageNode: PyPageNode
+	env: dict[str, Any]  # The environment the page is executed in (and which it modifies).
+	pageEnv: Env  # The page's own layer (see `getPageEnv`), which is left unmodified.
+	pyPageOutput: str
+	conversion: Optional['Future[Conversion]']  # Markdown conversion in progress in the Markdown pool, if any.
+	cacheKey: Optional[str]
+	dependencies: Optional[Dict[str, str]]
+	imageUrls: Optional[Dict[str, FileNode]]  # Images linked to, by URL (with --responsive_images).
+
+
+@dataclass
+class BuildResources:
+	"""The objects that the driver gives to `Content` (some of which it keeps across builds, in --watch mode)."""
+
+	stager: Optional[Stager] = None  # Staging area that the outputs of pages are written to, as they are completed.
+	assetHashCache: Optional[AssetHashCache] = None  # Hashes of static assets (with --fingerprint_assets).
+	codeCache: Optional[CodeCache] = None  # Compiled code.
 
 
 class Content:  # pylint: disable=too-many-instance-attributes
-	def __init__(self, args: Args, fs: CrawlResult) -> None:
+	def __init__(self, args: Args, fs: CrawlResult, resources: Optional[BuildResources] = None) -> None:
+		resources = resources if resources is not None else BuildResources()
 		self.publicNodeCounts: PublicNodeCounts = PublicNodeCounts()
 		FsNode.publicNodeCounts = self.publicNodeCounts
-		self.inTemplate: bool = False
-		self.templateCache: Dict[str, str] = {}
-		self.seenTemplateLinks: Set[FileNode] = set()
+		self.templateCache: TemplateCache = TemplateCache()
+		self.codeCache: CodeCache = resources.codeCache if resources.codeCache is not None else CodeCache(None)
+		self.codeCache.begin()
 		self.rootDir: DirNode = fs.rootDir
 		self.nameRegistry: NameRegistry = fs.nameRegistry
+		self.fileNodesByFullPath: Dict[str, FileNode] = getFileNodesByFullPath(fs.rootDir)
 		self.seed: Dict[str, Any] = json.loads(args.seed)
 		self.timePyPage: MultiRunTimes = MultiRunTimes()
 		self.timeMarkdown: MultiRunTimes = MultiRunTimes()
+		self.timeLinks: MultiRunTimes = MultiRunTimes()
+		self.profiler: Profiler = Profiler()  # Per-file timings.
 		self.warnings: Dict[FileNode, str] = {}
+		self.renderCache: Optional[RenderCache] = RenderCache(args.cache_dir) if args.cache else None
+		self.highlightCache: Optional[HighlightCache] = HighlightCache(args.cache_dir) if args.cache else None
+		self.cacheDir: str = args.cache_dir
+		# Hashes of static assets, if they are fingerprinted (with --fingerprint_assets):
+		self.assetHashCache: Optional[AssetHashCache] = resources.assetHashCache
+		self.fingerprintAssets: bool = args.fingerprint_assets
+		# Resized variants of images (with --responsive_images):
+		self.responsiveImages: Optional[ResponsiveImages] = None
+		if args.responsive_images:
+			assert self.assetHashCache is not None
+			self.responsiveImages = ResponsiveImages(
+				args.cache_dir,
+				self.assetHashCache,
+				args.image_widths,
+				args.image_quality,
+				args.image_jobs,
+				args.fingerprint_assets,
+			)
+		# Minification of the outputs of pages (with --minify):
+		self.minify: bool = args.minify
+		self.minificationStats: MinificationStats = MinificationStats()
+		# Dependencies of pages, for incremental re-processing & for the render cache (see `DependencyRecorder`).
+		# A Content object is always constructed inside the content dir:
+		self.recorder: DependencyRecorder = DependencyRecorder(os.getcwd(), fs.nameRegistry)
+		# Dates are dependencies of the pages that read them (rather than part of every page's cache key), since they are
+		# resolved from git history in the background, and computing them would make every page wait for that:
+		FileNode.onDatesRead = self.recorder.recordDatesDependency
+		# Likewise, other pages whose variables (or outputs) a page reads (e.g. via `dir.pages`) are its dependencies:
+		FsNode.onDataRead = self.recorder.recordNodeDependency
+		self.linker: Linker = Linker(self.recorder)
+		# State retained for incremental re-processing (see `incremental.py`):
+		self.dirEnvs: Dict[DirNode, Env] = {}
+		self.processingOrder: Dict[PyPageNode, int] = {}
+		self.presetEnvs: Dict[PyPageNode, Dict[str, Any]] = {}
+		self.explicitlyPublicNodes: Set[FsNode] = set()  # Pages that set `public = True`.
+		self.configPublicFiles: Set[FsNode] = set()  # Files made public by other means (e.g. by config files).
+		# State for parallel processing (see `parallel.py`):
+		self.jobs: int = args.jobs
+		self.inWorker: bool = False
+		self.processedInParallel: bool = False
+		self.pageEnvDeltas: Optional[Dict[PyPageNode, Dict[str, Any]]] = None  # Only recorded in worker processes.
+		self.progress: int = 0
+		# Markdown conversion pipeline (see `finishPyPage`):
+		self.markdownJobs: int = args.markdown_jobs
+		self.markdownPool: Optional[MarkdownPool] = None
+		self.pendingPages: List[PendingPage] = []
+		# Staging area that the outputs of pages are written to, as soon as they are complete (see `completePyPage`):
+		self.stager: Optional[Stager] = resources.stager
 		self.fixSysPath()
 
-	def link(self, srcFile: FileNode, dstFile: FileNode, pathOnly: bool = False) -> str:
-		if not pathOnly:
-			srcFile.linksTo.append(dstFile)  # This is used to determine reachability.
-			if dstFile not in self.seenTemplateLinks:
-				pr(
-					' ' * (4 if self.inTemplate else 2) + f'{Fore.grey_42}Linking to:{Style.reset} {dstFile.linkName}',
-				)
-				if self.inTemplate:
-					self.seenTemplateLinks.add(dstFile)
-
-		return FileNode.relativePath(srcFile, dstFile, pathOnly)
-
 	def linkFlex(
 		self,
 		fromPyPage: PyPageNode,
 		destination: Union[str, FsNode],
 		pathOnly: bool = False,
 	) -> str:
-		if isinstance(destination, str):
-			dstFile: FileNode = self.nameRegistry.lookup(destination)
-			return self.link(fromPyPage, dstFile, pathOnly)
-		if isinstance(destination, FileNode):
-			return self.link(fromPyPage, destination, pathOnly)
-		if isinstance(destination, DirNode):
-			if not destination.indexPage:
-				raise AltezaException(f'Directory `{destination}` has no index page.')
-			return self.link(fromPyPage, destination.indexPage, pathOnly)
-		raise AltezaException(f'Unknown link destination type: `{type(destination)}`.')
+		with StopWatch() as sw:
+			relativeUrl = self.linker.resolveLink(fromPyPage, destination, pathOnly)
+		self.timeLinks.add(sw)
+		self.profiler.get(fromPyPage.fullPath).links += sw.t
+		return relativeUrl
 
 	def warn(self, fileNode: FileNode, desc: str) -> None:
 		self.warnings[fileNode] = desc
 
-	def invokePyPage(self, pyPageNode: PyPageNode, env: dict[str, Any]) -> None:
+	def invokePyPage(self, pyPageNode: PyPageNode, dirEnv: Env) -> None:
 		pr(f'{Fore.gold_1}Processing:{Style.reset}', pyPageNode.fullPath)
 		FileNode.current_pypage_node_being_processed = pyPageNode
-		env = env.copy()
-
-		# Enrich with the current file:
-		env |= {'page': pyPageNode}
-		env |= {'warn': lambda desc: self.warn(pyPageNode, desc)}
-		env |= pyPageNode.env
+		self.recorder.currentDependent = pyPageNode
+		self.recorder.recordGraphDependency(pyPageNode.absoluteFilePath)
+		self.processingOrder.setdefault(pyPageNode, len(self.processingOrder))
+		self.presetEnvs.setdefault(pyPageNode, pyPageNode.env.own.copy())
+		pageEnv = self.getPageEnv(pyPageNode, dirEnv)
+		env = pageEnv.toDict()
 
 		rawPyPageFileText: str
 		if isinstance(pyPageNode, (Md, NonMd)):
@@ -90,76 +204,260 @@ class Content:  # pylint: disable=too-many-instance-attributes
 		else:
 			raise AltezaException(f'{pyPageNode} Unsupported type of PyPageNode.')
 
-		def link(destination: Union[str, FsNode], pathOnly: bool = False) -> str:
-			return self.linkFlex(pyPageNode, destination, pathOnly)
+		PyPageNode.temporal_link = env['link']
+
+		cacheKey: Optional[str] = None
+		cachedPage: Optional[RenderedPage] = None
+		if self.renderCache is not None and not pyPageNode.isIndex:
+			# Index pages usually depend on the other pages in their directory, so they are never cached.
+			cacheKey = RenderCache.key(
+				pyPageNode.fullPath,
+				rawPyPageFileText,
+				env,
+				*self.recorder.getConfigHashes(pyPageNode.parentDir),
+				*(('fingerprinted assets',) if self.fingerprintAssets else ()),
+				*(self.responsiveImages.cacheKey() if self.responsiveImages is not None else ()),
+				*(('minified',) if self.minify else ()),
+			)
+			if cacheKey is None:
+				pr(
+					f'  {Fore.grey_42}Not cached, since some variables available to this page cannot be fingerprinted.{Style.reset}'
+				)
+			else:
+				cachedPage = self.renderCache.getPage(
+					cacheKey, lambda deps: self.recorder.areDependenciesUnchanged(deps, self.fileNodesByFullPath)
+				)
 
-		PyPageNode.temporal_link = link
+		if cachedPage is not None:
+			env.update(cachedPage.envDelta)
+			self.restoreCachedPage(pyPageNode, cachedPage, dirEnv)
+			pr(f'  {Fore.grey_42}Reused cached render.{Style.reset}')
+			self.completePyPage(pyPageNode, env, cachedPage.envDelta)
+		else:
+			self.recorder.dependencies = {} if cacheKey is not None else None
+			self.linker.imageUrls = {} if self.responsiveImages is not None else None
+			pendingPage = PendingPage(
+				pyPageNode, env, pageEnv, '', None, cacheKey, self.recorder.dependencies, self.linker.imageUrls
+			)
+			# Invoke pypage on the raw page file text:
+			with recordingImports(self.recorder.recordImport), StopWatch() as sw:
+				pendingPage.pyPageOutput = runPyPage(
+					rawPyPageFileText,
+					env,
+					self.templateCache,
+					self.recorder.resolvePartial,
+					self.codeCache,
+					fileName=pyPageNode.absoluteFilePath,
+				)
+			self.timePyPage.add(sw)
+			self.profiler.get(pyPageNode.fullPath).pypage += sw.t
 
-		def path(name: str) -> str:
-			return self.linkFlex(pyPageNode, name, True)
+			if isinstance(pyPageNode, Md) and self.markdownPool is not None:
+				# The rest of this page's processing happens once its Markdown has been converted (see `drainPendingPages`):
+				pendingPage.conversion = self.markdownPool.submit(
+					pyPageNode, pendingPage.pyPageOutput, env.get('pygments_style', '')
+				)
+				self.pendingPages.append(pendingPage)
+				self.linker.logLinks()
+			else:
+				self.finishPyPage(pendingPage)
 
-		env |= {'file': self.nameRegistry.lookup}
-		env |= {'link': link}
-		env |= {'path': path}
+		FileNode.current_pypage_node_being_processed = None
+		self.recorder.currentDependent = None
+		PyPageNode.temporal_link = None
+		self.recorder.dependencies = None
+		self.linker.imageUrls = None
 
-		env |= {'lastModified': pyPageNode.lastModified}
-		env |= {'lastModifiedObj': lambda: pyPageNode.lastModifiedObj}
-		env |= {'ideaDate': pyPageNode.ideaDate}
-		env |= {'ideaDateObj': pyPageNode.ideaDateObj}
-		env |= {'firstCommitDate': pyPageNode.firstCommitDate}
-		env |= {'firstCommitDateObj': pyPageNode.firstCommitDateObj}
+	def finishPyPage(self, pendingPage: PendingPage) -> None:
+		"""Perform Markdown processing & template application on a page that PyPage has been run on, and complete it."""
+		pyPageNode, env = pendingPage.pyPageNode, pendingPage.env
+		FileNode.current_pypage_node_being_processed = pyPageNode
+		self.recorder.currentDependent = pyPageNode
+		PyPageNode.temporal_link = env['link']
+		self.recorder.dependencies = pendingPage.dependencies
+		self.linker.imageUrls = pendingPage.imageUrls
+
+		with recordingImports(self.recorder.recordImport):
+			pyPageOutput, envDelta = self.renderPyPage(pendingPage)
+		if pendingPage.cacheKey is not None and self.renderCache is not None:
+			renderedPage = RenderedPage(
+				output=pyPageOutput,
+				envDelta=envDelta,
+				linksTo=[fileNode.fullPath for fileNode in pyPageNode.linksTo],
+				warning=self.warnings.get(pyPageNode),
+				dependencies=self.recorder.dependencies or {},
+			)
+			if not self.renderCache.put(pendingPage.cacheKey, renderedPage):
+				pr(
+					f'  {Fore.grey_42}Not cached, since some variables defined by this page cannot be stored.{Style.reset}'
+				)
+		self.completePyPage(pyPageNode, env, envDelta)
 
-		# Invoke pypage on the raw page file text:
-		with StopWatch() as sw:
-			pyPageOutput = pypage(rawPyPageFileText, env)
-		self.timePyPage.add(sw)
+		FileNode.current_pypage_node_being_processed = None
+		self.recorder.currentDependent = None
+		PyPageNode.temporal_link = None
+		self.recorder.dependencies = None
+		self.linker.imageUrls = None
+
+	def drainPendingPages(self) -> None:
+		"""Finish all pages whose Markdown is being converted by the Markdown pool, in the order they were started."""
+		pendingPages, self.pendingPages = self.pendingPages, []
+		for pendingPage in pendingPages:
+			self.finishPyPage(pendingPage)
+
+	def completePyPage(self, pyPageNode: PyPageNode, env: dict[str, Any], envDelta: Dict[str, Any]) -> None:
+		if self.pageEnvDeltas is not None:
+			self.pageEnvDeltas[pyPageNode] = envDelta
+		if self.stager is not None:
+			pyPageNode.stageOutput(self.stager)
+
+		# Handle `public` var:
+		if 'public' in env:
+			if env['public'] is True:
+				self.explicitlyPublicNodes.add(pyPageNode)
+				pyPageNode.makePublic()
+
+	def getPageEnv(self, pyPageNode: PyPageNode, dirEnv: Env) -> Env:
+		"""The page's own layer of variables (i.e. its helpers, and its preset variables), over its directory's."""
+
+		def link(destination: Union[str, FsNode], pathOnly: bool = False) -> str:
+			return self.linkFlex(pyPageNode, destination, pathOnly)
+
+		def path(name: str) -> str:
+			# Paths are typically used to `inject` other files, so the files themselves are dependencies:
+			self.recorder.recordFileDependency(self.nameRegistry.lookup(name).absoluteFilePath)
+			return self.linkFlex(pyPageNode, name, True)
 
+		def image(destination: Union[str, FsNode], alt: str = '', sizes: str = '100vw', **attributes: Any) -> str:
+			url = self.linkFlex(pyPageNode, destination)
+			imageFile = self.nameRegistry.lookup(destination) if isinstance(destination, str) else destination
+			responsiveImage: Optional[ResponsiveImage] = None
+			if self.responsiveImages is not None and isinstance(imageFile, FileNode) and isResizableImage(imageFile):
+				# Worker processes (see `parallel.py`) leave generating variants to the main process:
+				responsiveImage = (
+					self.responsiveImages.describe(imageFile)
+					if self.inWorker
+					else self.responsiveImages.generate(imageFile)
+				)
+			return imageTag(url, responsiveImage, sizes, {'alt': alt} | attributes)
+
+		pageVars: Dict[str, Any] = {
+			# The current file:
+			'page': pyPageNode,
+			'warn': lambda desc: self.warn(pyPageNode, desc),
+		}
+		pageVars |= self.presetEnvs.get(pyPageNode, {})
+		pageVars |= {
+			'file': self.recorder.lookupFile,
+			'link': link,
+			'path': path,
+			'image': image,
+			'lastModified': pyPageNode.lastModified,
+			'lastModifiedObj': lambda: pyPageNode.lastModifiedObj,
+			'ideaDate': pyPageNode.ideaDate,
+			'ideaDateObj': pyPageNode.ideaDateObj,
+			'firstCommitDate': pyPageNode.firstCommitDate,
+			'firstCommitDateObj': pyPageNode.firstCommitDateObj,
+		}
+		return Env(pageVars, dirEnv)
+
+	def renderPyPage(self, pendingPage: PendingPage) -> Tuple[str, Dict[str, Any]]:
+		"""Returns the page's output, and the variables defined by the page (see `getEnvDelta`)."""
+		pyPageNode, pyPageOutput, env, conversion = (
+			pendingPage.pyPageNode,
+			pendingPage.pyPageOutput,
+			pendingPage.env,
+			pendingPage.conversion,
+		)
 		# Perform Markdown processing:
 		if isinstance(pyPageNode, Md):
-			with StopWatch() as sw:
-				mdResult = Md.processMarkdown(pyPageOutput)
-			self.timeMarkdown.add(sw)
+			mdResult: Md.Result
+			if conversion is not None:
+				convertedInWorker = conversion.result()
+				self.timeMarkdown.times.append(convertedInWorker.elapsedNs)
+				self.profiler.get(pyPageNode.fullPath).markdown += convertedInWorker.elapsedNs
+				if self.highlightCache is not None:
+					self.highlightCache.hits += convertedInWorker.highlightHits
+					self.highlightCache.misses += convertedInWorker.highlightMisses
+				mdResult = convertedInWorker.result
+				for linkedName in convertedInWorker.linkedNames:
+					self.linkFlex(pyPageNode, linkedName)  # Record wiki-links made by the worker.
+			else:
+				with StopWatch() as sw, highlightingWith(self.highlightCache, env.get('pygments_style', '')):
+					mdResult = Md.processMarkdown(pyPageOutput)
+				self.timeMarkdown.add(sw)
+				self.profiler.get(pyPageNode.fullPath).markdown += sw.t
 			env.update(mdResult.metadata)
 			pyPageOutput = mdResult.html
+			if self.responsiveImages is not None and pendingPage.imageUrls:
+				# Images in the page's Markdown (i.e. `![...](...)`) get `srcset`s:
+				pyPageOutput = self.responsiveImages.addSrcsets(
+					pyPageOutput, pendingPage.imageUrls, startGenerating=not self.inWorker
+				)
 
-		# Enrich with `env`:
-		pyPageNode.env |= env
-		for k, v in self.getModuleVars(env).items():
-			if k not in dir(pyPageNode):
-				setattr(pyPageNode, k, v)
+		envDelta = getEnvDelta(pendingPage.pageEnv, env)
+		assert pendingPage.pageEnv.parent is not None
+		self.enrichPyPageNode(pyPageNode, envDelta, pendingPage.pageEnv.parent)
+		self.linker.logLinks()
 
 		# Perform template application (invoke PyPage on the layout template):
 		if isinstance(pyPageNode, Md):
-			templateHtml = self.getTemplateHtml(env)
-			self.inTemplate = True
+			templateName, templateHtml = self.getTemplateHtml(env)
+			self.linker.inTemplate = True
 			# Re-process against `templateHtml` with PyPage:
 			with StopWatch() as sw:
-				pyPageOutput = pypage(templateHtml, env | {'content': pyPageOutput})
+				pyPageOutput = runPyPage(
+					templateHtml,
+					env | {'content': pyPageOutput},
+					self.templateCache,
+					self.recorder.resolvePartial,
+					self.codeCache,
+					templateName,
+				)
 			self.timePyPage.add(sw)
-			self.inTemplate = False
+			self.profiler.get(pyPageNode.fullPath).template += sw.t
+			self.linker.logLinks()
+			self.linker.inTemplate = False
+
+		if self.minify:
+			with StopWatch() as sw:
+				# Markdown pages are written as `index.html` (see `Driver.generateMd`):
+				outputName = pyPageNode.rectifiedFileName if isinstance(pyPageNode, NonMd) else 'index.html'
+				pyPageOutput = minifyOutput(outputName, pyPageOutput, self.minificationStats)
+			self.profiler.get(pyPageNode.fullPath).minify += sw.t
 
 		# Set the PyPageNode's output:
 		pyPageNode.output = pyPageOutput
-
-		# Handle `public` var:
-		if 'public' in env:
-			if env['public'] is True:
-				pyPageNode.makePublic()
-
-		FileNode.current_pypage_node_being_processed = None
-		PyPageNode.temporal_link = None
-
-	def runConfigIfAny(self, dirNode: DirNode, env: dict[str, Any]) -> Dict[str, Any]:
-		# Run the config Python file (usually `__config__.py`) if one exists.
-		configEnv = env.copy()
+		return pyPageOutput, envDelta
+
+	def enrichPyPageNode(self, pyPageNode: PyPageNode, envDelta: Dict[str, Any], dirEnv: Env) -> None:
+		# The page keeps only its own variables, layered over its directory's env (see `PageNode.__getattr__`):
+		pyPageNode.env = Env(self.presetEnvs.get(pyPageNode, {}) | envDelta, dirEnv)
+
+	def restoreCachedPage(self, pyPageNode: PyPageNode, cachedPage: RenderedPage, dirEnv: Env) -> None:
+		if any(fullPath not in self.fileNodesByFullPath for fullPath in cachedPage.linksTo):
+			raise AltezaException(f'The cached render of {pyPageNode.fullPath} links to a file that no longer exists.')
+		pyPageNode.linksTo.extend(self.fileNodesByFullPath[fullPath] for fullPath in cachedPage.linksTo)
+		self.recorder.recordCachedDependencies(cachedPage.dependencies)
+		if cachedPage.warning is not None:
+			self.warn(pyPageNode, cachedPage.warning)
+		self.enrichPyPageNode(pyPageNode, cachedPage.envDelta, dirEnv)
+		pyPageNode.output = cachedPage.output
+
+	def runConfigIfAny(self, dirNode: DirNode, env: Env) -> Dict[str, Any]:
+		"""
+		Run the config Python file (usually `__config__.py`) if one exists,
+		and return the variables that it defined (or re-assigned).
+		"""
 		configFileL = [f for f in dirNode.files if f.fileName == CrawlConfig.configFileName]
 		if configFileL:
 			configFile: FileNode = configFileL[0]
+			configEnv = env.toDict()
 
 			def path(name: str) -> str:
-				return self.link(configFile, self.nameRegistry.lookup(name), True)
+				return self.linker.link(configFile, self.nameRegistry.lookup(name), True)
 
-			configEnv |= {'file': self.nameRegistry.lookup}
+			configEnv |= {'file': self.recorder.lookupFile}
 			configEnv |= {'warn': lambda desc: self.warn(configFile, desc)}
 			configEnv |= {'path': path}
 
@@ -167,17 +465,26 @@ class Content:  # pylint: disable=too-many-instance-attributes
 				f'{Fore.dark_orange}Running:{Style.reset}',
 				os.path.join(dirNode.fullPath, CrawlConfig.configFileName),
 			)
-			exec(readfile(CrawlConfig.configFileName), configEnv)
+			self.recorder.currentDependent = configFile
+			self.recorder.recordGraphDependency(configFile.absoluteFilePath)
+			with recordingImports(self.recorder.recordImport), StopWatch() as sw:
+				exec(
+					self.codeCache.compile(readfile(CrawlConfig.configFileName), configFile.absoluteFilePath, 'exec'),
+					configEnv,
+				)
+			self.profiler.get(configFile.fullPath).config += sw.t
+			self.recorder.currentDependent = None
 
 			if 'title' in configEnv:
 				if dirNode.configTitle is not None:
 					raise AltezaException(f'Do not set both `title` and `dir.title` in `{CrawlConfig.configFileName}`.')
 				dirNode.title = configEnv['title']
 				del configEnv['title']
-		return configEnv
+			return getEnvDelta(env, configEnv)
+		return {}
 
 	@staticmethod
-	def getSkipNames(env: dict[str, Any]) -> List[str]:
+	def getSkipNames(env: Env) -> List[str]:
 		skipNames = []
 		if 'skip' in env:
 			skipVar = env['skip']
@@ -195,44 +502,82 @@ class Content:  # pylint: disable=too-many-instance-attributes
 		return skipNames
 
 	def process(self) -> None:
-		def walk(dirNode: DirNode, env: dict[str, Any]) -> None:
-			env = env.copy()  # Duplicate env.
-			env |= {'dir': dirNode}  # Enrich with current dir.
-			env |= self.getModuleVars(self.runConfigIfAny(dirNode, env))  # Run config.
-			skipNames = self.getSkipNames(env)  # Type check `skip`.
-
-			# Ordering Note: We must recurse into the subdirectories first.
-			for d in dirNode.subDirs:
-				if d.dirName not in skipNames:
-					with enterDir(d.dirName):
-						walk(d, env)
-
-			# Ordering Note: Files in the current directory must be processed after
-			# all subdirectories have been processed so that they have access to
-			# information about the subdirectories.
-			for pyPageNode in dirNode.getPyPagesOtherThanIndex():
-				if pyPageNode.linkName not in skipNames:
-					self.invokePyPage(pyPageNode, env)
-				ProgressBar.increment()
-
-			self.sortDirNode(dirNode, env)
-
-			# We must process the index file last.
-			indexPage: Optional[PageNode] = dirNode.indexPage
-			if indexPage is not None and isinstance(indexPage, PyPageNode):
-				self.invokePyPage(indexPage, env)
-				ProgressBar.increment()
-
-			# TODO: Enrich dirNode with additional `env`/info from index?
-
-		initial_env = self.seed | self.getBasicHelpers()
-
-		walk(self.rootDir, initial_env)
-
-		self.tracePublic()
+		if self.jobs > 1 and not canFork():
+			pr(f'{Fore.light_red}Parallel processing requires `fork`, which is unavailable here.{Style.reset}')
+			self.jobs = 1
+
+		initial_env = Env(self.seed | self.getBasicHelpers())
+
+		if self.fingerprintAssets:
+			assert self.assetHashCache is not None
+			pr(fingerprintAssets(self.rootDir, self.assetHashCache, CrawlConfig.configFileName))
+
+		if self.markdownJobs > 0:
+			cacheDir = self.cacheDir if self.highlightCache is not None else None
+			self.markdownPool = MarkdownPool(self.markdownJobs, self.nameRegistry, cacheDir)
+		try:
+			self.processDir(self.rootDir, initial_env)
+		except BaseException:
+			if self.responsiveImages is not None:
+				self.responsiveImages.shutdown()
+			raise
+		finally:
+			if self.markdownPool is not None:
+				self.markdownPool.shutdown()
+				self.markdownPool = None
+				self.pendingPages = []
+		self.codeCache.finish(completeBuild=True)
+
+		publicFiles: Set[FsNode] = {f for f in self.fileNodesByFullPath.values() if f.shouldPublish}
+		self.configPublicFiles = publicFiles - self.explicitlyPublicNodes
+		tracePublic(self.rootDir, self.nameRegistry, self.publicNodeCounts)
+		if self.responsiveImages is not None:
+			pr(self.responsiveImages.generateAll(self.fileNodesByFullPath.values()))
+		if self.stager is not None:
+			self.stager.wait()  # Surface any errors from writing out the staged outputs.
+
+	def processDir(self, dirNode: DirNode, parentEnv: Env) -> None:
+		env = Env({'dir': dirNode}, parentEnv)  # This directory's layer, over its parent's.
+		env.update(self.getModuleVars(self.runConfigIfAny(dirNode, env)))  # Run config.
+		skipNames = self.getSkipNames(env)  # Type check `skip`.
+		self.dirEnvs[dirNode] = env
+
+		# Ordering Note: We must recurse into the subdirectories first.
+		subDirs = [d for d in dirNode.subDirs if d.dirName not in skipNames]
+		if self.jobs > 1 and len(subDirs) > 1 and not self.inWorker:
+			processDirsInParallel(self, subDirs, env)
+		else:
+			for d in subDirs:
+				with enterDir(d.dirName):
+					self.processDir(d, env)
+
+		# Ordering Note: Files in the current directory must be processed after
+		# all subdirectories have been processed so that they have access to
+		# information about the subdirectories.
+		for pyPageNode in dirNode.getPyPagesOtherThanIndex():
+			if pyPageNode.linkName not in skipNames:
+				self.invokePyPage(pyPageNode, env)
+			self.advanceProgress()
+		self.drainPendingPages()  # Sorting, and the index page, can depend on all the other pages being complete.
+
+		self.sortDirNode(dirNode, env)
+
+		# We must process the index file last.
+		indexPage: Optional[PageNode] = dirNode.indexPage
+		if indexPage is not None and isinstance(indexPage, PyPageNode):
+			self.invokePyPage(indexPage, env)
+			self.drainPendingPages()
+			self.advanceProgress()
+
+		# TODO: Enrich dirNode with additional `env`/info from index?
+
+	def advanceProgress(self, steps: int = 1) -> None:
+		self.progress += steps
+		for _ in range(steps):
+			ProgressBar.increment()
 
 	@staticmethod
-	def sortDirNode(dirNode: DirNode, env: dict[str, Any]) -> None:
+	def sortDirNode(dirNode: DirNode, env: Env) -> None:
 		# Sorting:
 		# =========
 		def getField(fieldName: str) -> Optional[Union[str, Callable[[Any], Any]]]:
@@ -277,48 +622,6 @@ class Content:  # pylint: disable=too-many-instance-attributes
 					f'`{fieldName}` must be a string or a function, but got `{sortFilesKey}` of type `{type(sortFilesKey)}`.'
 				)
 
-	def tracePublic(self) -> None:
-		"""Make all nodes reachable from public nodes public. (Called after processing.)"""
-		if '/' in self.nameRegistry.allFiles:
-			# Always make the root (/) level index page public, if it exists.
-			rootIndex = self.nameRegistry.allFiles['/']
-			rootIndex.makePublic()
-
-		publicNodes: List['FsNode'] = []
-
-		def gatherPublicNodes(fsNode: FsNode) -> None:
-			if isinstance(fsNode, DirNode):
-				for dirNode in itertools.chain(fsNode.subDirs, fsNode.files):
-					gatherPublicNodes(dirNode)
-			if fsNode.shouldPublish:
-				publicNodes.append(fsNode)
-
-		gatherPublicNodes(self.rootDir)
-
-		pr('\nInitial pre-reachability public files:')
-		for node in filter(lambda pNode: isinstance(pNode, FileNode), publicNodes):
-			pr('/' + node.fullPath)
-		pr()
-
-		pr('Marking all reachable nodes as public...')
-		seen: Set['FsNode'] = set()
-
-		def makeReachableNodesPublic(fsNode: FsNode) -> None:
-			if fsNode in seen:
-				return
-			seen.add(fsNode)
-
-			if not fsNode.shouldPublish:
-				fsNode.makePublic()
-
-			for linkedToNode in fsNode.linksTo:
-				makeReachableNodesPublic(linkedToNode)
-
-		for node in publicNodes:
-			makeReachableNodesPublic(node)
-
-		pr(f'{self.publicNodeCounts.total()} reachable public nodes.\n')
-
 	@staticmethod
 	def fixSysPath() -> None:
 		"""
@@ -332,42 +635,22 @@ class Content:  # pylint: disable=too-many-instance-attributes
 	def getModuleVars(env: Dict[str, Any]) -> Dict[str, Any]:
 		return {k: v for k, v in env.items() if (not k.startswith('_') and not isinstance(v, types.ModuleType))}
 
-	@staticmethod
-	def getBasicHelpers() -> Dict[str, Any]:
-		return {'readfile': readfile, 'sh': sh, 'markdown': lambda text: Md.processMarkdown(text).html}
+	def getBasicHelpers(self) -> Dict[str, Any]:
+		return {'readfile': self.recorder.readfile, 'sh': sh, 'markdown': lambda text: Md.processMarkdown(text).html}
 
-	def getTemplateHtml(self, env: dict[str, Any]) -> str:
+	def getTemplateHtml(self, env: dict[str, Any]) -> Tuple[str, str]:
+		"""Returns the name (for the template cache) and the content of the layout template."""
 		if 'layoutRaw' in env:
 			templateRaw = env['layoutRaw']
 			if not isinstance(templateRaw, str):
 				raise AltezaException('The `layoutRaw` must be a string.')
 			pr(f'  {Fore.purple_3}Applying raw template...{Style.reset}')
-			return templateRaw
+			return '<layoutRaw>', templateRaw
 		if 'layout' in env:
 			templateName = env['layout']
 			pr(f'  {Fore.purple_3}Applying template: {Fore.blue_violet}{templateName}{Fore.purple_3}...{Style.reset}')
-			if templateName in self.templateCache:
-				return self.templateCache[templateName]
-			templateFile = self.nameRegistry.lookup(templateName)
-			templateRaw = readfile(templateFile.absoluteFilePath)
-			self.templateCache[templateName] = templateRaw
-			return templateRaw
+			templateFile = self.recorder.lookupFile(templateName)
+			return templateFile.absoluteFilePath, readfile(templateFile.absoluteFilePath)
 		raise AltezaException(
 			f'You must define a `layout` or `layoutRaw` in some ancestral `{CrawlConfig.configFileName}` file.'
 		)
-
-
-def readfile(file_path: str) -> str:
-	with open(file_path, 'r', encoding='utf-8') as someFile:
-		return someFile.read()
-
-
-@contextlib.contextmanager
-def enterDir(newDir: str) -> Generator[None, None, None]:
-	# https://stackoverflow.com/a/13847807/908430
-	oldDir = os.getcwd()
-	os.chdir(newDir)
-	try:
-		yield
-	finally:
-		os.chdir(oldDir)
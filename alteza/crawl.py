@@ -1,11 +1,13 @@
 import os
+import re
 import sys
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Optional, Callable, DefaultDict, Set, Dict, List, Any
+from typing import Optional, Callable, DefaultDict, Set, Dict, List, Any, Tuple, Pattern
 from colored import Fore, Style  # type: ignore
 from tqdm import tqdm  # type: ignore
-from .fs import DirNode, FileNode, Md, AltezaException, PageNode
+from .fs import DirListing, DirNode, FileNode, Md, AltezaException, PageNode
 
 
 class ProgressBar:
@@ -55,7 +57,9 @@ class NameRegistry:
 		self.pageCount = 0
 		allFilesMulti: DefaultDict[str, Set[FileNode]] = defaultdict(set)
 
-		def walk(node: DirNode) -> None:
+		worklist: List[DirNode] = [root]
+		while worklist:
+			node = worklist.pop()
 			for fileNode in node.files:
 				if not skipForRegistry(fileNode.fileName):
 					allFilesMulti[fileNode.linkName].add(fileNode)
@@ -64,10 +68,7 @@ class NameRegistry:
 							allFilesMulti[fileNode.preSlugRealName].add(fileNode)
 				if isinstance(fileNode, PageNode):
 					self.pageCount += 1
-			for d in node.subDirs:
-				walk(d)
-
-		walk(root)
+			worklist.extend(node.subDirs)
 
 		self.allFiles: Dict[str, FileNode] = {}
 		for name, fileNodes in allFilesMulti.items():
@@ -117,17 +118,82 @@ def shouldIgnoreStandard(name: str) -> bool:
 	return False
 
 
+def compileIgnorePattern(pattern: str) -> Tuple[Pattern[str], bool, bool]:
+	"""
+	Compile a gitignore-style pattern into a regex (matched against paths relative to the content directory),
+	and whether the pattern is negated (with a `!` prefix), and whether it only matches directories (with a `/`
+	suffix). As with gitignore, a pattern with no slash (other than a trailing one) matches a name at any level.
+	"""
+	negated = pattern.startswith('!')
+	pattern = pattern[1:] if negated else pattern
+	dirOnly = pattern.endswith('/')
+	pattern = pattern.rstrip('/')
+	anchored = '/' in pattern
+	pattern = pattern.lstrip('/')
+
+	regex = ''
+	i = 0
+	while i < len(pattern):
+		if pattern.startswith('**/', i):
+			regex += '(?:.*/)?'
+			i += 3
+		elif pattern.startswith('**', i):
+			regex += '.*'
+			i += 2
+		elif pattern[i] == '*':
+			regex += '[^/]*'
+			i += 1
+		elif pattern[i] == '?':
+			regex += '[^/]'
+			i += 1
+		elif pattern[i] == '[' and ']' in pattern[i + 2 :]:
+			end = pattern.index(']', i + 2)
+			charClass = pattern[i + 1 : end]
+			regex += '[' + ('^' + charClass[1:] if charClass.startswith('!') else charClass).replace('\\', '\\\\') + ']'
+			i = end + 1
+		else:
+			regex += re.escape(pattern[i])
+			i += 1
+
+	return re.compile(('' if anchored else '(?:.*/)?') + regex), negated, dirOnly
+
+
+class IgnoreRules:
+	"""
+	The paths to ignore (given with `--ignore`) and the gitignore-style patterns (given with `--ignore_patterns`),
+	compiled once for matching paths relative to the root of a crawl. Since ignored directories are never listed,
+	everything inside them is ignored too.
+	"""
+
+	def __init__(self, ignoreAbsPaths: List[str], ignorePatterns: List[str], rootAbsPath: str) -> None:
+		self.ignoredPaths: Set[str] = {os.path.relpath(ignoreAbsPath, rootAbsPath) for ignoreAbsPath in ignoreAbsPaths}
+		self.patterns: List[Tuple[Pattern[str], bool, bool]] = [
+			compileIgnorePattern(pattern) for pattern in ignorePatterns if pattern and not pattern.startswith('#')
+		]
+
+	def matches(self, relPath: str, isDir: bool) -> bool:
+		if relPath in self.ignoredPaths:
+			return True
+		ignored = False
+		for regex, negated, dirOnly in self.patterns:  # As with gitignore, the last matching pattern wins.
+			if (isDir or not dirOnly) and regex.fullmatch(relPath):
+				ignored = not negated
+		return ignored
+
+	def matchesPathOrAncestor(self, relPath: str, isDir: bool) -> bool:
+		parts = relPath.split(os.sep)
+		for i in range(1, len(parts)):
+			if self.matches('/'.join(parts[:i]), True):
+				return True
+		return self.matches('/'.join(parts), isDir)
+
+
 def defaultShouldIgnore(name: str, parentPath: str, isDir: bool) -> bool:
-	# pylint: disable=unused-argument
 	if shouldIgnoreStandard(name):
 		return True
 
-	fullPath = os.path.abspath(os.path.join(parentPath, name))
-	for ignoreAbsPath in CrawlConfig.ignoreAbsPaths:
-		if ignoreAbsPath in fullPath:
-			return True
-
-	return False
+	relPath = name if parentPath == os.curdir else f'{parentPath}/{name}'
+	return CrawlConfig.ignoreRules.matches(relPath, isDir)
 
 
 def defaultSkipForRegistry(name: str) -> bool:
@@ -136,17 +202,75 @@ def defaultSkipForRegistry(name: str) -> bool:
 	return False
 
 
+def listDir(dirPath: str, shouldIgnore: Callable[[str, str, bool], bool]) -> Tuple[DirListing, List[str]]:
+	"""List (and stat the files of) a single directory. Returns its listing and the paths of its subdirectories."""
+	listing = DirListing([], [])
+	subDirPaths: List[str] = []
+	with os.scandir(dirPath) as entries:
+		for entry in entries:
+			isDir = entry.is_dir()
+			if shouldIgnore(entry.name, dirPath, isDir):
+				continue
+			if isDir:
+				subDirPaths.append(os.path.join(dirPath, entry.name) if dirPath != os.curdir else entry.name)
+			else:
+				listing.files.append((entry.name, entry.stat()))
+	return listing, subDirPaths
+
+
+def listTree(rootPath: str, shouldIgnore: Callable[[str, str, bool], bool], threads: int) -> DirListing:
+	"""
+	List the directory tree at `rootPath`, using `os.scandir` (so that each file is only stat-ed once).
+	With `threads` > 1, directories are listed concurrently by a pool of threads (which helps with directories
+	containing large numbers of files, since stat calls release the GIL).
+	"""
+	listings: Dict[str, Tuple[DirListing, List[str]]] = {}
+	if threads <= 1:
+		worklist: List[str] = [rootPath]
+		while worklist:
+			dirPath = worklist.pop()
+			listings[dirPath] = listDir(dirPath, shouldIgnore)
+			worklist.extend(listings[dirPath][1])
+	else:
+		listings = listTreeConcurrently(rootPath, shouldIgnore, threads)
+
+	# Link the listings together, with subdirectories in the order they were listed in:
+	for listing, subDirPaths in listings.values():
+		listing.subDirs.extend((os.path.basename(subDirPath), listings[subDirPath][0]) for subDirPath in subDirPaths)
+	return listings[rootPath][0]
+
+
+def listTreeConcurrently(
+	rootPath: str, shouldIgnore: Callable[[str, str, bool], bool], threads: int
+) -> Dict[str, Tuple[DirListing, List[str]]]:
+	"""Returns the listing (and subdirectory paths) of each directory in the tree at `rootPath`, keyed by path."""
+	listings: Dict[str, Tuple[DirListing, List[str]]] = {}
+	with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='crawl') as pool:
+		pending: Dict['Future[Tuple[DirListing, List[str]]]', str] = {
+			pool.submit(listDir, rootPath, shouldIgnore): rootPath
+		}
+		while pending:
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				_, subDirPaths = listings[pending.pop(future)] = future.result()
+				for subDirPath in subDirPaths:
+					pending[pool.submit(listDir, subDirPath, shouldIgnore)] = subDirPath
+	return listings
+
+
 def crawl(
 	# Signature -- shouldIgnore(name: str, parentPath: str, isDir: bool) -> bool
 	shouldIgnore: Callable[[str, str, bool], bool] = defaultShouldIgnore,
 	skipForRegistry: Callable[[str], bool] = defaultSkipForRegistry,
+	threads: int = 1,
 ) -> CrawlResult:
 	"""
 	Crawl the current directory. Construct & return an FsNode tree and NameRegistry.
 	"""
 	dirPath: str = os.curdir
+	CrawlConfig.ignoreRules = IgnoreRules(CrawlConfig.ignoreAbsPaths, CrawlConfig.ignorePatterns, os.getcwd())
 
-	rootDir: DirNode = DirNode(None, dirPath, shouldIgnore)
+	rootDir: DirNode = DirNode(None, dirPath, listTree(dirPath, shouldIgnore, threads))
 	nameRegistry = NameRegistry(rootDir, skipForRegistry)
 
 	return CrawlResult(rootDir, nameRegistry)
@@ -156,3 +280,5 @@ class CrawlConfig:  # pyre-ignore[13]
 	# pylint: disable=too-few-public-methods
 	configFileName: str
 	ignoreAbsPaths: List[str]
+	ignorePatterns: List[str] = []
+	ignoreRules: IgnoreRules = IgnoreRules([], [], os.curdir)  # Compiled (from the above two) at the start of a crawl.
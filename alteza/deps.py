@@ -0,0 +1,234 @@
+import builtins
+import contextlib
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, Generator, Iterable, List, Optional, Set
+
+from .fs import FsNode, FileNode, DirNode
+from .crawl import NameRegistry, CrawlConfig
+from .cache import hashFile
+from .util import readfile
+
+
+class DependencyGraph:
+	"""
+	Records the files that each page (or config file) used while it was being processed.
+	When files change, this is used to find the pages that need to be re-processed.
+	"""
+
+	def __init__(self) -> None:
+		self.dependencies: DefaultDict[FileNode, Set[str]] = defaultdict(set)
+
+	def record(self, dependent: FileNode, absFilePath: str) -> None:
+		self.dependencies[dependent].add(absFilePath)
+
+	def forget(self, dependent: FileNode) -> None:
+		self.dependencies.pop(dependent, None)
+
+	def getDependents(self, absFilePaths: Iterable[str]) -> Set[FileNode]:
+		changed = set(absFilePaths)
+		return {dependent for dependent, deps in self.dependencies.items() if not deps.isdisjoint(changed)}
+
+	def edgeCount(self) -> int:
+		return sum(len(deps) for deps in self.dependencies.values())
+
+
+class ImportGraph:
+	"""
+	Records the modules that each module imported. A module that was imported before is not executed again when it is
+	re-imported, so this is how the modules that it imports (directly or not) are known in that case too.
+	"""
+
+	def __init__(self) -> None:
+		self.imports: DefaultDict[str, Set[str]] = defaultdict(set)
+
+	def record(self, importerAbsFilePath: str, moduleAbsFilePath: str) -> None:
+		if importerAbsFilePath != moduleAbsFilePath:
+			self.imports[importerAbsFilePath].add(moduleAbsFilePath)
+
+	def getImportsOf(self, moduleAbsFilePath: str) -> Set[str]:
+		"""The module itself, and all the modules that it imports (directly or not)."""
+		found = {moduleAbsFilePath}
+		worklist = [moduleAbsFilePath]
+		while worklist:
+			for importedAbsFilePath in self.imports.get(worklist.pop(), ()):
+				if importedAbsFilePath not in found:
+					found.add(importedAbsFilePath)
+					worklist.append(importedAbsFilePath)
+		return found
+
+	def clear(self) -> None:
+		self.imports.clear()
+
+
+class DependencyRecorder:
+	"""
+	Records the dependencies of the page (or config file) currently being processed: in the dependency graph (which
+	is used to re-process pages in --watch mode), and, when the render cache is enabled, as the dependencies of the
+	page's render (which are checked before the render is reused, see `areDependenciesUnchanged`).
+	"""
+
+	def __init__(self, contentAbsPath: str, nameRegistry: NameRegistry) -> None:
+		self.contentAbsPath: str = contentAbsPath
+		self.nameRegistry: NameRegistry = nameRegistry
+		self.dependencyGraph: DependencyGraph = DependencyGraph()
+		self.importGraph: ImportGraph = ImportGraph()  # Of helper modules (see `recordImport`).
+		self.currentDependent: Optional[FileNode] = None
+		# Dependencies of the page currently being rendered (only recorded when the render cache is enabled):
+		self.dependencies: Optional[Dict[str, str]] = None
+		self.fileHashes: Dict[str, str] = {}
+
+	def recordDependency(self, dependency: str, value: str) -> None:
+		if self.dependencies is not None:
+			self.dependencies[dependency] = value
+
+	def recordFileDependency(self, filePath: str) -> None:
+		self.recordGraphDependency(os.path.abspath(filePath))
+		if self.dependencies is not None:
+			self.dependencies[f'file:{os.path.abspath(filePath)}'] = self.getFileHash(filePath)
+
+	def recordDatesDependency(self, fileNode: FileNode) -> None:
+		dependency = f'dates:{fileNode.fullPath}'
+		if self.dependencies is not None and dependency not in self.dependencies:
+			self.dependencies[dependency] = fileNode.datesFingerprint()
+
+	def recordNodeDependency(self, fsNode: FsNode) -> None:
+		"""What a page reads from another page depends on whatever that page depends on (as far as it is known)."""
+		if self.currentDependent is None or fsNode is self.currentDependent or not isinstance(fsNode, FileNode):
+			return
+		self.recordFileDependency(fsNode.absoluteFilePath)
+		for absFilePath in sorted(
+			self.dependencyGraph.dependencies.get(fsNode, set()).union(self.getConfigDependencies(fsNode.parentDir))
+		):
+			self.recordFileDependency(absFilePath)
+
+	def recordGraphDependency(self, absFilePath: str) -> None:
+		if self.currentDependent is not None:
+			self.dependencyGraph.record(self.currentDependent, absFilePath)
+
+	def recordImport(self, importerAbsFilePath: Optional[str], moduleAbsFilePath: str) -> None:
+		# Only modules inside the content directory (i.e. helper modules) are relevant for re-processing & caching.
+		contentPrefix = os.path.join(self.contentAbsPath, '')
+		if not moduleAbsFilePath.startswith(contentPrefix):
+			return
+		if importerAbsFilePath is not None and importerAbsFilePath.startswith(contentPrefix):
+			self.importGraph.record(importerAbsFilePath, moduleAbsFilePath)
+		# A helper module that was already imported is not executed again, so its own imports are not seen here:
+		for absFilePath in sorted(self.importGraph.getImportsOf(moduleAbsFilePath)):
+			self.recordFileDependency(absFilePath)
+
+	def recordCachedDependencies(self, dependencies: Dict[str, str]) -> None:
+		"""Record the files that a reused render depends on in the graph (so that the page is re-processed if they change)."""
+		for dependency in dependencies:
+			kind, _, target = dependency.partition(':')
+			if kind == 'file':
+				self.recordGraphDependency(target)
+
+	def lookupFile(self, name: str) -> FileNode:
+		"""The `file` helper. What a page reads from the file (e.g. its title) depends on the file's content."""
+		fileNode = self.nameRegistry.lookup(name)
+		self.recordDependency(f'name:{name}', fileNode.fullPath)
+		self.recordFileDependency(fileNode.absoluteFilePath)
+		return fileNode
+
+	def resolvePartial(self, name: str) -> Optional[str]:
+		"""The file path of the partial template named `name` (for `include`), or `None` if there is no such name."""
+		if name not in self.nameRegistry.allFiles:
+			return None
+		return self.lookupFile(name).absoluteFilePath
+
+	def readfile(self, filePath: str) -> str:
+		self.recordFileDependency(filePath)
+		return readfile(filePath)
+
+	def getConfigDependencies(self, dirNode: DirNode) -> List[str]:
+		"""
+		The config files of `dirNode` & its ancestors, and the files that they used (e.g. the helper modules they
+		imported), on which the variables of the pages in `dirNode` depend.
+		"""
+		configDependencies: List[str] = []
+		ancestorDir: Optional[DirNode] = dirNode
+		while ancestorDir is not None:
+			for configFile in ancestorDir.files:
+				if configFile.fileName == CrawlConfig.configFileName:
+					configDependencies.extend(sorted(self.dependencyGraph.dependencies.get(configFile, ())))
+			ancestorDir = ancestorDir.parent
+		return configDependencies
+
+	def getConfigHashes(self, dirNode: DirNode) -> List[str]:
+		return [f'{absFilePath}:{self.getFileHash(absFilePath)}' for absFilePath in self.getConfigDependencies(dirNode)]
+
+	def getFileHash(self, filePath: str) -> str:
+		absFilePath = os.path.abspath(filePath)
+		if absFilePath not in self.fileHashes:
+			self.fileHashes[absFilePath] = hashFile(absFilePath) if os.path.isfile(absFilePath) else ''
+		return self.fileHashes[absFilePath]
+
+	def forgetFileHashes(self, absFilePaths: Iterable[str]) -> None:
+		for absFilePath in absFilePaths:
+			self.fileHashes.pop(absFilePath, None)
+
+	def areDependenciesUnchanged(self, dependencies: Dict[str, str], fileNodesByFullPath: Dict[str, FileNode]) -> bool:
+		for dependency, value in dependencies.items():
+			kind, _, target = dependency.partition(':')
+			if kind == 'file' and self.getFileHash(target) != value:
+				return False
+			if kind == 'name' and (
+				target not in self.nameRegistry.allFiles or self.nameRegistry.allFiles[target].fullPath != value
+			):
+				return False
+			if kind == 'dates':
+				fileNode = fileNodesByFullPath.get(target)
+				if fileNode is None or fileNode.datesFingerprint() != value:
+					return False
+			if kind == 'asset':
+				asset = fileNodesByFullPath.get(target)
+				if asset is None or asset.publishedAssetPath() != value:
+					return False
+		return True
+
+
+@contextlib.contextmanager
+def recordingImports(onImport: Callable[[Optional[str], str], None]) -> Generator[None, None, None]:
+	"""
+	Calls `onImport` with the file path of the importing module (if it is a module), and the file path of every module
+	imported (or re-imported) inside this context.
+	"""
+	originalImport = builtins.__import__
+
+	def recordingImport(
+		name: str,
+		globals_: Optional[Any] = None,
+		locals_: Optional[Any] = None,
+		fromlist: Any = (),
+		level: int = 0,
+	) -> Any:
+		module = originalImport(name, globals_, locals_, fromlist, level)
+		importerFile = globals_.get('__file__') if isinstance(globals_, dict) else None
+		importerAbsFilePath = os.path.abspath(importerFile) if isinstance(importerFile, str) else None
+		modules = [module] + [getattr(module, attr, None) for attr in (fromlist or ())]
+		for someModule in modules:
+			moduleFile = getattr(someModule, '__file__', None)
+			if isinstance(moduleFile, str):
+				onImport(importerAbsFilePath, os.path.abspath(moduleFile))
+		return module
+
+	builtins.__import__ = recordingImport  # type: ignore
+	try:
+		yield
+	finally:
+		builtins.__import__ = originalImport
+
+
+def purgeModules(dirAbsPath: str) -> int:
+	"""Remove all modules loaded from inside `dirAbsPath` from `sys.modules`, so that they get re-loaded when next imported."""
+	prefix = os.path.join(dirAbsPath, '')
+	staleModuleNames = [
+		name
+		for name, module in list(sys.modules.items())
+		if isinstance(getattr(module, '__file__', None), str) and os.path.abspath(module.__file__).startswith(prefix)  # type: ignore
+	]
+	for name in staleModuleNames:
+		del sys.modules[name]
+	return len(staleModuleNames)
@@ -1,25 +1,34 @@
 import os
-import shutil
 import signal
+import tempfile
 import time
 import types
 import traceback
-from datetime import datetime
-from typing import Optional, Dict, Tuple, Set
+from typing import Dict, Optional, Set, TYPE_CHECKING
 
 from pypage import PypageError, PypageSyntaxError  # type: ignore
-from watchdog.events import FileSystemEventHandler, FileSystemEvent, DirModifiedEvent
-from watchdog.observers import Observer as WatchdogObserver
 from colored import Fore, Style  # type: ignore
 
-from .util import AltezaException, getFilesCommitDates
+from .util import AltezaException, StopWatch, enterDir, isInGitRepository
 from .fs import FileNode, DirNode, PyPageNode, Md, NonMd
-from .crawl import CrawlConfig, isHidden, crawl, ProgressBar, NameRegistry, pr
-from .content import Args, Content, enterDir
+from .crawl import CrawlConfig, crawl, ProgressBar, NameRegistry, pr
+from .content import Args, BuildResources, Content
+from .incremental import reprocess
+from .output import OutputWriter, SyncingOutputWriter, AtomicOutputWriter, MemoryOutputWriter, ArchiveOutputWriter
+from .staging import Stager
+from .assets import AssetHashCache
+from .images import ResponsiveImages, isResizableImage
+from .compress import Precompressor
+from .search import SearchIndex
+from .bytecode import CodeCache
 from .version import version as alteza_version
 
+if TYPE_CHECKING:
+	from .gitdates import BackgroundCommitDates
+	from .serve import DevServer
 
-class Driver:
+
+class Driver:  # pylint: disable=too-many-public-methods, too-many-instance-attributes
 	# Driver.generate(...) is called to write the output of a processed Content object.
 	# Driver.makeSite() is called to perform a full site generation.
 	# Driver.run() is used to invoke Alteza overall.
@@ -28,149 +37,275 @@ class Driver:
 		# Just copying & renaming a few args:
 		self.shouldCopyAssets: bool = args.copy_assets
 		self.contentDir: str = args.content
-		self.outputDir: str = args.output
+		self.outputDir: Optional[str] = args.output
 		# Content instance variable:
 		self.content: Optional[Content] = None
+		self.stager: Optional[Stager] = None  # The staging area for the outputs of pages (with --pipeline_output).
+		self.devServer: Optional['DevServer'] = None  # The web server (with --serve).
+		# Kept across builds (in --watch mode), so that unchanged assets are not re-hashed:
+		self.assetHashCache: Optional[AssetHashCache] = (
+			AssetHashCache(args.cache_dir if args.cache else None)
+			if args.fingerprint_assets or args.responsive_images
+			else None
+		)
+		# Compiled code is kept across builds too, so that unchanged code is not recompiled:
+		self.codeCache: CodeCache = CodeCache(args.cache_dir if args.cache else None)
+		# Also kept across builds, so that unchanged pages are not re-indexed:
+		self.searchIndex: Optional[SearchIndex] = (
+			SearchIndex(args.cache_dir if args.cache else None) if args.search_index is not None else None
+		)
 		# Other instance variables:
 		self.shouldExit: bool = False
+		# The time (in ms) taken by each phase of the most recent build (used by the benchmarks):
+		self.phaseTimes: Dict[str, float] = {}
 		CrawlConfig.configFileName = Args.config
 		self.setIgnoreAbsPaths(args)
+		if args.archive is not None:
+			if self.outputDir is not None or args.serve:
+				raise AltezaException('--archive cannot be used along with --output or --serve.')
+			ArchiveOutputWriter.formatOf(args.archive)  # So that an unsupported format is reported before building.
+		elif self.outputDir is None and not args.serve:
+			raise AltezaException(
+				'An output directory (or archive) must be specified with --output (or --archive), unless using --serve.'
+			)
 
 	@staticmethod
-	def generateMdContents(md: Md) -> None:
-		if os.path.exists('index.html'):
-			raise AltezaException(f'An index.html already exists, and conflicts with {md}, at {os.getcwd()}.')
-		with open('index.html', 'w', encoding='utf-8') as pageHtml:
-			pageHtml.write(md.output)
+	def generateMdContents(writer: OutputWriter, md: Md, dirPath: str) -> None:
+		indexHtmlPath = os.path.join(dirPath, 'index.html')
+		if writer.exists(indexHtmlPath):
+			raise AltezaException(f'An index.html already exists, and conflicts with {md}, at {dirPath or "/"}.')
+		Driver.writePage(writer, indexHtmlPath, md)
 
 	@staticmethod
-	def generateMd(md: Md) -> None:
+	def generateMd(writer: OutputWriter, md: Md, dirPath: str) -> None:
 		if not md.isIndex:
-			os.mkdir(md.realName)
-			with enterDir(md.realName):
-				Driver.generateMdContents(md)
+			mdDirPath = os.path.join(dirPath, md.realName)
+			writer.makeDir(mdDirPath)
+			Driver.generateMdContents(writer, md, mdDirPath)
 		else:
-			Driver.generateMdContents(md)
+			Driver.generateMdContents(writer, md, dirPath)
 
 	@staticmethod
-	def generateNonMd(nonMd: NonMd) -> None:
-		fileName = nonMd.rectifiedFileName
-		if os.path.exists(fileName):
-			raise AltezaException(f'File {fileName} already exists, and conflicts with {nonMd}.')
-		with open(fileName, 'w', encoding='utf-8') as nonMdPageFile:
-			nonMdPageFile.write(nonMd.output)
+	def generateNonMd(writer: OutputWriter, nonMd: NonMd, dirPath: str) -> None:
+		filePath = os.path.join(dirPath, nonMd.rectifiedFileName)
+		if writer.exists(filePath):
+			raise AltezaException(f'File {nonMd.rectifiedFileName} already exists, and conflicts with {nonMd}.')
+		Driver.writePage(writer, filePath, nonMd)
 
 	@staticmethod
-	def generatePyPageNode(pyPageNode: PyPageNode) -> None:
+	def writePage(writer: OutputWriter, relPath: str, pyPageNode: PyPageNode) -> None:
+		if pyPageNode.stagedOutput is not None:
+			writer.writeStaged(relPath, pyPageNode.stagedOutput.wait())
+		else:
+			writer.writeText(relPath, pyPageNode.output)
+		writer.precompress(relPath)
+
+	@staticmethod
+	def generatePyPageNode(writer: OutputWriter, pyPageNode: PyPageNode, dirPath: str) -> None:
 		if isinstance(pyPageNode, Md):
-			Driver.generateMd(pyPageNode)
+			Driver.generateMd(writer, pyPageNode, dirPath)
 
 		elif isinstance(pyPageNode, NonMd):
-			Driver.generateNonMd(pyPageNode)
+			Driver.generateNonMd(writer, pyPageNode, dirPath)
 
 		else:
 			raise AltezaException(f'{pyPageNode} pyPage attribute is invalid.')
 
-	def generateStaticAsset(self, fileNode: FileNode) -> None:
-		if self.shouldCopyAssets:
-			shutil.copyfile(fileNode.absoluteFilePath, fileNode.fileName)
+	def generateStaticAsset(
+		self, writer: OutputWriter, fileNode: FileNode, dirPath: str, responsiveImages: Optional[ResponsiveImages]
+	) -> None:
+		fileName = fileNode.fileName
+		if fileNode.canonicalAsset is not None:
+			if fileNode.canonicalAsset is not fileNode:
+				return  # An identical asset is published instead (see `fingerprintAssets`).
+			assert fileNode.fingerprintedName is not None
+			fileName = fileNode.fingerprintedName
+		writer.writeAsset(os.path.join(dirPath, fileName), fileNode.absoluteFilePath, self.shouldCopyAssets)
+		writer.precompress(os.path.join(dirPath, fileName))
+		if responsiveImages is not None and isResizableImage(fileNode):
+			for variant in responsiveImages.describe(fileNode).variants:
+				writer.writeAsset(os.path.join(dirPath, variant.fileName), variant.cachePath, self.shouldCopyAssets)
+
+	def makeOutputWriter(self) -> OutputWriter:
+		if self.args.serve:
+			return MemoryOutputWriter()  # Note: outputs are not precompressed, since they are served from memory.
+		writer: OutputWriter
+		if self.args.sync_output and self.args.atomic_output:
+			raise AltezaException('Only one of --sync_output and --atomic_output can be used at a time.')
+		if self.args.archive is not None:
+			if self.args.sync_output or self.args.atomic_output:
+				raise AltezaException('--sync_output and --atomic_output cannot be used with --archive.')
+			writer = ArchiveOutputWriter(self.args.archive, self.args.clear_output_dir)
+		elif self.outputDir is None:
+			raise AltezaException('No output directory was specified.')  # See `__init__`.
+		elif self.args.sync_output:
+			writer = SyncingOutputWriter(self.outputDir, self.args.clear_output_dir)
+		elif self.args.atomic_output:
+			writer = AtomicOutputWriter(self.outputDir, self.args.clear_output_dir)
 		else:
-			os.symlink(fileNode.absoluteFilePath, fileNode.fileName)
-
-	def generate(self, content: Content) -> None:
-		def walk(curDir: DirNode) -> None:
+			writer = OutputWriter(self.outputDir, self.args.clear_output_dir)
+		if self.args.precompress:
+			cacheDir = self.args.cache_dir if self.args.cache else None
+			writer.precompressor = Precompressor(cacheDir, self.args.precompress_jobs)
+		return writer
+
+	def generate(self, content: Content) -> OutputWriter:
+		writer = self.makeOutputWriter()
+		writer.begin()
+		if self.searchIndex is not None:
+			self.searchIndex.begin()
+
+		def walk(curDir: DirNode, dirPath: str) -> None:
 			ProgressBar.increment()
 			for subDir in filter(lambda node: node.shouldPublish, curDir.subDirs):
-				os.mkdir(subDir.dirName)
-				with enterDir(subDir.dirName):
-					walk(subDir)
+				subDirPath = os.path.join(dirPath, subDir.dirName)
+				writer.makeDir(subDirPath)
+				walk(subDir, subDirPath)
 
 			for fileNode in filter(lambda node: node.shouldPublish, curDir.files):
 				if isinstance(fileNode, PyPageNode):
-					Driver.generatePyPageNode(fileNode)
+					with StopWatch() as sw:
+						Driver.generatePyPageNode(writer, fileNode, dirPath)
+					content.profiler.get(fileNode.fullPath).write += sw.t
+					if self.searchIndex is not None:
+						self.searchIndex.add(fileNode, dirPath)
 				else:
-					self.generateStaticAsset(fileNode)
+					self.generateStaticAsset(writer, fileNode, dirPath, content.responsiveImages)
 				ProgressBar.increment()
 
-		with enterDir(self.outputDir):
-			walk(content.rootDir)
+		try:
+			walk(content.rootDir, '')
+			if self.searchIndex is not None:
+				assert self.args.search_index is not None
+				pr(self.searchIndex.write(writer, self.args.search_index))
+			if writer.precompressor is not None:
+				pr(writer.precompressor.finish(writer))
+			writer.finish()
+		except BaseException:
+			if writer.precompressor is not None:
+				writer.precompressor.shutdown()
+			writer.abort()
+			raise
+		if self.devServer is not None and isinstance(writer, MemoryOutputWriter):
+			self.devServer.publish(writer.files, writer.dirs)
+		return writer
 
 	def checkContentDir(self) -> None:
 		if not os.path.isdir(self.contentDir):
 			raise AltezaException(f"The provided path '{self.contentDir}' does not exist or is not a directory.")
 
-	def resetOutputDir(self) -> None:
-		if os.path.isfile(self.outputDir):
-			raise AltezaException(
-				f'A file named {self.outputDir} already exists. Please move it or delete it. '
-				'Note that if this had been a directory, we would have erased it.'
-			)
-		if os.path.isdir(self.outputDir):
-			if not self.args.clear_output_dir:
-				raise AltezaException(
-					f'Specified output directory {self.outputDir} already exists.\n'
-					'Please use --clear_output_dir to delete it prior to site generation.'
-				)
-			pr(f'Deleting directory {Fore.dark_red_2}%s{Style.reset} and all of its content...\n' % self.outputDir)
-			shutil.rmtree(self.outputDir)
-		os.mkdir(self.outputDir)
-
 	def analyzeGitHistory(self, nameRegistry: NameRegistry) -> None:
-		inGitRepo = os.path.exists('.git')  # Improve this to find the nearest ascendant git repo.
-		if not inGitRepo:
+		FileNode.gitCommitDates = None
+		FileNode.startGitCommitDates = None
+		if self.args.no_git_dates:
+			pr('Skipping git history analysis.\n')
+			return
+		# pygit2 takes a while to import, so it is only imported if the content is (probably) in a git repository:
+		if not isInGitRepository(self.contentDir):
 			pr(f'Warning: {Fore.light_red}Not in a git repository{Style.reset}.\n')
+			return
+		contentAbsPath = os.path.abspath(self.contentDir)  # (The dates are first needed inside the content directory.)
+		filePaths = [fileNode.fullPath for fileNode in nameRegistry.allFiles.values()]
+
+		def startGitCommitDates(fileNode: FileNode) -> Optional['BackgroundCommitDates']:
+			from .gitdates import BackgroundCommitDates, makeCommitDateIndexer  # pylint: disable=import-outside-toplevel
+
+			indexer = makeCommitDateIndexer(contentAbsPath)
+			if indexer is None:
+				pr(f'Warning: {Fore.light_red}Not in a git repository{Style.reset}.')
+				return None
+			pr(f'Analyzing git history in the background (first needed for {fileNode.fullPath})...')
+			return BackgroundCommitDates(indexer, filePaths).start()
 
-		def getGitRelPath(fileNode: FileNode) -> str:
-			if self.contentDir == '.':
-				return fileNode.fullPath
-			return os.path.join(self.contentDir, fileNode.fullPath)
-
-		startTimeNs = time.time_ns()
-		pr('Analyzing git history...', end='')
-		filesPathsToFileNodes: dict[str, FileNode] = {
-			getGitRelPath(fileNode): fileNode for fileNode in nameRegistry.allFiles.values()
-		}
-		fileCommitDates: Dict[str, Tuple[datetime, datetime]] = getFilesCommitDates(list(filesPathsToFileNodes.keys()))
-		for filePath, (firstCommitDate, lastCommitDate) in fileCommitDates.items():
-			fileNode = filesPathsToFileNodes[filePath]
-			fileNode.gitFirstCommitDate = firstCommitDate
-			fileNode.gitLastCommitDate = lastCommitDate
-
-		elapsedMilliseconds = (time.time_ns() - startTimeNs) / 10**6
-		pr(f' got the dates of {len(fileCommitDates)} files. Took {elapsedMilliseconds:.2f} ms.\n')
+		# The git history is only analyzed once some page (or config file) needs the dates of some file:
+		FileNode.startGitCommitDates = startGitCommitDates
+
+	@staticmethod
+	def reportGitHistory(commitDates: 'BackgroundCommitDates') -> None:
+		fileCommitDates = commitDates.wait()
+		indexer = commitDates.indexer
+		indexUpdate = 'rebuilt the commit date index' if indexer.rebuilt else 'updated the commit date index'
+		pr(
+			f'  Git history analysis got the dates of {len(fileCommitDates)} files'
+			f' ({indexUpdate} with {indexer.walkedCommitCount} commits). Took {commitDates.elapsedNs / 10**6:.2f} ms,'
+			f' of which {commitDates.waitedNs / 10**6:.2f} ms was spent waiting for it.'
+		)
 
 	def processContent(self) -> Content:
 		with enterDir(self.contentDir):
 			startTimeNs = time.time_ns()
 			pr('Analyzing content directory...', end='')
-			fsCrawlResult = crawl()
+			fsCrawlResult = crawl(threads=self.args.crawl_threads)
 			elapsedMilliseconds = (time.time_ns() - startTimeNs) / 10**6
 			pr(f' took {elapsedMilliseconds:.2f} ms.')
 			pr(fsCrawlResult.nameRegistry)
+			self.phaseTimes['crawl'] = elapsedMilliseconds
 
-		# Analyze git history
+		# Analyze git history (once it is needed)
 		self.analyzeGitHistory(fsCrawlResult.nameRegistry)
 
 		# Process content
+		self.stager = self.makeStager()
 		with enterDir(self.contentDir):
 			startTimeNs = time.time_ns()
 			progress_total = fsCrawlResult.nameRegistry.pageCount
 			ProgressBar.start(progress_total, 'Processing')
-			content = Content(self.args, fsCrawlResult)
+			content = Content(
+				self.args, fsCrawlResult, BuildResources(self.stager, self.assetHashCache, self.codeCache)
+			)
 			content.process()
 			ProgressBar.finish(progress_total)
 			elapsedMilliseconds = (time.time_ns() - startTimeNs) / 10**6
 			pr(f'\nSuccessfully completed processing. Took {elapsedMilliseconds:.2f} ms. Of which:')
+			self.phaseTimes['processing'] = elapsedMilliseconds
 			pr(
 				f'  PyPage processing took {content.timePyPage.total() / 10**6:.2f} ms'
 				f' in total for {content.timePyPage.count()} calls,'
 				f' with each call averaging {content.timePyPage.average() / 10**6:.2f} ms.'
 			)
+			if content.timeMarkdown.count() > 0:
+				pr(
+					f'  Markdown processing took {content.timeMarkdown.total() / 10**6:.2f} ms'
+					f' in total for {content.timeMarkdown.count()} calls,'
+					f' with each call averaging {content.timeMarkdown.average() / 10**6:.2f} ms.'
+				)
+			if content.timeLinks.count() > 0:
+				pr(
+					f'  Link resolution took {content.timeLinks.total() / 10**6:.2f} ms'
+					f' in total for {content.timeLinks.count()} links'
+					f' ({content.linker.relativeUrlsComputed} relative URLs computed, the rest memoized),'
+					f' with each link averaging {content.timeLinks.average() / 10**6:.4f} ms.'
+				)
+			if content.highlightCache is not None:
+				pr(
+					f'  Highlight cache: {content.highlightCache.hits} code blocks reused,'
+					f' {content.highlightCache.misses} code blocks highlighted afresh.'
+				)
+			pr(
+				f'  Template cache: {content.templateCache.hits} parsed templates reused,'
+				f' {content.templateCache.misses} templates parsed.'
+			)
 			pr(
-				f'  Markdown processing took {content.timeMarkdown.total() / 10**6:.2f} ms'
-				f' in total for {content.timeMarkdown.count()} calls,'
-				f' with each call averaging {content.timeMarkdown.average() / 10**6:.2f} ms.'
+				f'  Code cache: {content.codeCache.hits} compiled code blocks reused,'
+				f' {content.codeCache.misses} code blocks compiled.'
 			)
+			if content.minificationStats.count > 0:
+				pr(f'  {content.minificationStats.summary()}')
+			if content.renderCache is not None:
+				pr(
+					f'  Render cache: {content.renderCache.hits} pages reused,'
+					f' {content.renderCache.misses} pages rendered afresh.'
+				)
+			if self.stager is not None:
+				pr(
+					f'  Staged the outputs of {self.stager.stagedCount} pages'
+					f' ({self.stager.stagedBytes / 2**20:.2f} MiB) with {self.stager.threads} writer threads.'
+				)
+			if FileNode.gitCommitDates is not None:
+				self.reportGitHistory(FileNode.gitCommitDates)
+				self.phaseTimes['git'] = FileNode.gitCommitDates.elapsedNs / 10**6
+			elif FileNode.startGitCommitDates is not None and not content.processedInParallel:
+				pr('  Git history was not analyzed, since no commit dates were used.')
 			pr()
 
 		pr('File Tree:')
@@ -178,34 +313,50 @@ class Driver:
 
 		return content
 
+	def makeStager(self) -> Optional[Stager]:
+		if self.args.pipeline_output <= 0:
+			return None
+		if self.args.archive is not None:
+			return Stager(os.path.dirname(os.path.abspath(self.args.archive)), self.args.pipeline_output)
+		if self.outputDir is None:
+			return Stager(tempfile.gettempdir(), self.args.pipeline_output)  # Staged files are served from there.
+		# The staging area is placed next to the output directory (and so, most likely on the same file system),
+		# so that staged files can be hard-linked into place:
+		return Stager(os.path.dirname(os.path.abspath(self.outputDir)), self.args.pipeline_output)
+
+	def closeStager(self) -> None:
+		if self.stager is not None:
+			self.stager.close()
+			self.stager = None
+
 	def makeSite(self) -> int:
 		try:
 			startTimeNs = time.time_ns()
 
 			self.checkContentDir()
+			self.content = None
+			self.phaseTimes = {}
+			self.closeStager()  # The staging area of the previous build (retained for incremental rebuilds).
 			content = self.processContent()
 
 			# Generate site
 			genStartTimeNs = time.time_ns()
 			ProgressBar.start(content.publicNodeCounts.total(), 'Generating')
-			self.resetOutputDir()
-			self.generate(content)
+			writer = self.generate(content)
 			ProgressBar.close()
 			genElapsedMilliseconds = (time.time_ns() - genStartTimeNs) / 10**6
-			pr(f'Generation complete. Took {genElapsedMilliseconds:.2f} ms.')
+			pr(f'Generation complete. Took {genElapsedMilliseconds:.2f} ms. {writer.summary()}')
+			self.phaseTimes['generation'] = genElapsedMilliseconds
 
 			elapsedMilliseconds = (time.time_ns() - startTimeNs) / 10**6
-			if len(content.warnings) > 0:
-				pr('\nWarnings:')
-				pr(
-					'\n  '.join(
-						f'{Fore.light_red}{fN.fullPath}{Style.reset}: {d}' for fN, d in content.warnings.items()
-					)
-				)
+			self.phaseTimes['total'] = elapsedMilliseconds
+			self.printWarnings(content)
+			self.reportProfile(content)
 			pr(
 				# pylint: disable=consider-using-f-string
 				'\nSite build complete (Alteza %s). Time elapsed: %.2f ms' % (alteza_version, elapsedMilliseconds)
 			)
+			self.content = content
 			return 0
 		except (AltezaException, PypageError, PypageSyntaxError) as e:
 			pr(f'\nSite build failed due to Alteza or PyPage error: {e}')
@@ -218,40 +369,71 @@ class Driver:
 		finally:
 			ProgressBar.close()
 
+	def reportProfile(self, content: Content) -> None:
+		if self.args.profile > 0:
+			pr(
+				f'\nSlowest {self.args.profile} files (times in ms; link resolution is part of the pypage & template times):'
+			)
+			pr(content.profiler.table(self.args.profile))
+		if self.args.profile_json is not None:
+			content.profiler.writeJson(self.args.profile_json)
+			pr(f'\nWrote the processing times of {len(content.profiler.timings)} files to {self.args.profile_json}.')
+
+	@staticmethod
+	def printWarnings(content: Content) -> None:
+		if len(content.warnings) > 0:
+			pr('\nWarnings:')
+			pr('\n  '.join(f'{Fore.light_red}{fN.fullPath}{Style.reset}: {d}' for fN, d in content.warnings.items()))
+
+	def rebuildIncrementally(self, changedAbsPaths: Set[str]) -> bool:
+		"""
+		Re-process only the pages affected by the changed files, and re-generate the site.
+		Returns `False` if a full rebuild (with `makeSite`) is required instead.
+		"""
+		content = self.content
+		if content is None:
+			return False
+		try:
+			startTimeNs = time.time_ns()
+			with enterDir(self.contentDir):
+				reprocessedPages = reprocess(content, changedAbsPaths)
+			if reprocessedPages is None:
+				return False
+			pr(f'Re-processed {len(reprocessedPages)} page(s).')
+
+			writer = self.generate(content)
+			pr(writer.summary())
+
+			elapsedMilliseconds = (time.time_ns() - startTimeNs) / 10**6
+			self.printWarnings(content)
+			pr(f'\nIncremental rebuild complete. Time elapsed: {elapsedMilliseconds:.2f} ms')
+		except (AltezaException, PypageError, PypageSyntaxError) as e:
+			pr(f'\nIncremental rebuild failed due to Alteza or PyPage error: {e}')
+			pr(f'\n{traceback.format_exc()}')
+			self.content = None  # The next change will trigger a full rebuild.
+		except Exception as e:
+			pr(f'\nIncremental rebuild failed with unexpected error: {e}')
+			pr(f'\n{traceback.format_exc()}')
+			self.content = None
+		return True
+
 	@staticmethod
 	def setIgnoreAbsPaths(args: Args) -> None:
 		CrawlConfig.ignoreAbsPaths = []
+		CrawlConfig.ignorePatterns = args.ignore_patterns
 		for somePath in args.ignore:
 			if os.path.exists(somePath):
 				CrawlConfig.ignoreAbsPaths.append(os.path.abspath(somePath))
 			else:
 				raise AltezaException(f'Path to ignore `{somePath}` does not exist.')
 
-	class WatchdogEventHandler(FileSystemEventHandler):
-		def __init__(self, contentDir: str) -> None:
-			self.contentDirAbsPath: str = os.path.abspath(contentDir)
-			self.timeOfMostRecentEvent: Optional[int] = None
-			self.pathsOfChangedFiles: Set[str] = set()
-
-		def on_any_event(self, event: FileSystemEvent) -> None:
-			for ignoreAbsPath in CrawlConfig.ignoreAbsPaths:
-				if ignoreAbsPath in event.src_path or ignoreAbsPath in event.dest_path:
-					return
-			if '__pycache__' in event.src_path or '__pycache__' in event.dest_path:
-				return
-			if isHidden(os.path.basename(os.path.normpath(event.src_path))):
-				return
-			if isinstance(event, DirModifiedEvent) and event.src_path == self.contentDirAbsPath:
-				return
-
-			changedPath = event.src_path or event.dest_path
-			if not os.path.isdir(changedPath):
-				changedPath = changedPath.removeprefix(self.contentDirAbsPath)
-				self.pathsOfChangedFiles.add(changedPath)
-			self.timeOfMostRecentEvent = max(self.timeOfMostRecentEvent or 0, time.time_ns())
-
 	def runWatchdog(self) -> None:
-		self.makeSite()
+		# Watchdog is only imported when watching:
+		# pylint: disable=import-outside-toplevel
+		from watchdog.observers import Observer as WatchdogObserver
+		from .watch import WatchdogEventHandler
+
+		self.build()
 
 		timeIntervalNs = 2 * 10**8
 		timeIntervalSecs = 0.2
@@ -259,9 +441,10 @@ class Driver:
 		def logWatching() -> None:
 			pr('\nWatching for changes... press Ctrl+C to exit.')
 
-		eventHandler = Driver.WatchdogEventHandler(self.contentDir)
+		eventHandler = WatchdogEventHandler(self.contentDir)
 		observer = WatchdogObserver()
-		observer.schedule(eventHandler, self.contentDir, recursive=True)
+		# Note: an absolute path is used, since the working directory changes during site generation.
+		observer.schedule(eventHandler, eventHandler.contentDirAbsPath, recursive=True)
 		observer.start()
 		try:
 			logWatching()
@@ -279,17 +462,47 @@ class Driver:
 					timeSinceMostRecentEvent = time.time_ns() - (eventHandler.timeOfMostRecentEvent or 0)
 					if timeSinceMostRecentEvent > timeIntervalNs:
 						eventHandler.timeOfMostRecentEvent = None
-						pr(f'Detected a change in the following files: {eventHandler.pathsOfChangedFiles}')
+						changedPaths = eventHandler.pathsOfChangedFiles
+						structureChanged = eventHandler.structureChanged
 						eventHandler.pathsOfChangedFiles = set()
+						eventHandler.structureChanged = False
+						pr(
+							'Detected a change in the following files: '
+							f'{ {p.removeprefix(eventHandler.contentDirAbsPath) for p in changedPaths} }'
+						)
 						pr('\nRebuilding...\n')
-						self.makeSite()
+						self.build(changedPaths, structureChanged)
 						logWatching()
 		finally:
 			observer.stop()
 			observer.join()
 
+	def build(self, changedPaths: Optional[Set[str]] = None, structureChanged: bool = True) -> None:
+		"""(Re)build the site in watch mode. While building, the web server (if any) holds requests."""
+		if self.devServer is not None:
+			self.devServer.beginBuild()
+		try:
+			if structureChanged or changedPaths is None or not self.rebuildIncrementally(changedPaths):
+				self.makeSite()
+		finally:
+			if self.devServer is not None:
+				self.devServer.endBuild()
+
+	def startDevServer(self) -> None:
+		from .serve import DevServer  # pylint: disable=import-outside-toplevel
+
+		self.devServer = DevServer(self.args.host, self.args.port).start()
+		pr(f'Serving the site at {Fore.light_blue}{self.devServer.url()}{Style.reset}\n')
+
 	def run(self) -> int:
-		if self.args.watch:
-			self.runWatchdog()
-			return 0
-		return self.makeSite()
+		try:
+			if self.args.serve:
+				self.startDevServer()
+			if self.args.watch or self.args.serve:
+				self.runWatchdog()
+				return 0
+			return self.makeSite()
+		finally:
+			self.closeStager()
+			if self.devServer is not None:
+				self.devServer.stop()
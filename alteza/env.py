@@ -0,0 +1,89 @@
+from typing import Any, Dict, Iterator, Mapping, Optional, Set
+
+
+class Env(Mapping[str, Any]):
+	"""
+	An environment (i.e. a collection of variables), represented as a layer of its own variables over a parent
+	environment. Lookups fall through to the parent layers, so each layer only holds what it adds or overrides:
+	the root layer holds the seed & helpers, each directory's layer holds its `dir` and its config's variables,
+	and each page's layer holds the variables defined by the page itself.
+
+	A layer must not be modified once other layers have been stacked on it (since they cache its flattening).
+	"""
+
+	def __init__(self, own: Optional[Dict[str, Any]] = None, parent: Optional['Env'] = None) -> None:
+		self.own: Dict[str, Any] = own if own is not None else {}
+		self.parent: Optional[Env] = parent
+		self._flat: Optional[Dict[str, Any]] = None
+
+	def __getitem__(self, key: str) -> Any:
+		env: Optional[Env] = self
+		while env is not None:
+			if key in env.own:
+				return env.own[key]
+			env = env.parent
+		raise KeyError(key)
+
+	def __contains__(self, key: object) -> bool:
+		env: Optional[Env] = self
+		while env is not None:
+			if key in env.own:
+				return True
+			env = env.parent
+		return False
+
+	def get(self, key: str, default: Any = None) -> Any:
+		env: Optional[Env] = self
+		while env is not None:
+			if key in env.own:
+				return env.own[key]
+			env = env.parent
+		return default
+
+	def __iter__(self) -> Iterator[str]:
+		return iter(self.flat())
+
+	def __len__(self) -> int:
+		return len(self.flat())
+
+	def __setitem__(self, key: str, value: Any) -> None:
+		self.own[key] = value
+		self._flat = None
+
+	def update(self, variables: Mapping[str, Any]) -> None:
+		self.own.update(variables)
+		self._flat = None
+
+	def flat(self) -> Dict[str, Any]:
+		"""All the variables of this environment, in a single dict (which is cached, and must not be modified)."""
+		if self._flat is None:
+			self._flat = self.toDict()
+		return self._flat
+
+	def toDict(self) -> Dict[str, Any]:
+		"""All the variables of this environment, in a new dict (e.g. to execute code in)."""
+		if self.parent is None:
+			return self.own.copy()
+		return self.parent.flat() | self.own
+
+
+# A sentinel for variables that are not in an environment:
+missing: object = object()
+
+# Names that PyPage itself injects into the environment of every PyPage invocation:
+pypageBuiltinNames: Set[str] = {
+	'__builtins__',
+	'__package__',
+	'__name__',
+	'__doc__',
+	'write',
+	'inject',
+	'include',
+	'exists',
+	'escape',
+}
+
+
+def getEnvDelta(envBefore: Mapping[str, Any], envAfter: Dict[str, Any]) -> Dict[str, Any]:
+	"""The variables that were added to (or re-assigned in) `envAfter`, relative to `envBefore`."""
+	return {k: v for k, v in envAfter.items() if k not in pypageBuiltinNames and envBefore.get(k, missing) is not v}
@@ -1,6 +1,7 @@
 import functools
 import os
 import re
+import types
 import unicodedata
 from collections import deque
 from datetime import date, datetime
@@ -15,18 +16,26 @@ from typing import (
 	Optional,
 	Sequence,
 	Tuple,
+	TYPE_CHECKING,
 )
 
-import markdown
-import yaml
 from colored import Fore, Style  # type: ignore
-from markdown.extensions.wikilinks import WikiLinkExtension
 
 from .util import AltezaException, PublicNodeCounts
+from .env import Env
+from .staging import StagedFile, Stager
 
+if TYPE_CHECKING:
+	# These are imported lazily (when first needed), since importing them takes a while:
+	import markdown
+	from .gitdates import BackgroundCommitDates
 
-class FsNode:
+
+class FsNode:  # pylint: disable=too-many-instance-attributes
 	publicNodeCounts: Optional[PublicNodeCounts] = None  # Set by the Content class.
+	# Called with each node whose data (its variables, or its output) is read. Set by the Content class, which records
+	# the node as a dependency of the page being processed (so that pages are re-rendered when what they read changes):
+	onDataRead: Optional[Callable[['FsNode'], None]] = None
 
 	def __init__(self, parent: Optional['DirNode'], dirPath: str, fileName: Optional[str]) -> None:
 		self.parent = parent
@@ -37,10 +46,25 @@ class FsNode:
 			if isinstance(self, DirNode) or not isinstance(fileName, str)
 			else os.path.join(dirPath, fileName)
 		)
+		# The components of `fullPath` (an empty tuple for the root directory):
+		ownName = fileName if isinstance(fileName, str) else self.dirName
+		self.pathParts: Tuple[str, ...] = (parent.pathParts if parent is not None else ()) + (
+			(ownName,) if ownName else ()
+		)
 		self.shouldPublish: bool = False
 		# These fields are populated later during processing:
 		self.linksTo: List['FsNode'] = []
-		self.env: dict[str, Any] = {}
+		self._env: Env = Env()
+
+	@property
+	def env(self) -> Env:
+		if FsNode.onDataRead is not None:
+			FsNode.onDataRead(self)
+		return self._env
+
+	@env.setter
+	def env(self, env: Env) -> None:
+		self._env = env
 
 	def __repr__(self) -> str:
 		return self.colorize(self.fullPath)
@@ -61,20 +85,22 @@ class FsNode:
 		self.shouldPublish = True
 
 	def makePublic(self) -> None:
-		self.runOnFsNodeAndAscendantNodes(self, lambda fsNode: fsNode.setNodeAsPublic())
+		# The ancestors of a public node are always public, so we can stop at the first one that already is:
+		node: Optional[FsNode] = self
+		while node is not None and not node.shouldPublish:
+			node.setNodeAsPublic()
+			node = node.parent
 
 	@staticmethod
 	def runOnFsNodeAndAscendantNodes(startingNode: 'FsNode', fn: Callable[['FsNode'], None]) -> None:
-		def walk(node: FsNode) -> None:
+		node: Optional[FsNode] = startingNode
+		while node is not None:
 			fn(node)
-			if node.parent is not None:
-				walk(node.parent)
-
-		walk(startingNode)
+			node = node.parent
 
 
 class FileNode(FsNode):
-	# pylint: disable=too-many-instance-attributes
+	# pylint: disable=too-many-instance-attributes, too-many-public-methods
 	current_pypage_node_being_processed: Optional['PyPageNode'] = None
 
 	@staticmethod
@@ -119,15 +145,23 @@ class FileNode(FsNode):
 		self.baseName: str = baseName
 		self.realName: str = self.baseName  # to be overwritten selectively
 		self.preSlugRealName: Optional[str] = None
+		# Set for static assets, when they are fingerprinted (see `fingerprintAssets`):
+		self.fingerprintedName: Optional[str] = None  # The content-hashed name it is published under.
+		self.canonicalAsset: Optional[FileNode] = None  # The identical asset (possibly itself) that is published.
 
 		# Note: The parent of a FileNode is always a DirNode (and never None).
 		assert isinstance(self.parent, DirNode)
 		self.parentDir: DirNode = self.parent
 		self.parentName: str = self.parentDir.dirName
 
-		# Populated by Driver.analyzeGitHistory:
-		self.gitFirstCommitDate: Optional[datetime] = None
-		self.gitLastCommitDate: Optional[datetime] = None
+		# Recorded by the crawler (see `recordStat`):
+		self.size: int = 0
+		self.mtime: Optional[float] = None
+		self.inode: int = 0
+
+	def recordStat(self, stat: os.stat_result) -> None:
+		self.size, self.mtime, self.inode = stat.st_size, stat.st_mtime, stat.st_ino
+		self.__dict__.pop('_lastModified', None)  # Invalidate the cached property.
 
 	@functools.cached_property
 	def isIndex(self) -> bool:
@@ -151,52 +185,113 @@ class FileNode(FsNode):
 
 	@staticmethod
 	def relativePath(
-		srcFile: 'FileNode', dstFile: 'FileNode', noMdCorrection: bool = False, useUrlName: bool = True
+		srcFile: 'FileNode',
+		dstFile: 'FileNode',
+		noMdCorrection: bool = False,
+		useUrlName: bool = True,
+		fingerprinted: bool = False,
 	) -> str:
-		dstFileName = FileNode.getFileUrlName(dstFile) if useUrlName else dstFile.fileName
+		dstFileName = FileNode.getFileUrlName(dstFile, fingerprinted) if useUrlName else dstFile.fileName
+		mdCorrection = isinstance(srcFile, Md) and not srcFile.isIndex and not noMdCorrection
+		return FileNode.relativePathFromParts(
+			srcFile.parentDir.pathParts, dstFile.parentDir.pathParts, dstFileName, mdCorrection
+		)
+
+	@staticmethod
+	def relativePathBetween(srcFullPath: str, dstFullPath: str, dstFileName: str, mdCorrection: bool) -> str:
+		"""Like `relativePath`, but only uses paths (so that it can be used without the nodes themselves)."""
+		srcDirParts = tuple(FileNode.splitPath(srcFullPath)[:-1])
+		dstDirParts = tuple(FileNode.splitPath(dstFullPath)[:-1])
+		return FileNode.relativePathFromParts(srcDirParts, dstDirParts, dstFileName, mdCorrection)
 
-		srcPath = FileNode.splitPath(srcFile.fullPath)[:-1]
-		dstPath = FileNode.splitPath(dstFile.fullPath)[:-1]
+	@staticmethod
+	def relativePathFromParts(
+		srcDirParts: Tuple[str, ...], dstDirParts: Tuple[str, ...], dstFileName: str, mdCorrection: bool
+	) -> str:
 		commonLevel = 0
-		for i in range(min(len(srcPath), len(dstPath))):
-			if srcPath[i] == dstPath[i]:
-				commonLevel += 1
-		remainingPath = dstPath[commonLevel:] + [dstFileName]
-
-		relativePath: List[str] = []
-		if commonLevel < len(srcPath):
-			stepsDown = len(srcPath) - commonLevel
-			for _ in range(stepsDown):
-				relativePath.append('..')
-		for p in remainingPath:
-			relativePath.append(p)
-		if isinstance(srcFile, Md) and not srcFile.isIndex and not noMdCorrection:
+		for srcPart, dstPart in zip(srcDirParts, dstDirParts):
+			if srcPart != dstPart:
+				break
+			commonLevel += 1
+
+		relativePath: List[str] = ['..'] * (len(srcDirParts) - commonLevel)
+		relativePath.extend(dstDirParts[commonLevel:])
+		relativePath.append(dstFileName)
+		if mdCorrection:
 			relativePath = ['..'] + relativePath
 
 		relativePathStr = os.path.join('', *relativePath)
 		return relativePathStr
 
 	@staticmethod
-	def getFileUrlName(dstFile: 'FileNode') -> str:
+	def getFileUrlName(dstFile: 'FileNode', fingerprinted: bool = False) -> str:
 		if dstFile.isIndex:
 			return ''
 		if isinstance(dstFile, Md):
 			return dstFile.realName
 		if isinstance(dstFile, NonMd):
 			return dstFile.rectifiedFileName
+		if fingerprinted and dstFile.fingerprintedName is not None:
+			return dstFile.fingerprintedName
 		return dstFile.fileName
 
+	def publishedAssetPath(self) -> str:
+		"""The path that this asset is published at, if it is fingerprinted (and an empty string otherwise)."""
+		asset = self.canonicalAsset
+		if asset is None or asset.fingerprintedName is None:
+			return ''
+		return os.path.join(asset.parentDir.fullPath, asset.fingerprintedName)
+
 	@staticmethod
 	def splitPath(path: str) -> List[str]:
-		head, tail = os.path.split(path)
-		if head == '':
-			return [path]
-		return FileNode.splitPath(head) + [tail]
+		parts: List[str] = []
+		while True:
+			head, tail = os.path.split(path)
+			if head in ('', path):
+				parts.append(path)
+				break
+			parts.append(tail)
+			path = head
+		parts.reverse()
+		return parts
 
 	#
 	# Git & Date related methods
 	#
 
+	gitCommitDates: Optional['BackgroundCommitDates'] = None  # Set once the git commit dates are first needed.
+	# Starts resolving the git commit dates. It is called with the first file whose dates are needed (see `commitDates`),
+	# so that the git history of a site that does not use dates is never analyzed. Set by Driver.analyzeGitHistory:
+	startGitCommitDates: Optional[Callable[['FileNode'], Optional['BackgroundCommitDates']]] = None
+	# Called with each file whose dates are read. Set by the Content class, which records the dates as dependencies of
+	# the page being rendered (so that, with --cache, only the pages that use dates wait for them to be resolved):
+	onDatesRead: Optional[Callable[['FileNode'], None]] = None
+
+	def commitDates(self) -> Optional[Tuple[datetime, datetime]]:
+		# Note: this blocks until the git commit dates have been resolved (on a background thread).
+		if FileNode.startGitCommitDates is not None:
+			startGitCommitDates, FileNode.startGitCommitDates = FileNode.startGitCommitDates, None
+			FileNode.gitCommitDates = startGitCommitDates(self)
+		return FileNode.gitCommitDates.get(self.fullPath) if FileNode.gitCommitDates is not None else None
+
+	def datesFingerprint(self) -> str:
+		"""Identifies all the dates of this file (see the methods below), e.g. to tell if they have changed."""
+		return f'{self.commitDates()}|{self._lastModified}'
+
+	@property
+	def gitFirstCommitDate(self) -> Optional[datetime]:
+		if FileNode.onDatesRead is not None:
+			FileNode.onDatesRead(self)
+		commitDates = self.commitDates()
+		return commitDates[0] if commitDates is not None else None
+
+	@property
+	def gitLastCommitDate(self) -> Optional[datetime]:
+		if FileNode.onDatesRead is not None:
+			FileNode.onDatesRead(self)
+		commitDates = self.commitDates()
+		return commitDates[1] if commitDates is not None else None
+
 	default_date_format: str = '%Y %b %-d'
 	default_datetime_format: str = default_date_format + ' at %-H:%M %p'
 
@@ -221,12 +316,19 @@ class FileNode(FsNode):
 		# The formatting below might only work on Linux. https://stackoverflow.com/a/29980406/908430
 		return self.lastModifiedObj.strftime(f)
 
-	@functools.cached_property
+	@property
 	def lastModifiedObj(self) -> datetime:
 		"""Get the last modified date from: (a) git history, or (b) system modified time."""
-		if self.gitLastCommitDate is not None:
-			return self.gitLastCommitDate
-		return datetime.fromtimestamp(os.path.getmtime(self.absoluteFilePath))
+		if FileNode.onDatesRead is not None:
+			FileNode.onDatesRead(self)
+		return self._lastModified
+
+	@functools.cached_property
+	def _lastModified(self) -> datetime:
+		commitDates = self.commitDates()
+		if commitDates is not None:
+			return commitDates[1]
+		return datetime.fromtimestamp(self.mtime if self.mtime is not None else os.path.getmtime(self.absoluteFilePath))
 
 	#
 	# Visualization
@@ -246,33 +348,45 @@ class FileNode(FsNode):
 		return r
 
 
+class DirListing(NamedTuple):
+	"""The (non-ignored) files of a directory along with their stats, and its subdirectories, as crawled."""
+
+	files: List[Tuple[str, os.stat_result]]
+	subDirs: List[Tuple[str, 'DirListing']]
+
+
 class DirNode(FsNode):
 	def __init__(
-		self,
-		parent: Optional['DirNode'],
-		dirPath: str,
-		# shouldIgnore(name: str, parentPath: str, isDir: bool) -> bool
-		shouldIgnore: Callable[[str, str, bool], bool],
+		self, parent: Optional['DirNode'], dirPath: str, listing: DirListing, withSubDirs: bool = True
 	) -> None:
-		_, subDirNames, fileNames = next(os.walk(dirPath))
 		dirPath = '' if dirPath == os.curdir else dirPath
 		super().__init__(parent, dirPath, None)
 		self.configTitle: Optional[str] = None
 
-		self.files: List[FileNode] = [
-			FileNode.construct(self, dirPath, fileName)
-			for fileName in fileNames
-			if not shouldIgnore(fileName, self.fullPath, False)
-		]
-		self.subDirs: List[DirNode] = [
-			DirNode(self, os.path.join(dirPath, subDirName), shouldIgnore)
-			for subDirName in subDirNames
-			if not shouldIgnore(subDirName, self.fullPath, True)
-		]
+		self.files: List[FileNode] = []
+		for fileName, stat in listing.files:
+			fileNode = FileNode.construct(self, dirPath, fileName)
+			fileNode.recordStat(stat)
+			self.files.append(fileNode)
+		self.subDirs: List[DirNode] = []
 
 		# Note: if `dirName` is an empty string (""), that means we're at the root (/).
 		self.dirName: str = self.dirName if len(self.dirName) > 0 else '/'
 
+		if withSubDirs:
+			self.constructSubTree(dirPath, listing)
+
+	def constructSubTree(self, dirPath: str, listing: DirListing) -> None:
+		"""Construct all the directories below this one (with a worklist, so that depth is not limited)."""
+		worklist: List[Tuple[DirNode, str, DirListing]] = [(self, dirPath, listing)]
+		while worklist:
+			dirNode, nodeDirPath, nodeListing = worklist.pop()
+			for subDirName, subListing in nodeListing.subDirs:
+				subDirPath = os.path.join(nodeDirPath, subDirName)
+				subDir = DirNode(dirNode, subDirPath, subListing, withSubDirs=False)
+				dirNode.subDirs.append(subDir)
+				worklist.append((subDir, subDirPath, subListing))
+
 	@property
 	def pages(self) -> Sequence['PageNode']:
 		return [f for f in self.files if (isinstance(f, PageNode) and not f.isIndex)]
@@ -321,9 +435,21 @@ class DirNode(FsNode):
 
 
 class PageNode(FileNode):
-	def __getattr__(self, attr: str) -> None:
-		"""Allows for checking whether page.some_property exists more easily (without `hasattr`)."""
-		return None
+	def __getattr__(self, attr: str) -> Any:
+		"""
+		The variables of the page's env (including inherited ones) are accessible as attributes of the page.
+		Missing attributes are `None`, which allows for checking whether page.some_property exists more easily
+		(without `hasattr`).
+		"""
+		env = self.__dict__.get('_env')  # Not `self.env`, which would recurse (e.g. while unpickling).
+		if env is None or attr.startswith('_'):
+			return None
+		if FsNode.onDataRead is not None:
+			FsNode.onDataRead(self)
+		if attr not in env:
+			return None
+		value = env[attr]
+		return None if isinstance(value, types.ModuleType) else value
 
 
 class PyPageNode(PageNode):
@@ -339,6 +465,7 @@ class PyPageNode(PageNode):
 	def __init__(self, parent: Optional[DirNode], dirPath: str, fileName: str) -> None:
 		super().__init__(parent, dirPath, fileName)
 		self._pyPageOutput: Optional[str] = None  # to be generated (by pypage)
+		self.stagedOutput: Optional[StagedFile] = None  # Set instead of the above, once the output has been staged.
 
 	@functools.cached_property
 	def parents(self) -> deque[DirNode]:
@@ -380,7 +507,11 @@ class PyPageNode(PageNode):
 
 	@property
 	def output(self) -> str:
+		if FsNode.onDataRead is not None:
+			FsNode.onDataRead(self)
 		if self._pyPageOutput is None:
+			if self.stagedOutput is not None:
+				return self.stagedOutput.read()  # Note: the output is re-read each time, and not kept in memory.
 			raise AltezaException('PyPage output has not been generated yet.')
 		assert isinstance(self._pyPageOutput, str)
 		return self._pyPageOutput
@@ -388,6 +519,12 @@ class PyPageNode(PageNode):
 	@output.setter
 	def output(self, htmlOutput: str) -> None:
 		self._pyPageOutput = htmlOutput
+		self.stagedOutput = None
+
+	def stageOutput(self, stager: Stager) -> None:
+		"""Write the output to the staging area (in the background), and drop it from memory."""
+		self.stagedOutput = stager.stage(self.fullPath, self.output)
+		self._pyPageOutput = None
 
 
 def buildWikiUrl(label: str, base: str, end: str) -> str:
@@ -396,30 +533,43 @@ def buildWikiUrl(label: str, base: str, end: str) -> str:
 
 
 class Md(PyPageNode):
-	md = markdown.Markdown(
-		# See: https://python-markdown.github.io/extensions/
-		extensions=[
-			# Extra extensions:
-			'abbr',
-			'attr_list',
-			'def_list',
-			'fenced_code',
-			'footnotes',
-			'md_in_html',
-			'tables',
-			# Standard extensions:
-			'admonition',
-			'codehilite',
-			'meta',
-			'mdx_breakless_lists',
-			# "sane_lists",
-			'mdx_truly_sane_lists',
-			'smarty',  # not sure
-			'toc',
-			WikiLinkExtension(html_class='', build_url=buildWikiUrl),
-		],
-		extension_configs={'mdx_truly_sane_lists': {'nested_indent': 4}},
-	)
+	# The Markdown engine is built when the first Markdown page is converted (see `markdownEngine`):
+	md: Optional['markdown.Markdown'] = None
+
+	@staticmethod
+	def markdownEngine() -> 'markdown.Markdown':
+		if Md.md is None:
+			# pylint: disable=import-outside-toplevel
+			import markdown
+			from markdown.extensions.wikilinks import WikiLinkExtension
+			from .highlight import installCachedCodeHilite
+
+			installCachedCodeHilite()
+			Md.md = markdown.Markdown(
+				# See: https://python-markdown.github.io/extensions/
+				extensions=[
+					# Extra extensions:
+					'abbr',
+					'attr_list',
+					'def_list',
+					'fenced_code',
+					'footnotes',
+					'md_in_html',
+					'tables',
+					# Standard extensions:
+					'admonition',
+					'codehilite',
+					'meta',
+					'mdx_breakless_lists',
+					# "sane_lists",
+					'mdx_truly_sane_lists',
+					'smarty',  # not sure
+					'toc',
+					WikiLinkExtension(html_class='', build_url=buildWikiUrl),
+				],
+				extension_configs={'mdx_truly_sane_lists': {'nested_indent': 4}},
+			)
+		return Md.md
 
 	def __init__(self, parent: Optional[DirNode], dirPath: str, fileName: str) -> None:
 		super().__init__(parent, dirPath, fileName)
@@ -447,10 +597,14 @@ class Md(PyPageNode):
 
 	@staticmethod
 	def processMarkdown(text: str) -> Result:
-		html: str = Md.md.convert(text)
+		import yaml  # pylint: disable=import-outside-toplevel
+
+		md = Md.markdownEngine()
+		md.reset()  # Clear any state (e.g. footnotes) left over from the previous conversion.
+		html: str = md.convert(text)
 		yamlFrontMatter: str = ''
 
-		for name, lines in Md.md.Meta.items():  # type: ignore # pylint: disable=no-member
+		for name, lines in md.Meta.items():  # type: ignore # pylint: disable=no-member
 			yamlFrontMatter += f'{name} : {lines[0]} \n'
 			for line in lines[1:]:
 				yamlFrontMatter += ' ' * (len(name) + 3) + line + '\n'
@@ -490,3 +644,24 @@ class NonMd(PyPageNode):
 		super().__init__(parent, dirPath, fileName)
 		self.realName = realName
 		self.rectifiedFileName: str = rectifiedFileName
+
+
+def getFileNodesByFullPath(rootDir: DirNode) -> Dict[str, FileNode]:
+	fileNodesByFullPath: Dict[str, FileNode] = {}
+	worklist: List[DirNode] = [rootDir]
+	while worklist:
+		dirNode = worklist.pop()
+		for fileNode in dirNode.files:
+			fileNodesByFullPath[fileNode.fullPath] = fileNode
+		worklist.extend(dirNode.subDirs)
+	return fileNodesByFullPath
+
+
+def getFsNodesByFullPath(rootDir: DirNode) -> Dict[str, FsNode]:
+	nodesByFullPath: Dict[str, FsNode] = dict(getFileNodesByFullPath(rootDir))
+	worklist: List[DirNode] = [rootDir]
+	while worklist:
+		dirNode = worklist.pop()
+		nodesByFullPath[dirNode.fullPath] = dirNode
+		worklist.extend(dirNode.subDirs)
+	return nodesByFullPath
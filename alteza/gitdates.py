@@ -0,0 +1,209 @@
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pygit2  # type: ignore
+from pygit2.enums import DeltaStatus, SortMode  # type: ignore
+from pygit2.repository import Repository  # type: ignore
+
+from .util import StopWatch
+
+# pylint: disable=no-member
+
+
+@dataclass
+class CommitDateIndex:
+	"""
+	The first & last commit times (as Unix timestamps) of every file ever committed inside a content directory,
+	as of the commit `headOid`. Paths are relative to the content directory.
+	"""
+
+	contentPrefix: str  # The content directory, relative to the repository root ('' if they are the same).
+	headOid: Optional[str] = None
+	commitTimes: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+	version: int = 1
+
+	def touch(self, path: str, commitTime: int) -> None:
+		if path in self.commitTimes:
+			first, last = self.commitTimes[path]
+			self.commitTimes[path] = (min(first, commitTime), max(last, commitTime))
+		else:
+			self.commitTimes[path] = (commitTime, commitTime)
+
+	def rename(self, oldPath: str, newPath: str, commitTime: int) -> None:
+		# A renamed file keeps its history (i.e. its first commit time) under its new path:
+		if oldPath in self.commitTimes:
+			oldFirst, _ = self.commitTimes[oldPath]
+			self.touch(newPath, oldFirst)
+		self.touch(oldPath, commitTime)
+		self.touch(newPath, commitTime)
+
+	def getDates(self, filePaths: Iterable[str]) -> Dict[str, Tuple[datetime, datetime]]:
+		dates: Dict[str, Tuple[datetime, datetime]] = {}
+		for filePath in filePaths:
+			if filePath in self.commitTimes:
+				first, last = self.commitTimes[filePath]
+				dates[filePath] = (datetime.fromtimestamp(first), datetime.fromtimestamp(last))
+		return dates
+
+
+class CommitDateIndexer:
+	"""
+	Maintains a `CommitDateIndex` for a content directory, stored inside the repository's `.git` directory.
+	Each build only walks the commits made since the last indexed commit, and only diffs the content directory's
+	subtree of each commit (skipping commits that did not change it). If the history has been rewritten (i.e.
+	the last indexed commit is no longer an ancestor of HEAD), the index is rebuilt from scratch.
+	"""
+
+	def __init__(self, repo: Repository, contentPrefix: str) -> None:
+		self.repo: Repository = repo
+		self.contentPrefix: str = contentPrefix
+		prefixHash = hashlib.sha256(contentPrefix.encode('utf-8')).hexdigest()[:16]
+		self.indexPath: str = os.path.join(repo.path, 'alteza', f'commit-dates-{prefixHash}.pickle')
+		self.walkedCommitCount: int = 0
+		self.rebuilt: bool = False
+
+	def load(self) -> Optional[CommitDateIndex]:
+		try:
+			with open(self.indexPath, 'rb') as indexFile:
+				index = pickle.load(indexFile)  # nosec B301 -- this file is written only by Alteza itself.
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+			return None
+		if (
+			not isinstance(index, CommitDateIndex)
+			or index.version != CommitDateIndex.version
+			or index.contentPrefix != self.contentPrefix
+		):
+			return None
+		return index
+
+	def save(self, index: CommitDateIndex) -> None:
+		os.makedirs(os.path.dirname(self.indexPath), exist_ok=True)
+		tmpPath = f'{self.indexPath}.{os.getpid()}.tmp'
+		with open(tmpPath, 'wb') as indexFile:
+			pickle.dump(index, indexFile)
+		os.replace(tmpPath, self.indexPath)
+
+	def isIndexedCommitAncestorOfHead(self, indexedOid: str, headOid: pygit2.Oid) -> bool:
+		try:
+			indexedCommitOid = pygit2.Oid(hex=indexedOid)
+			# Note: `descendant_of` raises a `GitError` if the indexed commit no longer exists.
+			return indexedCommitOid == headOid or self.repo.descendant_of(headOid, indexedCommitOid)
+		except (ValueError, pygit2.GitError):
+			return False
+
+	def update(self) -> CommitDateIndex:
+		"""Bring the stored index up to date with HEAD, and return it."""
+		if self.repo.head_is_unborn:
+			return CommitDateIndex(self.contentPrefix)
+		headOid = self.repo.head.peel(pygit2.Commit).id
+		index = self.load()
+		if index is not None and index.headOid == str(headOid):
+			return index
+		if index is None or index.headOid is None or not self.isIndexedCommitAncestorOfHead(index.headOid, headOid):
+			index = CommitDateIndex(self.contentPrefix)
+			self.rebuilt = True
+
+		walker = self.repo.walk(headOid, SortMode.TOPOLOGICAL | SortMode.REVERSE)
+		if index.headOid is not None:
+			walker.hide(pygit2.Oid(hex=index.headOid))
+		for commit in walker:  # Oldest first, so that renames are seen after the files' earlier history.
+			self.indexCommit(index, commit)
+			self.walkedCommitCount += 1
+
+		index.headOid = str(headOid)
+		self.save(index)
+		return index
+
+	def contentTree(self, commit: pygit2.Commit) -> Optional[pygit2.Tree]:
+		if not self.contentPrefix:
+			return commit.tree
+		try:
+			subtree = commit.tree[self.contentPrefix]
+		except KeyError:
+			return None
+		return subtree if isinstance(subtree, pygit2.Tree) else None
+
+	def indexCommit(self, index: CommitDateIndex, commit: pygit2.Commit) -> None:
+		newTree = self.contentTree(commit)
+		# Like `git log --first-parent` diffs, each commit is compared against its first parent only:
+		oldTree = self.contentTree(commit.parents[0]) if commit.parents else None
+		if newTree is None:
+			if oldTree is None:
+				return
+			diff = oldTree.diff_to_tree()  # Everything in `oldTree` was deleted.
+		elif oldTree is None:
+			diff = newTree.diff_to_tree(swap=True)  # Everything in `newTree` was added.
+		elif newTree.id == oldTree.id:
+			return  # Nothing changed inside the content directory.
+		else:
+			diff = oldTree.diff_to_tree(newTree)
+		diff.find_similar()  # Detect renames.
+
+		# Note: since only the content directory's subtree is diffed, paths are relative to the content directory.
+		for delta in diff.deltas:
+			if delta.status == DeltaStatus.RENAMED:
+				index.rename(delta.old_file.path, delta.new_file.path, commit.commit_time)
+			elif delta.status == DeltaStatus.DELETED:
+				index.touch(delta.old_file.path, commit.commit_time)
+			else:
+				index.touch(delta.new_file.path, commit.commit_time)
+
+
+def makeCommitDateIndexer(contentDir: str) -> Optional[CommitDateIndexer]:
+	"""Returns an indexer for the git repository that `contentDir` is in, or `None` if it is not in one."""
+	repoPath = pygit2.discover_repository(os.path.abspath(contentDir))
+	if repoPath is None:
+		return None
+	repo = Repository(repoPath)
+	if repo.workdir is None:
+		return None  # A bare repository.
+	contentPrefix = os.path.relpath(os.path.realpath(contentDir), os.path.realpath(repo.workdir))
+	return CommitDateIndexer(repo, '' if contentPrefix == os.curdir else contentPrefix)
+
+
+class BackgroundCommitDates:
+	"""
+	Resolves the commit dates of files on a background thread, so that content processing can proceed in the
+	meantime. Looking up a file's dates (with `get`) only blocks if they have not been resolved yet.
+	"""
+
+	def __init__(self, indexer: CommitDateIndexer, filePaths: List[str]) -> None:
+		self.indexer: CommitDateIndexer = indexer
+		self.dates: Dict[str, Tuple[datetime, datetime]] = {}
+		self.error: Optional[Exception] = None
+		self.elapsedNs: int = 0  # Time taken to resolve the dates (on the background thread).
+		self.waitedNs: int = 0  # Time spent blocked on the dates (by the threads looking them up).
+		self.resolved: threading.Event = threading.Event()
+		self.thread: threading.Thread = threading.Thread(
+			target=self.resolve, args=(filePaths,), name='git-dates', daemon=True
+		)
+
+	def start(self) -> 'BackgroundCommitDates':
+		self.thread.start()
+		return self
+
+	def resolve(self, filePaths: List[str]) -> None:
+		with StopWatch() as sw:
+			try:
+				self.dates = self.indexer.update().getDates(filePaths)
+			except Exception as e:  # pylint: disable=broad-exception-caught
+				self.error = e  # Re-raised by `wait`, in the thread that needs the dates.
+		self.elapsedNs = sw.t
+		self.resolved.set()
+
+	def wait(self) -> Dict[str, Tuple[datetime, datetime]]:
+		if not self.resolved.is_set():
+			with StopWatch() as sw:
+				self.resolved.wait()
+			self.waitedNs += sw.t
+		if self.error is not None:
+			raise self.error
+		return self.dates
+
+	def get(self, filePath: str) -> Optional[Tuple[datetime, datetime]]:
+		return self.wait().get(filePath)
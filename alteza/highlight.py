@@ -0,0 +1,93 @@
+import contextlib
+from typing import Any, Dict, Generator, Optional
+
+from .cache import DiskCache, fingerprint, hashText
+from .util import packageVersion
+
+
+class HighlightCache(DiskCache):
+	"""
+	Syntax-highlighted code blocks (i.e. the HTML produced by Pygments, via the `codehilite` extension), keyed by
+	their code, language, highlighting options, and the site's `pygments_style`. Entries are also kept in memory,
+	since the same snippet is often repeated across many pages.
+	"""
+
+	def __init__(self, cacheDir: str) -> None:
+		super().__init__(cacheDir, 'highlight')
+		self.memory: Dict[str, str] = {}
+
+	@staticmethod
+	def key(
+		code: str, lang: Optional[str], options: Dict[str, Any], shebang: bool, pygmentsStyle: str
+	) -> Optional[str]:
+		optionsFingerprint = fingerprint(options)
+		if optionsFingerprint is None:
+			return None  # The code block is highlighted afresh, since its options cannot be fingerprinted.
+		return hashText(
+			packageVersion('Pygments'),
+			packageVersion('Markdown'),
+			code,
+			str(lang),
+			optionsFingerprint,
+			str(shebang),
+			pygmentsStyle,
+		)
+
+	def lookup(self, key: str) -> Optional[str]:
+		html = self.memory.get(key)
+		if html is None:
+			html = self.get(key)
+			if not isinstance(html, str):
+				self.misses += 1
+				return None
+			self.memory[key] = html
+		self.hits += 1
+		return html
+
+	def store(self, key: str, html: str) -> None:
+		self.memory[key] = html
+		self.put(key, html)
+
+
+# The cache used by `CachedCodeHilite` (if any), and the `pygments_style` of the page being converted:
+activeCache: Optional[HighlightCache] = None
+activePygmentsStyle: str = ''
+
+
+@contextlib.contextmanager
+def highlightingWith(highlightCache: Optional[HighlightCache], pygmentsStyle: Any) -> Generator[None, None, None]:
+	"""Use `highlightCache` for the code blocks of Markdown converted inside this context."""
+	global activeCache, activePygmentsStyle  # pylint: disable=global-statement
+	activeCache, activePygmentsStyle = highlightCache, str(pygmentsStyle)
+	try:
+		yield
+	finally:
+		activeCache, activePygmentsStyle = None, ''
+
+
+def installCachedCodeHilite() -> None:
+	"""
+	Make the `codehilite` and `fenced_code` extensions highlight code through `CachedCodeHilite`. This is called
+	when the Markdown engine is built (see `Md.markdownEngine`), so that Pygments is only imported when needed.
+	"""
+	# pylint: disable=import-outside-toplevel
+	from markdown.extensions import codehilite, fenced_code
+
+	class CachedCodeHilite(codehilite.CodeHilite):  # pylint: disable=too-few-public-methods
+		"""A `CodeHilite` that reuses previously highlighted code blocks from the active `HighlightCache`."""
+
+		def hilite(self, shebang: bool = True) -> str:
+			if activeCache is None:
+				return super().hilite(shebang)
+			key = HighlightCache.key(self.src, self.lang, self.options, shebang, activePygmentsStyle)
+			if key is None:
+				return super().hilite(shebang)
+			html = activeCache.lookup(key)
+			if html is None:
+				html = super().hilite(shebang)
+				activeCache.store(key, html)
+			return html
+
+	# Both extensions construct `CodeHilite` objects through their module globals:
+	codehilite.CodeHilite = CachedCodeHilite  # type: ignore
+	fenced_code.CodeHilite = CachedCodeHilite  # type: ignore
@@ -0,0 +1,229 @@
+import html
+import importlib.util
+import os
+import posixpath
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .assets import AssetHashCache, fingerprintLength
+from .cache import DiskCache, hashText
+from .fs import FileNode
+from .util import AltezaException, StopWatch, packageVersion
+
+# The (raster) image formats that resized variants are generated for, by file extension:
+resizableFormats: Dict[str, str] = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP'}
+
+imgTagPattern: re.Pattern[str] = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+srcAttributePattern: re.Pattern[str] = re.compile(r'\ssrc="([^"]*)"', re.IGNORECASE)
+
+
+def isResizableImage(fileNode: FileNode) -> bool:
+	return fileNode.extension.lower() in resizableFormats
+
+
+def imgTag(attributes: Dict[str, Any]) -> str:
+	return '<img ' + ' '.join(f'{name}="{html.escape(str(value))}"' for name, value in attributes.items()) + '>'
+
+
+def readImageSize(absFilePath: str) -> Tuple[int, int]:
+	from PIL import Image  # pylint: disable=import-outside-toplevel
+
+	try:
+		with Image.open(absFilePath) as image:
+			return image.size
+	except OSError as e:
+		raise AltezaException(f'Could not read the image {absFilePath}: {e}') from e
+
+
+def renderVariant(srcAbsFilePath: str, dstAbsFilePath: str, width: int, quality: int) -> None:
+	"""Write a copy of the image at `srcAbsFilePath`, resized to `width` pixels wide. (This runs in a worker process.)"""
+	from PIL import Image  # pylint: disable=import-outside-toplevel
+
+	imageFormat = resizableFormats[os.path.splitext(srcAbsFilePath)[1].lower()]
+	with Image.open(srcAbsFilePath) as image:
+		source = image.convert('RGBA') if image.mode == 'P' else image
+		height = max(1, round(image.height * width / image.width))
+		resized = source.resize((width, height), Image.Resampling.LANCZOS)
+	if imageFormat == 'JPEG':
+		if resized.mode not in ('RGB', 'L'):
+			resized = resized.convert('RGB')
+		options = {'quality': quality, 'optimize': True, 'progressive': True}
+	elif imageFormat == 'WEBP':
+		options = {'quality': quality}
+	else:
+		options = {'optimize': True}
+	tmpPath = f'{dstAbsFilePath}.{os.getpid()}.tmp'
+	resized.save(tmpPath, format=imageFormat, **options)
+	os.replace(tmpPath, dstAbsFilePath)
+
+
+@dataclass
+class ImageVariant:
+	width: int
+	fileName: str  # The name it is published under (next to the original image).
+	cachePath: str  # Where it is stored, in the cache directory.
+
+
+@dataclass
+class ResponsiveImage:
+	width: int
+	height: int
+	variants: List[ImageVariant]  # Narrower versions of the image, by increasing width.
+
+	def srcset(self, url: str) -> str:
+		"""A `srcset` with all the variants of the image, and the image itself, given the `url` of the image."""
+		baseUrl = posixpath.dirname(url)
+		candidates = [f'{posixpath.join(baseUrl, variant.fileName)} {variant.width}w' for variant in self.variants]
+		return ', '.join(candidates + [f'{url} {self.width}w'])
+
+
+def imageTag(url: str, responsiveImage: Optional[ResponsiveImage], sizes: str, attributes: Dict[str, Any]) -> str:
+	"""
+	An `img` tag for the image at `url`. With its `responsiveImage` (with --responsive_images), it has a `srcset` of
+	the image's resized variants, along with the image's dimensions. Trailing underscores are stripped from the names
+	of `attributes` (so that Python keywords can be given as keyword arguments, e.g. `class_`).
+	"""
+	imageAttributes: Dict[str, Any] = {'src': url}
+	if responsiveImage is not None:
+		imageAttributes |= {'width': responsiveImage.width, 'height': responsiveImage.height}
+		if responsiveImage.variants:
+			imageAttributes |= {'srcset': responsiveImage.srcset(url), 'sizes': sizes}
+	return imgTag(imageAttributes | {name.rstrip('_'): value for name, value in attributes.items()})
+
+
+class ResponsiveImages(DiskCache):
+	"""
+	Resized variants of images (for `srcset`s), generated in a pool of worker processes. Variants are stored in the
+	cache directory, keyed by the hash of the source image and the parameters of the variant, so each one is only
+	generated once (across builds). The dimensions of source images are cached likewise.
+	"""
+
+	# pylint: disable=too-many-instance-attributes, too-many-arguments, too-many-positional-arguments
+	def __init__(
+		self, cacheDir: str, hashCache: AssetHashCache, widths: List[int], quality: int, jobs: int, fingerprinted: bool
+	) -> None:
+		if importlib.util.find_spec('PIL') is None:
+			raise AltezaException('--responsive_images requires Pillow to be installed (e.g. `pip install Pillow`).')
+		super().__init__(cacheDir, 'images')
+		self.hashCache: AssetHashCache = hashCache
+		self.widths: List[int] = sorted(set(widths))
+		self.quality: int = quality
+		self.jobs: Optional[int] = jobs if jobs > 0 else None
+		self.fingerprinted: bool = fingerprinted
+		self.sizes: Dict[str, Tuple[int, int]] = {}  # Dimensions of source images, by their content hash.
+		self.pool: Optional[ProcessPoolExecutor] = None
+		self.pending: Dict[str, 'Future[None]'] = {}  # Variants being generated, by their cache path.
+		self.available: Set[str] = set()  # Cache paths of the variants that have been generated (or found).
+		self.generatedCount: int = 0
+		self.reusedCount: int = 0
+		self.timeNs: int = 0
+
+	def getSize(self, fileNode: FileNode, sourceHash: str) -> Tuple[int, int]:
+		size = self.sizes.get(sourceHash)
+		if size is None:
+			key = hashText('size', sourceHash)
+			storedSize = self.get(key)
+			if isinstance(storedSize, tuple):
+				size = storedSize
+			else:
+				size = readImageSize(fileNode.absoluteFilePath)
+				self.put(key, size)
+			self.sizes[sourceHash] = size
+		return size
+
+	def describe(self, fileNode: FileNode) -> ResponsiveImage:
+		"""The dimensions & variants of an image (which are those of its canonical asset, if it is fingerprinted)."""
+		image = fileNode.canonicalAsset or fileNode
+		sourceHash = self.hashCache.hash(image)
+		width, height = self.getSize(image, sourceHash)
+		variants: List[ImageVariant] = []
+		for variantWidth in self.widths:
+			if variantWidth >= width:
+				break
+			key = hashText(sourceHash, str(variantWidth), str(self.quality), packageVersion('Pillow'))
+			fingerprint = f'.{key[:fingerprintLength]}' if self.fingerprinted else ''
+			variants.append(
+				ImageVariant(
+					variantWidth,
+					f'{image.baseName}.{variantWidth}w{fingerprint}{image.extension}',
+					self.entryPath(key, image.extension.lower()),
+				)
+			)
+		return ResponsiveImage(width, height, variants)
+
+	def generate(self, fileNode: FileNode) -> ResponsiveImage:
+		"""Like `describe`, but also starts generating the variants of the image that are not in the cache yet."""
+		responsiveImage = self.describe(fileNode)
+		for variant in responsiveImage.variants:
+			if variant.cachePath in self.pending or variant.cachePath in self.available:
+				continue
+			if os.path.isfile(variant.cachePath):
+				self.available.add(variant.cachePath)
+				self.reusedCount += 1
+				continue
+			if self.pool is None:
+				self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+			os.makedirs(os.path.dirname(variant.cachePath), exist_ok=True)
+			srcAbsFilePath = (fileNode.canonicalAsset or fileNode).absoluteFilePath
+			self.pending[variant.cachePath] = self.pool.submit(
+				renderVariant, srcAbsFilePath, variant.cachePath, variant.width, self.quality
+			)
+		return responsiveImage
+
+	def cacheKey(self) -> Tuple[str, ...]:
+		"""What the renders of pages (in the render cache) that contain images depend on."""
+		return ('responsive images', str(self.widths), str(self.quality))
+
+	def generateAll(self, fileNodes: Iterable[FileNode]) -> str:
+		"""Generate the variants of all published images (most of which were started while processing pages)."""
+		try:
+			for fileNode in fileNodes:
+				if (
+					fileNode.shouldPublish
+					and isResizableImage(fileNode)
+					and fileNode.canonicalAsset in (None, fileNode)
+				):
+					self.generate(fileNode)
+			return self.wait()
+		finally:
+			self.shutdown()
+
+	def wait(self) -> str:
+		"""Wait for all the variants being generated, and return a summary of the variants generated so far."""
+		with StopWatch() as sw:
+			for future in self.pending.values():
+				future.result()
+		self.timeNs += sw.t
+		self.generatedCount += len(self.pending)
+		self.available.update(self.pending)
+		self.pending = {}
+		return (
+			f'Generated {self.generatedCount} image variants, and reused {self.reusedCount} from the cache'
+			f' (waited {self.timeNs / 10**6:.2f} ms for them to be generated).'
+		)
+
+	def shutdown(self) -> None:
+		if self.pool is not None:
+			self.pool.shutdown(cancel_futures=True)
+			self.pool = None
+
+	def addSrcsets(self, pageHtml: str, images: Dict[str, FileNode], startGenerating: bool) -> str:
+		"""Add `srcset` & `sizes` attributes to the `img` tags in `pageHtml` whose `src` is the URL of one of `images`."""
+
+		def addSrcset(match: re.Match[str]) -> str:
+			tag = match.group(0)
+			src = srcAttributePattern.search(tag)
+			if src is None or 'srcset=' in tag.lower():
+				return tag
+			url = html.unescape(src.group(1))
+			if url not in images:
+				return tag
+			responsiveImage = self.generate(images[url]) if startGenerating else self.describe(images[url])
+			if not responsiveImage.variants:
+				return tag
+			attributes = f' srcset="{html.escape(responsiveImage.srcset(url))}" sizes="100vw"'
+			return tag[: src.end()] + attributes + tag[src.end() :]
+
+		return imgTagPattern.sub(addSrcset, pageHtml)
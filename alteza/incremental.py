@@ -0,0 +1,78 @@
+import os
+from typing import List, Optional, Set, TYPE_CHECKING
+
+from .fs import FileNode, PyPageNode
+from .crawl import CrawlConfig, pr
+from .env import Env
+from .assets import isStaticAsset
+from .deps import purgeModules
+from .publicity import resetPublicity, tracePublic
+from .util import enterDir
+
+if TYPE_CHECKING:
+	from .content import Content
+
+
+def getAffectedPages(content: 'Content', changedAbsPaths: Set[str]) -> Optional[List[PyPageNode]]:
+	"""
+	The pages affected by changes to the files at `changedAbsPaths`, in the order they were processed in,
+	or `None` if a full re-processing of the site is required instead.
+	"""
+	if content.processedInParallel:
+		return None  # The state needed for this (e.g. dependencies) is not retained from worker processes.
+	if content.assetHashCache is not None and any(
+		isStaticAsset(fileNode, CrawlConfig.configFileName)
+		for fileNode in content.fileNodesByFullPath.values()
+		if fileNode.absoluteFilePath in changedAbsPaths
+	):
+		return None  # The hashes of assets (and the pages that link to them) need to be updated.
+	affected: Set[FileNode] = content.recorder.dependencyGraph.getDependents(changedAbsPaths)
+	if any(not isinstance(fileNode, PyPageNode) for fileNode in affected):
+		return None  # A config file (or something it depends on) has changed.
+
+	pyPages: Set[PyPageNode] = {p for p in affected if isinstance(p, PyPageNode) and p in content.processingOrder}
+	# Index pages generally present information about the other pages in their directory:
+	for pyPageNode in list(pyPages):
+		indexPage = pyPageNode.parentDir.indexPage
+		if isinstance(indexPage, PyPageNode) and indexPage in content.processingOrder:
+			pyPages.add(indexPage)
+	return sorted(pyPages, key=lambda p: content.processingOrder[p])
+
+
+def reprocess(content: 'Content', changedAbsPaths: Set[str]) -> Optional[List[PyPageNode]]:
+	"""
+	Re-process only the pages affected by changes to the files at `changedAbsPaths` (used in `--watch` mode).
+	Returns the list of re-processed pages, or `None` if a full re-processing of the site is required instead.
+	"""
+	reprocessedPages = getAffectedPages(content, changedAbsPaths)
+	if reprocessedPages is None:
+		return None
+
+	recorder = content.recorder
+	recorder.forgetFileHashes(changedAbsPaths)  # (Dependencies of cached renders are checked against these.)
+	if any(changedAbsPath.endswith('.py') for changedAbsPath in changedAbsPaths):
+		purgedModuleCount = purgeModules(recorder.contentAbsPath)
+		recorder.importGraph.clear()  # (The helper modules record their imports again, as they get re-imported.)
+		pr(f'Unloaded {purgedModuleCount} helper module(s), so that they get re-imported.')
+
+	content.codeCache.begin()
+	for pyPageNode in reprocessedPages:
+		recorder.dependencyGraph.forget(pyPageNode)
+		content.warnings.pop(pyPageNode, None)
+		content.explicitlyPublicNodes.discard(pyPageNode)
+		pyPageNode.linksTo = []
+		if pyPageNode.absoluteFilePath in changedAbsPaths:
+			pyPageNode.recordStat(os.stat(pyPageNode.absoluteFilePath))
+		pyPageNode.env = Env(content.presetEnvs[pyPageNode].copy())
+		with enterDir(pyPageNode.parentDir.fullPath):
+			content.invokePyPage(pyPageNode, content.dirEnvs[pyPageNode.parentDir])
+
+	content.codeCache.finish(completeBuild=False)
+	for dirNode in {pyPageNode.parentDir for pyPageNode in reprocessedPages}:
+		content.sortDirNode(dirNode, content.dirEnvs[dirNode])
+
+	resetPublicity(content.rootDir, content.publicNodeCounts, content.explicitlyPublicNodes | content.configPublicFiles)
+	tracePublic(content.rootDir, content.nameRegistry, content.publicNodeCounts)
+	if content.responsiveImages is not None:
+		pr(content.responsiveImages.generateAll(content.fileNodesByFullPath.values()))
+	return reprocessedPages
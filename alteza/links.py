@@ -0,0 +1,78 @@
+import itertools
+from typing import Dict, Optional, Set, Tuple, Union
+
+from colored import Fore, Style  # type: ignore
+
+from .fs import AltezaException, FsNode, FileNode, DirNode, PyPageNode, Md
+from .crawl import pr
+from .deps import DependencyRecorder
+from .images import isResizableImage
+
+
+class Linker:
+	"""Resolves links between files (recording them, for reachability & as dependencies), and logs them."""
+
+	def __init__(self, recorder: DependencyRecorder) -> None:
+		self.recorder: DependencyRecorder = recorder
+		self.relativeUrls: Dict[Tuple[DirNode, FileNode, bool, bool], str] = {}
+		self.relativeUrlsComputed: int = 0
+		self.linkLog: Dict[FileNode, int] = {}  # Number of links to each destination, that are yet to be logged.
+		self.seenTemplateLinks: Set[FileNode] = set()
+		self.inTemplate: bool = False
+		self.imageUrls: Optional[Dict[str, FileNode]] = None  # Images linked to by the current page, by URL.
+
+	def link(self, srcFile: FileNode, dstFile: FileNode, pathOnly: bool = False) -> str:
+		self.recorder.recordGraphDependency(dstFile.absoluteFilePath)
+		if not pathOnly and dstFile.canonicalAsset is not None:
+			# Links to a fingerprinted asset go to the (identical) asset that is actually published:
+			self.recorder.recordDependency(f'asset:{dstFile.fullPath}', dstFile.publishedAssetPath())
+			dstFile = dstFile.canonicalAsset
+		if not pathOnly:
+			srcFile.linksTo.append(dstFile)  # This is used to determine reachability.
+			if not (self.inTemplate and dstFile in self.seenTemplateLinks):
+				self.linkLog[dstFile] = self.linkLog.get(dstFile, 0) + 1
+
+		# Relative URLs only depend on the source's directory (and on whether the source is a non-index Markdown page,
+		# whose output is placed in a directory of its own), so they are memoized per (source dir, destination) pair:
+		mdCorrection = isinstance(srcFile, Md) and not srcFile.isIndex and not pathOnly
+		key = (srcFile.parentDir, dstFile, mdCorrection, pathOnly)
+		relativeUrl = self.relativeUrls.get(key)
+		if relativeUrl is None:
+			relativeUrl = self.relativeUrls[key] = FileNode.relativePath(
+				srcFile, dstFile, pathOnly, fingerprinted=not pathOnly
+			)
+			self.relativeUrlsComputed += 1
+		if self.imageUrls is not None and not pathOnly and isResizableImage(dstFile):
+			# The page's `img` tags for this image get a `srcset`, which depends on the image's content:
+			self.imageUrls[relativeUrl] = dstFile
+			self.recorder.recordFileDependency(dstFile.absoluteFilePath)
+		return relativeUrl
+
+	def resolveLink(self, fromPyPage: PyPageNode, destination: Union[str, FsNode], pathOnly: bool) -> str:
+		if isinstance(destination, str):
+			dstFile: FileNode = self.recorder.nameRegistry.lookup(destination)
+			self.recorder.recordDependency(f'name:{destination}', dstFile.fullPath)
+			return self.link(fromPyPage, dstFile, pathOnly)
+		if isinstance(destination, FileNode):
+			return self.link(fromPyPage, destination, pathOnly)
+		if isinstance(destination, DirNode):
+			if not destination.indexPage:
+				raise AltezaException(f'Directory `{destination}` has no index page.')
+			return self.link(fromPyPage, destination.indexPage, pathOnly)
+		raise AltezaException(f'Unknown link destination type: `{type(destination)}`.')
+
+	def logLinks(self) -> None:
+		"""Log a summary of the links made (since the last call), with the number of links to each destination."""
+		if not self.linkLog:
+			return
+		maxListed = 10
+		destinations = [
+			dstFile.linkName + (f' (×{count})' if count > 1 else '')
+			for dstFile, count in itertools.islice(self.linkLog.items(), maxListed)
+		]
+		if len(self.linkLog) > maxListed:
+			destinations.append(f'and {len(self.linkLog) - maxListed} more')
+		pr(' ' * (4 if self.inTemplate else 2) + f'{Fore.grey_42}Linking to:{Style.reset} ' + ', '.join(destinations))
+		if self.inTemplate:
+			self.seenTemplateLinks.update(self.linkLog)
+		self.linkLog = {}
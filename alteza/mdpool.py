@@ -0,0 +1,84 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .fs import AltezaException, FsNode, FileNode, PyPageNode, Md
+from .crawl import NameRegistry
+from .highlight import HighlightCache, highlightingWith
+from .util import StopWatch
+
+
+@dataclass
+class Conversion:
+	"""The result of converting a page's Markdown in a worker process."""
+
+	result: Md.Result
+	linkedNames: List[str]  # Names linked to by wiki-links, in order. These are re-linked in the main process.
+	elapsedNs: int
+	highlightHits: int
+	highlightMisses: int
+
+
+# Maps each name in the name registry to the full path and URL name of the file it refers to:
+RegistrySnapshot = Dict[str, Tuple[str, str]]
+
+# Set in each worker process by `initWorker`:
+_registrySnapshot: RegistrySnapshot = {}
+_highlightCache: Optional[HighlightCache] = None
+
+
+def initWorker(registrySnapshot: RegistrySnapshot, cacheDir: Optional[str]) -> None:
+	global _registrySnapshot, _highlightCache  # pylint: disable=global-statement
+	_registrySnapshot = registrySnapshot
+	_highlightCache = HighlightCache(cacheDir) if cacheDir is not None else None
+
+
+def convertInWorker(text: str, srcFullPath: str, srcIsIndex: bool, pygmentsStyle: Any) -> Conversion:
+	linkedNames: List[str] = []
+
+	def link(destination: Union[str, FsNode], pathOnly: bool = False) -> str:
+		# Wiki-links (see `buildWikiUrl`) are always names.
+		if not isinstance(destination, str) or destination not in _registrySnapshot:
+			raise AltezaException(f'Link error: {destination}')
+		linkedNames.append(destination)
+		dstFullPath, dstUrlName = _registrySnapshot[destination]
+		mdCorrection = not srcIsIndex and not pathOnly
+		return FileNode.relativePathBetween(srcFullPath, dstFullPath, dstUrlName, mdCorrection)
+
+	hitsBefore = _highlightCache.hits if _highlightCache is not None else 0
+	missesBefore = _highlightCache.misses if _highlightCache is not None else 0
+	PyPageNode.temporal_link = link
+	try:
+		with StopWatch() as sw, highlightingWith(_highlightCache, pygmentsStyle):
+			result = Md.processMarkdown(text)
+	finally:
+		PyPageNode.temporal_link = None
+	return Conversion(
+		result=result,
+		linkedNames=linkedNames,
+		elapsedNs=sw.t,
+		highlightHits=(_highlightCache.hits if _highlightCache is not None else 0) - hitsBefore,
+		highlightMisses=(_highlightCache.misses if _highlightCache is not None else 0) - missesBefore,
+	)
+
+
+class MarkdownPool:
+	"""
+	Converts Markdown to HTML in a pool of worker processes (each with its own `markdown.Markdown` instance),
+	so that the main process can continue to run PyPage on the next pages in the meantime.
+	"""
+
+	def __init__(self, jobs: int, nameRegistry: NameRegistry, cacheDir: Optional[str]) -> None:
+		registrySnapshot: RegistrySnapshot = {}
+		for name, fileNode in nameRegistry.allFiles.items():
+			published = fileNode.canonicalAsset or fileNode  # Fingerprinted assets are linked to as published.
+			registrySnapshot[name] = (published.fullPath, FileNode.getFileUrlName(published, fingerprinted=True))
+		self.pool: ProcessPoolExecutor = ProcessPoolExecutor(
+			max_workers=jobs, initializer=initWorker, initargs=(registrySnapshot, cacheDir)
+		)
+
+	def submit(self, mdNode: Md, text: str, pygmentsStyle: Any) -> 'Future[Conversion]':
+		return self.pool.submit(convertInWorker, text, mdNode.fullPath, mdNode.isIndex, pygmentsStyle)
+
+	def shutdown(self) -> None:
+		self.pool.shutdown(cancel_futures=True)
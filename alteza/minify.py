@@ -0,0 +1,165 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .util import StopWatch
+
+# Whitespace, as HTML & CSS define it (unlike `\s`, which also matches e.g. non-breaking spaces):
+whitespacePattern: re.Pattern[str] = re.compile(r'[ \t\n\r\f]+')
+
+htmlTokenPattern: re.Pattern[str] = re.compile(
+	r'(?P<comment><!--.*?-->)'
+	# Elements whose content is not HTML, or whose whitespace is significant:
+	r'|(?P<raw><(?P<rawTag>pre|textarea|script|style)\b(?P<rawAttributes>[^>]*)>(?P<rawContent>.*?)</(?P=rawTag)\s*>)'
+	r'|(?P<tag><[a-zA-Z/!?][^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>)',
+	re.IGNORECASE | re.DOTALL,
+)
+scriptTypePattern: re.Pattern[str] = re.compile(r'\stype\s*=\s*["\']?([^"\'\s>]*)', re.IGNORECASE)
+javaScriptTypes: Tuple[str, ...] = ('', 'text/javascript', 'application/javascript', 'module')
+
+cssTokenPattern: re.Pattern[str] = re.compile(
+	r'(?P<string>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|(?P<comment>/\*.*?\*/)', re.DOTALL
+)
+cssPunctuationPattern: re.Pattern[str] = re.compile(r' ?([{};,>]) ?')
+
+
+def collapseWhitespace(text: str) -> str:
+	"""Collapse each run of whitespace into a single space (or a single newline, if the run has one)."""
+	return whitespacePattern.sub(lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def minifyCss(css: str) -> str:
+	"""Remove comments (except `/*! ... */` ones) & redundant whitespace from CSS, leaving strings as they are."""
+	pieces: List[Tuple[bool, str]] = []  # (Whether the piece is CSS code, rather than kept as is; the piece).
+	position = 0
+	for match in cssTokenPattern.finditer(css):
+		pieces.append((True, css[position : match.start()]))
+		if match.group('string') is not None or match.group(0).startswith('/*!'):
+			pieces.append((False, match.group(0)))
+		else:
+			pieces.append((True, ' '))  # A comment separates what's around it, just like whitespace does.
+		position = match.end()
+	pieces.append((True, css[position:]))
+
+	minified: List[str] = []
+	code: List[str] = []
+
+	def flushCode() -> None:
+		text = whitespacePattern.sub(' ', ''.join(code))
+		# (Spaces before colons are kept, since e.g. `a :hover` & `a:hover` are different selectors.)
+		minified.append(cssPunctuationPattern.sub(r'\1', text).replace(': ', ':').replace(';}', '}'))
+		code.clear()
+
+	for isCode, piece in pieces:
+		if isCode:
+			code.append(piece)
+		else:
+			flushCode()
+			minified.append(piece)
+	flushCode()
+	return ''.join(minified).strip()
+
+
+def minifyJs(js: str) -> str:
+	"""
+	Remove indentation, trailing whitespace & blank lines from JavaScript. Line breaks are kept (so automatic
+	semicolon insertion is unaffected), and scripts that might have multi-line strings (i.e. template literals, or
+	lines continued with a backslash) are left as they are.
+	"""
+	lines = js.split('\n')
+	if '`' in js or any(line.rstrip().endswith('\\') for line in lines):
+		return js
+	return '\n'.join(strippedLine for line in lines if (strippedLine := line.strip()))
+
+
+def minifyHtml(html: str) -> str:
+	"""
+	Remove comments (except conditional comments) from HTML, and collapse whitespace between tags and in text.
+	Tags are left as they are, as is the content of `pre` & `textarea` elements. The content of `style` elements,
+	and of `script` elements with JavaScript, is minified as CSS & JavaScript respectively.
+	"""
+	minified: List[str] = []
+	text = ''  # The text since the last tag (which removed comments are no interruption to).
+	position = 0
+	for match in htmlTokenPattern.finditer(html):
+		text += html[position : match.start()]
+		position = match.end()
+		comment = match.group('comment')
+		if comment is not None and not comment.startswith(('<!--[if', '<!--<![endif]', '<!--!')):
+			continue
+		minified.append(collapseWhitespace(text))
+		text = ''
+		if comment is not None:
+			minified.append(comment)
+			continue
+		if match.group('raw') is None:
+			minified.append(match.group('tag'))
+			continue
+		tag, content = match.group('rawTag').lower(), match.group('rawContent')
+		if tag == 'style':
+			content = minifyCss(content)
+		elif tag == 'script':
+			scriptType = scriptTypePattern.search(match.group('rawAttributes'))
+			if scriptType is None or scriptType.group(1).lower() in javaScriptTypes:
+				content = minifyJs(content)
+		minified.append(
+			html[match.start() : match.start('rawContent')] + content + html[match.end('rawContent') : match.end()]
+		)
+	minified.append(collapseWhitespace(text + html[position:]))
+	return ''.join(minified).strip() + '\n'
+
+
+# Minifiers, by the extension of the output they apply to:
+minifiers: Dict[str, Callable[[str], str]] = {
+	'.html': minifyHtml,
+	'.htm': minifyHtml,
+	'.css': minifyCss,
+	'.js': minifyJs,
+	'.mjs': minifyJs,
+}
+
+
+def minifierFor(fileName: str) -> Optional[Callable[[str], str]]:
+	for extension, minifier in minifiers.items():
+		if fileName.lower().endswith(extension):
+			return minifier
+	return None
+
+
+@dataclass
+class MinificationStats:
+	count: int = 0
+	timeNs: int = 0
+	bytesBefore: int = 0
+	bytesAfter: int = 0
+
+	def add(self, before: str, after: str, timeNs: int) -> None:
+		self.count += 1
+		self.timeNs += timeNs
+		self.bytesBefore += len(before.encode('utf-8'))
+		self.bytesAfter += len(after.encode('utf-8'))
+
+	def merge(self, other: 'MinificationStats') -> None:
+		self.count += other.count
+		self.timeNs += other.timeNs
+		self.bytesBefore += other.bytesBefore
+		self.bytesAfter += other.bytesAfter
+
+	def summary(self) -> str:
+		saved = self.bytesBefore - self.bytesAfter
+		percentage = 100 * saved / self.bytesBefore if self.bytesBefore > 0 else 0.0
+		return (
+			f'Minification took {self.timeNs / 10**6:.2f} ms for {self.count} outputs, reducing them from'
+			f' {self.bytesBefore / 2**10:.1f} KiB to {self.bytesAfter / 2**10:.1f} KiB ({percentage:.1f}% smaller).'
+		)
+
+
+def minifyOutput(fileName: str, output: str, stats: MinificationStats) -> str:
+	"""Minify the `output` written to `fileName`, if it is of a kind that can be minified (recording it in `stats`)."""
+	minifier = minifierFor(fileName)
+	if minifier is None:
+		return output
+	with StopWatch() as sw:
+		minifiedOutput = minifier(output)
+	stats.add(output, minifiedOutput, sw.t)
+	return minifiedOutput
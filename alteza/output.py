@@ -0,0 +1,463 @@
+import contextlib
+import filecmp
+import importlib.util
+import io
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from datetime import datetime
+from typing import IO, BinaryIO, Dict, Optional, Set, Union
+
+from colored import Fore, Style  # type: ignore
+
+from .compress import Precompressor
+from .crawl import pr
+from .util import AltezaException
+
+
+class OutputWriter:
+	"""
+	Writes a generated site into an output directory. All paths passed to the `write*`/`makeDir` methods are
+	relative to the output directory. This writer deletes any existing output directory, and writes every file afresh.
+	"""
+
+	def __init__(self, outputDir: str, clearOutputDir: bool) -> None:
+		self.outputDir: str = outputDir
+		self.clearOutputDir: bool = clearOutputDir
+		self.written: Set[str] = set()  # Relative paths of all files & directories generated so far.
+		self.writtenCount: int = 0
+		self.precompressor: Optional[Precompressor] = None  # With --precompress.
+
+	def begin(self) -> None:
+		if os.path.isfile(self.outputDir):
+			raise AltezaException(
+				f'A file named {self.outputDir} already exists. Please move it or delete it. '
+				'Note that if this had been a directory, we would have erased it.'
+			)
+		if os.path.isdir(self.outputDir):
+			if not self.clearOutputDir:
+				raise AltezaException(
+					f'Specified output directory {self.outputDir} already exists.\n'
+					'Please use --clear_output_dir to delete it prior to site generation.'
+				)
+			pr(f'Deleting directory {Fore.dark_red_2}%s{Style.reset} and all of its content...\n' % self.outputDir)
+			shutil.rmtree(self.outputDir)
+		os.mkdir(self.outputDir)
+
+	def finish(self) -> None:
+		pass
+
+	def abort(self) -> None:
+		"""Clean up after a build that failed during generation."""
+
+	def exists(self, relPath: str) -> bool:
+		return relPath in self.written
+
+	def claim(self, relPath: str) -> str:
+		if relPath in self.written:
+			raise AltezaException(f'{relPath} has already been generated (by another file with the same name).')
+		self.written.add(relPath)
+		return os.path.join(self.outputDir, relPath)
+
+	def makeDir(self, relPath: str) -> None:
+		os.mkdir(self.claim(relPath))
+
+	def writeText(self, relPath: str, text: str) -> None:
+		with open(self.claim(relPath), 'w', encoding='utf-8') as outputFile:
+			outputFile.write(text)
+		self.writtenCount += 1
+
+	def writeBytes(self, relPath: str, data: bytes) -> None:
+		with open(self.claim(relPath), 'wb') as outputFile:
+			outputFile.write(data)
+		self.writtenCount += 1
+
+	def writeAsset(self, relPath: str, srcAbsPath: str, copy: bool) -> None:
+		if copy:
+			shutil.copyfile(srcAbsPath, self.claim(relPath))
+		else:
+			os.symlink(srcAbsPath, self.claim(relPath))
+		self.writtenCount += 1
+
+	def precompress(self, relPath: str) -> None:
+		"""Start compressing the file just written at `relPath` (if it is compressible, and precompression is on)."""
+		if self.precompressor is not None:
+			self.precompressor.submit(relPath, os.path.join(self.outputDir, relPath))
+
+	@staticmethod
+	def promote(stagedPath: str, absPath: str) -> None:
+		"""Put a file from the staging area into place, by hard-linking it (or by copying it, if that fails)."""
+		try:
+			os.link(stagedPath, absPath)
+		except OSError:
+			shutil.copyfile(stagedPath, absPath)
+
+	def writeStaged(self, relPath: str, stagedPath: str) -> None:
+		self.promote(stagedPath, self.claim(relPath))
+		self.writtenCount += 1
+
+	def summary(self) -> str:
+		return f'Wrote {self.writtenCount} files.'
+
+
+class SyncingOutputWriter(OutputWriter):
+	"""
+	Updates an existing output directory in place: only files whose content has changed are written, identical files
+	are left untouched (preserving their modification times), and files that are no longer published are deleted.
+	"""
+
+	def __init__(self, outputDir: str, clearOutputDir: bool) -> None:
+		super().__init__(outputDir, clearOutputDir)
+		self.unchangedCount: int = 0
+		self.deletedCount: int = 0
+
+	def begin(self) -> None:
+		if os.path.isfile(self.outputDir):
+			raise AltezaException(f'A file named {self.outputDir} already exists. Please move it or delete it.')
+		os.makedirs(self.outputDir, exist_ok=True)
+
+	def finish(self) -> None:
+		# Delete everything in the output directory that was not generated in this build:
+		for dirPath, dirNames, fileNames in os.walk(self.outputDir, topdown=False):
+			for name in fileNames + dirNames:
+				absPath = os.path.join(dirPath, name)
+				if os.path.relpath(absPath, self.outputDir) in self.written:
+					continue
+				if os.path.isdir(absPath) and not os.path.islink(absPath):
+					shutil.rmtree(absPath)
+				else:
+					os.remove(absPath)
+				self.deletedCount += 1
+
+	@staticmethod
+	def isRegularFile(absPath: str) -> bool:
+		return os.path.isfile(absPath) and not os.path.islink(absPath)
+
+	@staticmethod
+	def removeExisting(absPath: str) -> None:
+		"""Remove whatever exists at `absPath` (a file, a symlink, or a directory), if anything."""
+		if os.path.isdir(absPath) and not os.path.islink(absPath):
+			shutil.rmtree(absPath)
+		elif os.path.lexists(absPath):
+			os.remove(absPath)
+
+	def makeDir(self, relPath: str) -> None:
+		absPath = self.claim(relPath)
+		if not os.path.isdir(absPath) or os.path.islink(absPath):
+			self.removeExisting(absPath)
+			os.mkdir(absPath)
+
+	def writeText(self, relPath: str, text: str) -> None:
+		self.writeBytes(relPath, text.encode('utf-8'))
+
+	def writeBytes(self, relPath: str, data: bytes) -> None:
+		absPath = self.claim(relPath)
+		if self.isRegularFile(absPath) and os.path.getsize(absPath) == len(data):
+			with open(absPath, 'rb') as existingFile:
+				if existingFile.read() == data:
+					self.unchangedCount += 1
+					return
+		if not self.isRegularFile(absPath):
+			self.removeExisting(absPath)
+		# Note: the new file is renamed into place, so a symlink at `absPath` is replaced, and not written through.
+		tmpPath = absPath + '.alteza-tmp'
+		with open(tmpPath, 'wb') as outputFile:
+			outputFile.write(data)
+		os.replace(tmpPath, absPath)
+		self.writtenCount += 1
+
+	def writeStaged(self, relPath: str, stagedPath: str) -> None:
+		absPath = self.claim(relPath)
+		if self.isRegularFile(absPath) and filecmp.cmp(stagedPath, absPath, shallow=False):
+			self.unchangedCount += 1
+			return
+		self.removeExisting(absPath)
+		self.promote(stagedPath, absPath)
+		self.writtenCount += 1
+
+	def writeAsset(self, relPath: str, srcAbsPath: str, copy: bool) -> None:
+		absPath = self.claim(relPath)
+		if copy:
+			if self.isRegularFile(absPath) and filecmp.cmp(srcAbsPath, absPath, shallow=False):
+				self.unchangedCount += 1
+				return
+			self.removeExisting(absPath)  # Never copy through a symlink (into the content directory).
+			shutil.copyfile(srcAbsPath, absPath)
+		else:
+			if os.path.islink(absPath) and os.readlink(absPath) == srcAbsPath:
+				self.unchangedCount += 1
+				return
+			self.removeExisting(absPath)
+			os.symlink(srcAbsPath, absPath)
+		self.writtenCount += 1
+
+	def summary(self) -> str:
+		return (
+			f'Wrote {self.writtenCount} files, left {self.unchangedCount} unchanged files untouched,'
+			f' and deleted {self.deletedCount} stale files or directories.'
+		)
+
+
+class AtomicOutputWriter(OutputWriter):
+	"""
+	Writes each build into a new timestamped directory inside the output directory, and then atomically flips
+	a `current` symlink (inside the output directory) to point to it. The previous build is kept, and pointed to
+	by a `previous` symlink, while the build before that one is deleted. Readers of `current` never see a
+	partially-written site.
+	"""
+
+	def __init__(self, outputDir: str, clearOutputDir: bool) -> None:
+		super().__init__(outputDir, clearOutputDir)
+		self.generationsDir: str = outputDir
+		self.generationName: str = 'site-gen-' + datetime.now().strftime('%Y-%m-%d-%H-%M-%S-%f')[:-3]
+		self.outputDir = os.path.join(outputDir, self.generationName)
+
+	def begin(self) -> None:
+		if os.path.isfile(self.generationsDir):
+			raise AltezaException(f'A file named {self.generationsDir} already exists. Please move it or delete it.')
+		os.makedirs(self.outputDir)
+
+	def finish(self) -> None:
+		currentLink = os.path.join(self.generationsDir, 'current')
+		previousLink = os.path.join(self.generationsDir, 'previous')
+		oldCurrent = os.readlink(currentLink) if os.path.islink(currentLink) else None
+		oldPrevious = os.readlink(previousLink) if os.path.islink(previousLink) else None
+
+		self.replaceSymlink(currentLink, self.generationName)
+		if oldCurrent is not None:
+			self.replaceSymlink(previousLink, oldCurrent)
+		if oldPrevious is not None and oldPrevious not in (oldCurrent, self.generationName):
+			shutil.rmtree(os.path.join(self.generationsDir, oldPrevious), ignore_errors=True)
+
+	def abort(self) -> None:
+		# Delete the partially-written generation (unless `current` was already pointed to it, when finishing):
+		currentLink = os.path.join(self.generationsDir, 'current')
+		if not (os.path.islink(currentLink) and os.readlink(currentLink) == self.generationName):
+			shutil.rmtree(self.outputDir, ignore_errors=True)
+
+	@staticmethod
+	def replaceSymlink(linkPath: str, target: str) -> None:
+		# Create the new symlink under a temporary name, and atomically rename it over the existing one:
+		tmpLink = linkPath + '.alteza-tmp'
+		if os.path.lexists(tmpLink):
+			os.remove(tmpLink)
+		os.symlink(target, tmpLink)
+		os.replace(tmpLink, linkPath)
+
+	def summary(self) -> str:
+		return f'Wrote {self.writtenCount} files to {self.generationName}, and pointed `current` to it.'
+
+
+class ServedFile:  # pylint: disable=too-few-public-methods
+	"""A file of a site held in memory by `MemoryOutputWriter`: either a text, or the path of a file on disk."""
+
+	def __init__(self, text: Optional[str] = None, absPath: Optional[str] = None) -> None:
+		self.text: Optional[str] = text
+		self.absPath: Optional[str] = absPath
+
+	def read(self) -> bytes:
+		if self.text is not None:
+			return self.text.encode('utf-8')
+		assert self.absPath is not None
+		with open(self.absPath, 'rb') as servedFile:
+			return servedFile.read()
+
+
+class MemoryOutputWriter(OutputWriter):
+	"""
+	Records a generated site in memory (for `--serve`), instead of writing it out. The outputs of pages are kept
+	as they are, and static assets (and staged page outputs) are referred to by their paths.
+	"""
+
+	def __init__(self) -> None:
+		super().__init__(outputDir='', clearOutputDir=False)  # There is no output directory.
+		self.files: Dict[str, ServedFile] = {}
+		self.dirs: Set[str] = {''}
+
+	def begin(self) -> None:
+		pass
+
+	def claim(self, relPath: str) -> str:
+		super().claim(relPath)
+		return relPath.replace(os.sep, '/')
+
+	def makeDir(self, relPath: str) -> None:
+		self.dirs.add(self.claim(relPath))
+
+	def writeText(self, relPath: str, text: str) -> None:
+		self.files[self.claim(relPath)] = ServedFile(text=text)
+		self.writtenCount += 1
+
+	def writeAsset(self, relPath: str, srcAbsPath: str, copy: bool) -> None:
+		self.files[self.claim(relPath)] = ServedFile(absPath=srcAbsPath)
+		self.writtenCount += 1
+
+	def writeStaged(self, relPath: str, stagedPath: str) -> None:
+		self.files[self.claim(relPath)] = ServedFile(absPath=stagedPath)
+		self.writtenCount += 1
+
+	def summary(self) -> str:
+		return f'Generated {self.writtenCount} files in memory.'
+
+
+# Supported archive formats (for `ArchiveOutputWriter`), by file name extension:
+archiveFormats: Dict[str, str] = {
+	'.zip': 'zip',
+	'.tar': 'tar',
+	'.tar.gz': 'tar:gz',
+	'.tgz': 'tar:gz',
+	'.tar.bz2': 'tar:bz2',
+	'.tar.xz': 'tar:xz',
+	'.tar.zst': 'tar:zst',
+}
+
+# Files with these extensions are already compressed, so they are stored in zip archives as they are:
+incompressibleExtensions = ('.gz', '.br', '.zip', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.woff', '.woff2')
+
+
+class ArchiveOutputWriter(OutputWriter):  # pylint: disable=too-many-instance-attributes
+	"""
+	Writes a generated site straight into a zip or tar archive, instead of into an output directory. Static assets
+	(and staged page outputs) are streamed into the archive in chunks, so memory use does not grow with their sizes.
+	The archive is written under a temporary name, and only renamed into place once it is complete.
+	"""
+
+	chunkSize: int = 2**20
+
+	def __init__(self, archivePath: str, clearOutputDir: bool) -> None:
+		super().__init__(archivePath, clearOutputDir)
+		self.archiveFormat: str = self.formatOf(archivePath)
+		self.tmpPath: str = archivePath + '.alteza-tmp'
+		self.buildTime: float = time.time()
+		self.stack: contextlib.ExitStack = contextlib.ExitStack()  # The archive, and the file(s) it is written to.
+		self.zipFile: Optional[zipfile.ZipFile] = None
+		self.tarFile: Optional[tarfile.TarFile] = None
+		self.sources: Dict[str, Union[str, bytes]] = {}  # Outputs that are yet to be precompressed (see `precompress`).
+
+	@staticmethod
+	def formatOf(archivePath: str) -> str:
+		for extension, archiveFormat in archiveFormats.items():
+			if archivePath.lower().endswith(extension):
+				if archiveFormat == 'tar:zst' and importlib.util.find_spec('zstandard') is None:
+					raise AltezaException(
+						'.tar.zst archives require zstandard to be installed (`pip install zstandard`).'
+					)
+				return archiveFormat
+		raise AltezaException(
+			f'Unsupported archive format: {archivePath} (the supported extensions are {", ".join(archiveFormats)}).'
+		)
+
+	def begin(self) -> None:
+		if os.path.isdir(self.outputDir):
+			raise AltezaException(f'A directory named {self.outputDir} already exists. Please move it or delete it.')
+		if os.path.exists(self.outputDir) and not self.clearOutputDir:
+			raise AltezaException(
+				f'Specified archive {self.outputDir} already exists.\n'
+				'Please use --clear_output_dir to replace it with the newly generated site.'
+			)
+		archiveFile: BinaryIO = self.stack.enter_context(open(self.tmpPath, 'wb'))
+		if self.archiveFormat == 'zip':
+			self.zipFile = self.stack.enter_context(zipfile.ZipFile(archiveFile, 'w', zipfile.ZIP_DEFLATED))
+			return
+		compression = self.archiveFormat.partition(':')[2]
+		if compression != '':
+			archiveFile = self.stack.enter_context(self.compressingStream(archiveFile, compression))
+		self.tarFile = self.stack.enter_context(tarfile.open(fileobj=archiveFile, mode='w|'))
+
+	@staticmethod
+	def compressingStream(archiveFile: BinaryIO, compression: str) -> BinaryIO:
+		# pylint: disable=import-outside-toplevel
+		if compression == 'gz':
+			import gzip
+
+			return gzip.GzipFile(fileobj=archiveFile, mode='wb')  # type: ignore
+		if compression == 'bz2':
+			import bz2
+
+			return bz2.BZ2File(archiveFile, 'wb')  # type: ignore
+		if compression == 'xz':
+			import lzma
+
+			return lzma.LZMAFile(archiveFile, 'wb')  # type: ignore
+		import zstandard  # type: ignore # pylint: disable=import-error
+
+		return zstandard.ZstdCompressor().stream_writer(archiveFile)  # type: ignore
+
+	def finish(self) -> None:
+		self.stack.close()
+		os.replace(self.tmpPath, self.outputDir)
+
+	def abort(self) -> None:
+		with contextlib.suppress(Exception):
+			self.stack.close()
+		if os.path.exists(self.tmpPath):
+			os.remove(self.tmpPath)
+
+	def claim(self, relPath: str) -> str:
+		super().claim(relPath)
+		return relPath.replace(os.sep, '/')
+
+	def makeDir(self, relPath: str) -> None:
+		name = self.claim(relPath)
+		if self.zipFile is not None:
+			zipInfo = zipfile.ZipInfo(name + '/', time.localtime(self.buildTime)[:6])
+			zipInfo.external_attr = (0o40755 << 16) | 0x10  # A directory (with its MS-DOS directory flag set).
+			self.zipFile.writestr(zipInfo, b'')
+		else:
+			assert self.tarFile is not None
+			tarInfo = tarfile.TarInfo(name)
+			tarInfo.type, tarInfo.mode, tarInfo.mtime = tarfile.DIRTYPE, 0o755, int(self.buildTime)
+			self.tarFile.addfile(tarInfo)
+
+	def addFile(self, name: str, fileObj: IO[bytes], size: int, mtime: float) -> None:
+		"""Add a file to the archive, reading its content from `fileObj` (in chunks)."""
+		if self.zipFile is not None:
+			zipInfo = zipfile.ZipInfo(name, time.localtime(mtime)[:6])
+			zipInfo.external_attr = 0o644 << 16
+			zipInfo.file_size = size  # So that the zip64 extensions are used for large files.
+			if name.lower().endswith(incompressibleExtensions):
+				zipInfo.compress_type = zipfile.ZIP_STORED
+			else:
+				zipInfo.compress_type = zipfile.ZIP_DEFLATED
+			with self.zipFile.open(zipInfo, 'w') as entry:
+				while chunk := fileObj.read(self.chunkSize):
+					entry.write(chunk)
+		else:
+			assert self.tarFile is not None
+			tarInfo = tarfile.TarInfo(name)
+			tarInfo.size, tarInfo.mode, tarInfo.mtime = size, 0o644, int(mtime)
+			self.tarFile.addfile(tarInfo, fileObj)
+		self.writtenCount += 1
+
+	def addFileFrom(self, relPath: str, srcAbsPath: str) -> None:
+		with open(srcAbsPath, 'rb') as srcFile:
+			stat = os.fstat(srcFile.fileno())
+			self.addFile(self.claim(relPath), srcFile, stat.st_size, stat.st_mtime)
+		if self.precompressor is not None and self.precompressor.isCompressible(relPath):
+			self.sources[relPath] = srcAbsPath
+
+	def writeText(self, relPath: str, text: str) -> None:
+		data = text.encode('utf-8')
+		self.writeBytes(relPath, data)
+		if self.precompressor is not None and self.precompressor.isCompressible(relPath):
+			self.sources[relPath] = data
+
+	def writeBytes(self, relPath: str, data: bytes) -> None:
+		self.addFile(self.claim(relPath), io.BytesIO(data), len(data), self.buildTime)
+
+	def writeAsset(self, relPath: str, srcAbsPath: str, copy: bool) -> None:
+		self.addFileFrom(relPath, srcAbsPath)  # Assets are always copied into the archive.
+
+	def writeStaged(self, relPath: str, stagedPath: str) -> None:
+		self.addFileFrom(relPath, stagedPath)
+
+	def precompress(self, relPath: str) -> None:
+		# There is no output directory to read outputs back from, so they are compressed from their sources instead:
+		source = self.sources.pop(relPath, None)
+		if self.precompressor is not None and source is not None:
+			self.precompressor.submit(relPath, source)
+
+	def summary(self) -> str:
+		return f'Wrote {self.writtenCount} files into {self.outputDir} ({os.path.getsize(self.outputDir) / 2**20:.2f} MiB).'
@@ -0,0 +1,295 @@
+import contextlib
+import io
+import multiprocessing
+import pickle
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from colored import Fore, Style  # type: ignore
+
+from .fs import AltezaException, FsNode, FileNode, DirNode, PyPageNode, getFsNodesByFullPath
+from .crawl import CrawlConfig, ProgressBar, pr
+from .env import Env
+from .minify import MinificationStats
+from .profiling import NodeTimings, Profiler
+from .util import MultiRunTimes, enterDir
+
+if TYPE_CHECKING:
+	from .content import Content
+
+
+class NodePickler(pickle.Pickler):
+	"""Pickles references to file system nodes as their full paths (instead of pickling the entire tree with them)."""
+
+	def persistent_id(self, obj: Any) -> Optional[str]:
+		if isinstance(obj, FsNode):
+			return obj.fullPath
+		return None
+
+
+class NodeUnpickler(pickle.Unpickler):
+	"""Resolves the full paths written by `NodePickler` back into the corresponding nodes of this process's tree."""
+
+	def __init__(self, file: io.BytesIO, nodesByFullPath: Dict[str, FsNode]) -> None:
+		super().__init__(file)
+		self.nodesByFullPath: Dict[str, FsNode] = nodesByFullPath
+
+	def persistent_load(self, pid: Any) -> FsNode:
+		if pid not in self.nodesByFullPath:
+			raise pickle.UnpicklingError(f'Unknown node: {pid}')
+		return self.nodesByFullPath[pid]
+
+
+def dumpsWithNodeRefs(value: Any) -> bytes:
+	buffer = io.BytesIO()
+	NodePickler(buffer).dump(value)
+	return buffer.getvalue()
+
+
+def loadsWithNodeRefs(data: bytes, nodesByFullPath: Dict[str, FsNode]) -> Any:
+	return NodeUnpickler(io.BytesIO(data), nodesByFullPath).load()
+
+
+def picklableSubset(env: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+	"""The variables in `env` whose values can be sent to another process, and the names of those that cannot."""
+	subset: Dict[str, Any] = {}
+	dropped: List[str] = []
+	for k, v in env.items():
+		try:
+			dumpsWithNodeRefs(v)
+		except (pickle.PicklingError, TypeError, AttributeError):
+			dropped.append(k)
+			continue
+		subset[k] = v
+	return subset, dropped
+
+
+def canFork() -> bool:
+	return 'fork' in multiprocessing.get_all_start_methods()
+
+
+# The task being run by `mapInForkedProcesses`. Forked workers inherit it, so it need not be picklable.
+_task: Optional[Callable[[int], bytes]] = None
+
+
+def _runTask(index: int) -> bytes:
+	assert _task is not None
+	return _task(index)
+
+
+def mapInForkedProcesses(task: Callable[[int], bytes], count: int, jobs: int) -> List[bytes]:
+	"""
+	Runs `task(i)` for each `i` in `range(count)` in a pool of (at most) `jobs` forked processes, and returns the
+	results in order. Since the workers are forked, they inherit all in-memory state (and the current directory)
+	as it is at the time of this call, and any changes they make to that state are not seen by this process.
+	"""
+	global _task  # pylint: disable=global-statement
+	_task = task
+	try:
+		context = multiprocessing.get_context('fork')
+		with ProcessPoolExecutor(max_workers=min(jobs, count), mp_context=context) as pool:
+			return list(pool.map(_runTask, range(count)))
+	finally:
+		_task = None
+
+
+@dataclass
+class ProcessedPage:
+	pyPageNode: PyPageNode
+	output: str
+	envDelta: Dict[str, Any]  # Variables defined by the page (only those that could be pickled).
+	linksTo: List[FsNode]
+
+
+@dataclass
+class SubtreeResult:  # pylint: disable=too-many-instance-attributes
+	"""Everything a worker process learned while processing a directory subtree, to be merged into the main process."""
+
+	log: str
+	dirEnvDeltas: Dict[DirNode, Dict[str, Any]]  # Variables defined by each directory's config (in processing order).
+	dirConfigTitles: Dict[DirNode, Optional[str]]
+	dirOrders: Dict[DirNode, Tuple[List[FileNode], List[DirNode]]]  # The (sorted) files & subdirectories of each dir.
+	pages: List[ProcessedPage]  # In processing order.
+	warnings: Dict[FileNode, str]
+	explicitlyPublicNodes: List[FsNode]
+	publicNodes: List[FsNode]  # All nodes marked as public (by pages or by config files).
+	timePyPage: MultiRunTimes
+	timeMarkdown: MultiRunTimes
+	timeLinks: MultiRunTimes
+	timings: Dict[str, NodeTimings]  # Per-file timings.
+	minificationStats: MinificationStats
+	relativeUrlsComputed: int
+	cacheHits: int
+	cacheMisses: int
+	templateCacheHits: int
+	templateCacheMisses: int
+	codeCacheHits: int
+	codeCacheMisses: int
+	codeCacheBuild: bytes  # The code used by the worker (see `CodeCache.exportBuild`).
+	highlightCacheHits: int
+	highlightCacheMisses: int
+	progress: int
+
+
+def processDirsInParallel(content: 'Content', dirNodes: List[DirNode], env: Env) -> None:
+	"""
+	Process sibling directories (and everything inside them) in forked worker processes. Siblings are independent
+	of each other: only their parent's pages (which are processed afterward) can depend on them. The outputs,
+	variables, and links of the pages processed by the workers are then merged into this process's tree.
+	"""
+
+	def processInWorker(index: int) -> bytes:
+		return processSubtreeInWorker(content, dirNodes[index], env)
+
+	pr(f'{Fore.dark_orange}Processing{Style.reset} {len(dirNodes)} directories with {content.jobs} processes...')
+	if FileNode.gitCommitDates is not None:
+		# The thread resolving the git commit dates does not survive the fork, so wait for it beforehand. (If the dates
+		# are not needed yet, each worker that needs them resolves them itself, from the same persistent index.)
+		FileNode.gitCommitDates.wait()
+	results = mapInForkedProcesses(processInWorker, len(dirNodes), content.jobs)
+	nodesByFullPath = getFsNodesByFullPath(content.rootDir)
+	for result in results:
+		mergeSubtreeResult(content, loadsWithNodeRefs(result, nodesByFullPath))
+	content.processedInParallel = True
+
+
+def resetInWorker(content: 'Content') -> None:
+	"""Reset what a worker process reports back, and detach it from what belongs to the main process."""
+	# This runs in a forked copy of the main process, so it is free to modify `content`.
+	content.inWorker = True
+	ProgressBar.pbar = None  # The progress bar belongs to the main process.
+	content.markdownPool = None  # The Markdown pool's worker processes belong to the main process too.
+	content.stager = None  # So do the stager's threads. Outputs are staged by the main process, once merged.
+	content.pageEnvDeltas = {}
+	content.progress = 0
+	content.warnings = {}
+	content.explicitlyPublicNodes = set()
+	content.timePyPage = MultiRunTimes()
+	content.timeMarkdown = MultiRunTimes()
+	content.timeLinks = MultiRunTimes()
+	content.profiler = Profiler()
+	content.minificationStats = MinificationStats()
+	content.linker.relativeUrlsComputed = 0
+	if content.renderCache is not None:
+		content.renderCache.hits = content.renderCache.misses = 0
+	content.templateCache.hits = content.templateCache.misses = 0
+	content.codeCache.begin()
+	if content.highlightCache is not None:
+		content.highlightCache.hits = content.highlightCache.misses = 0
+
+
+def processSubtreeInWorker(content: 'Content', dirNode: DirNode, env: Env) -> bytes:
+	resetInWorker(content)
+	knownDirCount = len(content.dirEnvs)
+
+	log = io.StringIO()  # The log is printed by the main process, to avoid interleaving it with other workers'.
+	try:
+		with contextlib.redirect_stdout(log), enterDir(dirNode.dirName):
+			content.processDir(dirNode, env)
+	except Exception as e:
+		raise AltezaException(
+			f'Processing of `{dirNode.fullPath}` failed in a worker process.\n{log.getvalue()}\n{traceback.format_exc()}'
+		) from e
+
+	processedDirs = list(content.dirEnvs)[knownDirCount:]
+	dirEnvDeltas, pages = getPicklableResults(content, processedDirs)
+	return dumpsWithNodeRefs(
+		SubtreeResult(
+			log=log.getvalue(),
+			dirEnvDeltas=dirEnvDeltas,
+			dirConfigTitles={d: d.configTitle for d in processedDirs},
+			dirOrders={d: (d.files, d.subDirs) for d in processedDirs},
+			pages=pages,
+			warnings=content.warnings,
+			explicitlyPublicNodes=list(content.explicitlyPublicNodes),
+			publicNodes=[fsNode for fsNode in getFsNodesByFullPath(content.rootDir).values() if fsNode.shouldPublish],
+			timePyPage=content.timePyPage,
+			timeMarkdown=content.timeMarkdown,
+			timeLinks=content.timeLinks,
+			timings=content.profiler.timings,
+			minificationStats=content.minificationStats,
+			relativeUrlsComputed=content.linker.relativeUrlsComputed,
+			cacheHits=content.renderCache.hits if content.renderCache is not None else 0,
+			cacheMisses=content.renderCache.misses if content.renderCache is not None else 0,
+			templateCacheHits=content.templateCache.hits,
+			templateCacheMisses=content.templateCache.misses,
+			codeCacheHits=content.codeCache.hits,
+			codeCacheMisses=content.codeCache.misses,
+			codeCacheBuild=content.codeCache.exportBuild(),
+			highlightCacheHits=content.highlightCache.hits if content.highlightCache is not None else 0,
+			highlightCacheMisses=content.highlightCache.misses if content.highlightCache is not None else 0,
+			progress=content.progress,
+		)
+	)
+
+
+def getPicklableResults(
+	content: 'Content', processedDirs: List[DirNode]
+) -> Tuple[Dict[DirNode, Dict[str, Any]], List[ProcessedPage]]:
+	"""The env deltas of the directories & pages processed by a worker, without the unpicklable variables."""
+	dirEnvDeltas: Dict[DirNode, Dict[str, Any]] = {}
+	for d in processedDirs:
+		# The helpers given to `__config__.py` files (`file`, `warn` & `path`) are not needed after they have run:
+		ownEnv = {k: v for k, v in content.dirEnvs[d].own.items() if k not in ('dir', 'file', 'warn', 'path')}
+		dirEnvDeltas[d], dropped = picklableSubset(ownEnv)
+		configFile = next((f for f in d.files if f.fileName == CrawlConfig.configFileName), None)
+		if dropped and configFile is not None:
+			warnUnpicklable(content, configFile, dropped)
+	assert content.pageEnvDeltas is not None
+	pages: List[ProcessedPage] = []
+	for p, envDelta in content.pageEnvDeltas.items():
+		pageEnvDelta, dropped = picklableSubset(envDelta)
+		if dropped:
+			warnUnpicklable(content, p, dropped)
+		pages.append(ProcessedPage(p, p.output, pageEnvDelta, p.linksTo))
+	return dirEnvDeltas, pages
+
+
+def warnUnpicklable(content: 'Content', fileNode: FileNode, names: List[str]) -> None:
+	# With `--jobs`, variables are sent back from the worker processes, and those that cannot be pickled are lost.
+	desc = (
+		f'These variables cannot be sent back from a worker process (with `--jobs`), so they are dropped once '
+		f'their directory is processed: {", ".join(names)}. Changes made to objects defined in other directories '
+		f'are lost as well.'
+	)
+	content.warn(fileNode, f'{content.warnings[fileNode]}\n  {desc}' if fileNode in content.warnings else desc)
+
+
+def mergeSubtreeResult(content: 'Content', result: SubtreeResult) -> None:
+	pr(result.log, end='')
+	for dirNode, envDelta in result.dirEnvDeltas.items():
+		# Directories are listed in processing order, so a directory's parent always precedes it:
+		content.dirEnvs[dirNode] = Env({'dir': dirNode} | envDelta, content.dirEnvs[dirNode.parent])  # type: ignore
+		dirNode.configTitle = result.dirConfigTitles[dirNode]
+		dirNode.files, dirNode.subDirs = result.dirOrders[dirNode]
+	for page in result.pages:
+		content.processingOrder.setdefault(page.pyPageNode, len(content.processingOrder))
+		page.pyPageNode.linksTo = page.linksTo
+		page.pyPageNode.output = page.output
+		if content.stager is not None:
+			page.pyPageNode.stageOutput(content.stager)
+		content.enrichPyPageNode(page.pyPageNode, page.envDelta, content.dirEnvs[page.pyPageNode.parentDir])
+	content.warnings |= result.warnings
+	content.explicitlyPublicNodes.update(result.explicitlyPublicNodes)
+	for fsNode in result.publicNodes:
+		fsNode.setNodeAsPublic()
+	content.timePyPage.times.extend(result.timePyPage.times)
+	content.timeMarkdown.times.extend(result.timeMarkdown.times)
+	content.timeLinks.times.extend(result.timeLinks.times)
+	content.profiler.merge(result.timings)
+	content.minificationStats.merge(result.minificationStats)
+	content.linker.relativeUrlsComputed += result.relativeUrlsComputed
+	if content.renderCache is not None:
+		content.renderCache.hits += result.cacheHits
+		content.renderCache.misses += result.cacheMisses
+	content.templateCache.hits += result.templateCacheHits
+	content.templateCache.misses += result.templateCacheMisses
+	content.codeCache.hits += result.codeCacheHits
+	content.codeCache.misses += result.codeCacheMisses
+	content.codeCache.mergeBuild(result.codeCacheBuild)
+	if content.highlightCache is not None:
+		content.highlightCache.hits += result.highlightCacheHits
+		content.highlightCache.misses += result.highlightCacheMisses
+	content.advanceProgress(result.progress)
@@ -0,0 +1,64 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+
+@dataclass
+class NodeTimings:
+	"""Time spent (in nanoseconds) on a single file, broken down by the kind of work done."""
+
+	config: int = 0  # Executing the file as a directory config.
+	pypage: int = 0  # Running PyPage on the page itself.
+	markdown: int = 0
+	template: int = 0  # Running PyPage on the page's layout template.
+	minify: int = 0  # Minifying the page's output.
+	links: int = 0  # Resolving links. Note: this happens during PyPage processing, so it is part of the above.
+	write: int = 0  # Writing the page into the output directory.
+
+	def total(self) -> int:
+		return self.config + self.pypage + self.markdown + self.template + self.minify + self.write
+
+
+class Profiler:
+	"""Per-file timings for a build, keyed by each file's full path (relative to the content directory)."""
+
+	columns = ('config', 'pypage', 'markdown', 'template', 'minify', 'links', 'write')
+
+	def __init__(self) -> None:
+		self.timings: Dict[str, NodeTimings] = {}
+
+	def get(self, fullPath: str) -> NodeTimings:
+		if fullPath not in self.timings:
+			self.timings[fullPath] = NodeTimings()
+		return self.timings[fullPath]
+
+	def merge(self, timings: Dict[str, NodeTimings]) -> None:
+		for fullPath, nodeTimings in timings.items():
+			merged = self.get(fullPath)
+			for column in Profiler.columns:
+				setattr(merged, column, getattr(merged, column) + getattr(nodeTimings, column))
+
+	def slowest(self, count: int) -> Dict[str, NodeTimings]:
+		ranked = sorted(self.timings.items(), key=lambda item: item[1].total(), reverse=True)
+		return dict(ranked[:count])
+
+	def table(self, count: int) -> str:
+		header = f'  {"total":>9}' + ''.join(f' {column:>9}' for column in Profiler.columns) + '  file'
+		rows = [
+			f'  {nodeTimings.total() / 10**6:9.2f}'
+			+ ''.join(f' {getattr(nodeTimings, column) / 10**6:9.2f}' for column in Profiler.columns)
+			+ f'  {fullPath}'
+			for fullPath, nodeTimings in self.slowest(count).items()
+		]
+		return '\n'.join([header] + rows)
+
+	def writeJson(self, filePath: str) -> None:
+		"""Write all timings (in milliseconds), sorted by file path, so that reports of different builds can be diffed."""
+		report = {
+			fullPath: {column: round(ns / 10**6, 3) for column, ns in asdict(nodeTimings).items()}
+			| {'total': round(nodeTimings.total() / 10**6, 3)}
+			for fullPath, nodeTimings in sorted(self.timings.items())
+		}
+		with open(filePath, 'w', encoding='utf-8') as reportFile:
+			json.dump(report, reportFile, indent=2)
+			reportFile.write('\n')
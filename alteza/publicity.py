@@ -0,0 +1,65 @@
+import itertools
+from typing import Iterable, List, Set
+
+from .fs import FsNode, FileNode, DirNode
+from .crawl import NameRegistry, pr
+from .util import PublicNodeCounts, StopWatch
+
+
+def tracePublic(rootDir: DirNode, nameRegistry: NameRegistry, publicNodeCounts: PublicNodeCounts) -> None:
+	"""Make all nodes reachable from public nodes public. (Called after processing.)"""
+	with StopWatch() as sw:
+		if '/' in nameRegistry.allFiles:
+			# Always make the root (/) level index page public, if it exists.
+			rootIndex = nameRegistry.allFiles['/']
+			rootIndex.makePublic()
+
+		# Gather the initially public nodes, and the size of the link graph:
+		publicNodes: List[FsNode] = []
+		nodeCount, linkCount = 0, 0
+		dirWorklist: List[DirNode] = [rootDir]
+		while dirWorklist:
+			dirNode = dirWorklist.pop()
+			for fsNode in itertools.chain((dirNode,), dirNode.files):
+				nodeCount += 1
+				linkCount += len(fsNode.linksTo)
+				if fsNode.shouldPublish:
+					publicNodes.append(fsNode)
+			dirWorklist.extend(reversed(dirNode.subDirs))
+
+		pr('\nInitial pre-reachability public files:')
+		for node in filter(lambda pNode: isinstance(pNode, FileNode), publicNodes):
+			pr('/' + node.fullPath)
+		pr()
+
+		pr('Marking all reachable nodes as public...')
+		seen: Set[FsNode] = set(publicNodes)
+		worklist: List[FsNode] = list(publicNodes)
+		while worklist:
+			fsNode = worklist.pop()
+			fsNode.makePublic()
+			for linkedToNode in fsNode.linksTo:
+				if linkedToNode not in seen:
+					seen.add(linkedToNode)
+					worklist.append(linkedToNode)
+
+	pr(f'{publicNodeCounts.total()} reachable public nodes.')
+	pr(
+		f'Traced reachability over {nodeCount} nodes and {linkCount} links'
+		f' (from {len(publicNodes)} initially public nodes) in {sw.t / 10**6:.2f} ms.\n'
+	)
+
+
+def resetPublicity(rootDir: DirNode, publicNodeCounts: PublicNodeCounts, publicNodes: Iterable[FsNode]) -> None:
+	"""Make all nodes private again, except for `publicNodes` (so that reachability can be traced afresh)."""
+	worklist: List[DirNode] = [rootDir]
+	while worklist:
+		dirNode = worklist.pop()
+		dirNode.shouldPublish = False
+		for fileNode in dirNode.files:
+			fileNode.shouldPublish = False
+		worklist.extend(dirNode.subDirs)
+	publicNodeCounts.fileCount = 0
+	publicNodeCounts.dirCount = 0
+	for fsNode in publicNodes:
+		fsNode.makePublic()
@@ -0,0 +1,166 @@
+import html
+import json
+import posixpath
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .cache import DiskCache, hashText
+from .fs import Md, NonMd, PyPageNode
+from .output import OutputWriter
+from .util import StopWatch
+
+# The version of the way pages are indexed (which is part of the keys of cached term counts):
+indexingVersion: str = '1'
+shardPrefixLength: int = 2  # Terms are sharded by their first characters.
+maxTermLength: int = 40
+
+mainPattern: re.Pattern[str] = re.compile(r'<main\b[^>]*>(.*)</main\s*>', re.IGNORECASE | re.DOTALL)
+titlePattern: re.Pattern[str] = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+unindexedPattern: re.Pattern[str] = re.compile(
+	r'<!--.*?-->|<(head|script|style|template|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL
+)
+tagPattern: re.Pattern[str] = re.compile(r'<[^>]*>')
+termPattern: re.Pattern[str] = re.compile(r'\w{2,}')
+
+
+def pageText(pageHtml: str) -> str:
+	"""The text of a page (only of its `main` element, if it has one, to leave out headers, navigation, etc)."""
+	main = mainPattern.search(pageHtml)
+	if main is not None:
+		pageHtml = main.group(1)
+	return html.unescape(tagPattern.sub(' ', unindexedPattern.sub(' ', pageHtml)))
+
+
+def countTerms(text: str) -> Dict[str, int]:
+	return dict(Counter(term for term in termPattern.findall(text.lower()) if len(term) <= maxTermLength))
+
+
+def shardFileName(prefix: str) -> str:
+	# Prefixes that are not plain ASCII letters & digits are hex-encoded, to keep file names portable:
+	if prefix.isascii() and prefix.isalnum():
+		return f'{prefix}.json'
+	return f'x{prefix.encode("utf-8").hex()}.json'
+
+
+def pageUrl(pyPageNode: PyPageNode, dirPath: str) -> str:
+	"""The URL of a page, relative to the root of the site (see `Driver.generateMd` & `Driver.generateNonMd`)."""
+	dirUrl = dirPath.replace('\\', '/')
+	if isinstance(pyPageNode, Md):
+		url = dirUrl if pyPageNode.isIndex else posixpath.join(dirUrl, pyPageNode.realName)
+		return url + '/' if url else ''
+	assert isinstance(pyPageNode, NonMd)
+	return posixpath.join(dirUrl, pyPageNode.rectifiedFileName)
+
+
+def isHtmlPage(pyPageNode: PyPageNode) -> bool:
+	return isinstance(pyPageNode, Md) or (
+		isinstance(pyPageNode, NonMd) and pyPageNode.rectifiedFileName.endswith(('.html', '.htm'))
+	)
+
+
+@dataclass
+class IndexedPage:
+	url: str
+	title: str
+	termCounts: Dict[str, int]
+
+
+class SearchIndex(DiskCache):
+	"""
+	A client-side search index of the public HTML pages of a site: an inverted index (mapping each term to the pages
+	it occurs in, and how many times), sharded by the first characters of terms, so that a browser only needs to load
+	the shards of the terms being searched for. The term counts of each page are kept (in memory, and in the cache
+	directory, if one is given), keyed by the hash of the page's output, so unchanged pages are not re-indexed.
+	"""
+
+	def __init__(self, cacheDir: Optional[str]) -> None:
+		super().__init__(cacheDir, 'search')
+		self.memory: Dict[str, Dict[str, int]] = {}  # Term counts, by key (see `add`).
+		self.pages: List[IndexedPage] = []  # The pages indexed in the current build.
+		self.keys: List[str] = []  # The keys of the term counts of those pages.
+		self.timeNs: int = 0
+
+	def begin(self) -> None:
+		"""Start indexing the pages of a new build."""
+		self.pages, self.keys = [], []
+		self.hits, self.misses, self.timeNs = 0, 0, 0
+
+	def add(self, pyPageNode: PyPageNode, dirPath: str) -> None:
+		"""Index a page that was just written (unless it is not HTML, or sets `searchable = False`)."""
+		if not isHtmlPage(pyPageNode) or pyPageNode.env.get('searchable', True) is False:
+			return
+		with StopWatch() as sw:
+			pageHtml = pyPageNode.output
+			key = hashText(indexingVersion, pageHtml)
+			termCounts = self.memory.get(key)
+			if termCounts is None:
+				storedTermCounts = self.get(key)
+				if isinstance(storedTermCounts, dict):
+					termCounts = self.memory[key] = storedTermCounts
+			if termCounts is None:
+				self.misses += 1
+				termCounts = self.memory[key] = countTerms(pageText(pageHtml))
+				self.put(key, termCounts)
+			else:
+				self.hits += 1
+			if 'title' in pyPageNode.env:
+				title = str(pyPageNode.title)
+			else:
+				htmlTitle = titlePattern.search(pageHtml)
+				title = html.unescape(htmlTitle.group(1)).strip() if htmlTitle is not None else pyPageNode.realName
+			self.pages.append(IndexedPage(pageUrl(pyPageNode, dirPath), title, termCounts))
+			self.keys.append(key)
+		self.timeNs += sw.t
+
+	@staticmethod
+	def makeShards(pages: List[IndexedPage]) -> Dict[str, Dict[str, List[int]]]:
+		"""Postings (i.e. flat lists of document index & number of occurrences pairs) of each term, by shard prefix."""
+		shards: Dict[str, Dict[str, List[int]]] = {}
+		for docId, page in enumerate(pages):
+			for term, count in page.termCounts.items():
+				shards.setdefault(term[:shardPrefixLength], {}).setdefault(term, []).extend((docId, count))
+		return shards
+
+	@staticmethod
+	def makeDirs(writer: OutputWriter, indexDir: str) -> str:
+		dirPath = ''
+		for dirName in indexDir.strip('/').split('/'):
+			dirPath = f'{dirPath}/{dirName}' if dirPath else dirName
+			if not writer.exists(dirPath):
+				writer.makeDir(dirPath)
+		return dirPath
+
+	def write(self, writer: OutputWriter, indexDir: str) -> str:
+		"""Write the index of the pages added in this build into `indexDir`, and return a summary."""
+		with StopWatch() as sw:
+			pages = sorted(self.pages, key=lambda page: page.url)  # Sorted, so that the index is deterministic.
+			shards = self.makeShards(pages)
+			dirPath = self.makeDirs(writer, indexDir)
+
+			def writeJson(fileName: str, value: object) -> None:
+				relPath = f'{dirPath}/{fileName}'
+				writer.writeText(relPath, json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+				writer.precompress(relPath)
+
+			writeJson(
+				'index.json',
+				{
+					'version': 1,
+					'prefixLength': shardPrefixLength,
+					# Each document is a [url, title, number of terms] triple. URLs are relative to the site's root.
+					'docs': [[page.url, page.title, sum(page.termCounts.values())] for page in pages],
+					'shards': {prefix: shardFileName(prefix) for prefix in sorted(shards)},
+				},
+			)
+			for prefix, postings in shards.items():
+				writeJson(shardFileName(prefix), dict(sorted(postings.items())))
+
+		# Only the term counts of this build's pages are kept in memory (for the next build, in --watch mode):
+		self.memory = {key: self.memory[key] for key in self.keys}
+		termCount = sum(len(postings) for postings in shards.values())
+		return (
+			f'Indexed {len(pages)} pages for search ({self.hits} of them unchanged), with {termCount} terms in'
+			f' {len(shards)} shards. Took {(self.timeNs + sw.t) / 10**6:.2f} ms.'
+		)
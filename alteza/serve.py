@@ -0,0 +1,194 @@
+import asyncio
+import mimetypes
+import posixpath
+import re
+import threading
+import urllib.parse
+from concurrent.futures import Future
+from typing import Any, Coroutine, Dict, Optional, Set, Tuple
+
+from .output import ServedFile
+from .util import AltezaException
+
+# Pages subscribe to reload notifications (sent as server-sent events) at this path:
+eventsPath: str = '/__alteza__/events'
+
+reloadScript: bytes = (
+	f"<script>new EventSource('{eventsPath}').addEventListener('reload', () => location.reload());</script>\n"
+).encode('utf-8')
+
+bodyEndPattern: re.Pattern[bytes] = re.compile(rb'</body\s*>', re.IGNORECASE)
+
+
+def injectReloadScript(html: bytes) -> bytes:
+	matches = list(bodyEndPattern.finditer(html))
+	if not matches:
+		return html + reloadScript
+	position = matches[-1].start()
+	return html[:position] + reloadScript + html[position:]
+
+
+class DevServer:  # pylint: disable=too-many-instance-attributes
+	"""
+	A development web server (for `--serve`), which serves a site generated in memory (by `MemoryOutputWriter`).
+	It runs an asyncio event loop on a background thread. HTML pages get a script injected into them, which
+	reloads the page whenever a new build is published. Requests that arrive while a build is in progress are
+	held, and answered once the build is complete.
+	"""
+
+	def __init__(self, host: str, port: int) -> None:
+		self.host: str = host
+		self.port: int = port
+		self.files: Dict[str, ServedFile] = {}
+		self.dirs: Set[str] = set()
+		self.buildNumber: int = 0
+		self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+		self.thread: threading.Thread = threading.Thread(target=self.loop.run_forever, name='dev-server', daemon=True)
+		self.server: Optional[asyncio.AbstractServer] = None
+		# The following are only accessed from the event loop:
+		self.ready: asyncio.Event = asyncio.Event()  # Cleared while a build is in progress.
+		self.subscribers: Set['asyncio.Queue[Optional[int]]'] = set()  # Each gets build numbers (or `None` to end).
+		self.connections: Set['asyncio.Task[None]'] = set()  # Tasks handling open connections.
+
+	def runInLoop(self, coroutine: Coroutine[Any, Any, Any]) -> Any:
+		"""Run `coroutine` on the server's event loop, and wait for it to finish (from another thread)."""
+		future: 'Future[Any]' = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+		return future.result()
+
+	def start(self) -> 'DevServer':
+		self.thread.start()
+		try:
+			self.server = self.runInLoop(asyncio.start_server(self.handle, self.host, self.port))
+		except OSError as e:
+			raise AltezaException(f'Could not start the web server on {self.host}:{self.port}: {e}') from e
+		return self
+
+	async def shutdown(self) -> None:
+		if self.server is not None:
+			self.server.close()
+		# End the event streams, answer any held requests, and let open connections finish:
+		for queue in self.subscribers:
+			queue.put_nowait(None)
+		self.ready.set()
+		if self.connections:
+			await asyncio.wait(self.connections, timeout=1)
+
+	def stop(self) -> None:
+		self.runInLoop(self.shutdown())
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+		self.loop.close()
+
+	def url(self) -> str:
+		return f'http://{self.host}:{self.port}/'
+
+	async def holdRequests(self) -> None:
+		self.ready.clear()
+
+	async def releaseRequests(self) -> None:
+		self.ready.set()
+
+	async def replaceSite(self, files: Dict[str, ServedFile], dirs: Set[str]) -> None:
+		self.files, self.dirs = files, dirs
+		self.buildNumber += 1
+		for queue in self.subscribers:
+			queue.put_nowait(self.buildNumber)
+
+	def beginBuild(self) -> None:
+		"""Hold new requests until `endBuild` is called."""
+		self.runInLoop(self.holdRequests())
+
+	def publish(self, files: Dict[str, ServedFile], dirs: Set[str]) -> None:
+		"""Start serving a newly generated site, and tell open pages to reload."""
+		self.runInLoop(self.replaceSite(files, dirs))
+
+	def endBuild(self) -> None:
+		"""Answer held requests (with the latest published site, which is the previous one if the build failed)."""
+		self.runInLoop(self.releaseRequests())
+
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		task = asyncio.current_task()
+		assert task is not None
+		self.connections.add(task)
+		try:
+			requestLine = (await reader.readline()).decode('latin-1').split()
+			while (await reader.readline()).strip():
+				pass  # Request headers are not used.
+			if len(requestLine) < 2 or requestLine[0] not in ('GET', 'HEAD'):
+				await self.respond(writer, '405 Method Not Allowed', b'Only GET and HEAD requests are supported.\n')
+				return
+			path = urllib.parse.unquote(urllib.parse.urlsplit(requestLine[1]).path)
+			if path == eventsPath:
+				await self.streamEvents(writer)
+				return
+			await self.ready.wait()
+			await self.serve(writer, path, headOnly=requestLine[0] == 'HEAD')
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+			self.connections.discard(task)
+
+	def resolve(self, path: str) -> Tuple[Optional[str], Optional[ServedFile]]:
+		"""Returns the path to redirect to (if any), and the file at `path` (if any)."""
+		relPath = posixpath.normpath(path).lstrip('/')
+		if relPath == '.':
+			relPath = ''
+		if relPath in self.dirs:
+			if relPath != '' and not path.endswith('/'):
+				return path + '/', None
+			relPath = posixpath.join(relPath, 'index.html')
+		return None, self.files.get(relPath)
+
+	async def serve(self, writer: asyncio.StreamWriter, path: str, headOnly: bool) -> None:
+		redirect, servedFile = self.resolve(path)
+		if redirect is not None:
+			await self.respond(writer, '301 Moved Permanently', b'', {'Location': urllib.parse.quote(redirect)})
+			return
+		if servedFile is None:
+			await self.respond(writer, '404 Not Found', f'{path} was not found.\n'.encode('utf-8'))
+			return
+		body = await asyncio.to_thread(servedFile.read)
+		contentType = mimetypes.guess_type(path if not path.endswith('/') else 'index.html')[0]
+		if contentType is None:
+			contentType = 'text/html' if posixpath.splitext(path)[1] == '' else 'application/octet-stream'
+		if contentType == 'text/html':
+			body = injectReloadScript(body)
+		if contentType.startswith('text/'):
+			contentType += '; charset=utf-8'
+		await self.respond(writer, '200 OK', body, {'Content-Type': contentType}, headOnly)
+
+	@staticmethod
+	async def respond(
+		writer: asyncio.StreamWriter,
+		status: str,
+		body: bytes,
+		headers: Optional[Dict[str, str]] = None,
+		headOnly: bool = False,
+	) -> None:
+		allHeaders = {'Content-Length': str(len(body)), 'Cache-Control': 'no-store', 'Connection': 'close'}
+		allHeaders.update(headers or {})
+		head = f'HTTP/1.1 {status}\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in allHeaders.items())
+		writer.write(head.encode('latin-1') + b'\r\n' + (b'' if headOnly else body))
+		await writer.drain()
+
+	async def streamEvents(self, writer: asyncio.StreamWriter) -> None:
+		writer.write(
+			b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n'
+			b'Connection: keep-alive\r\n\r\n'
+		)
+		await writer.drain()
+		queue: 'asyncio.Queue[Optional[int]]' = asyncio.Queue()
+		self.subscribers.add(queue)
+		try:
+			while True:
+				try:
+					buildNumber = await asyncio.wait_for(queue.get(), timeout=15)
+					if buildNumber is None:
+						return
+					writer.write(f'event: reload\ndata: {buildNumber}\n\n'.encode('utf-8'))
+				except asyncio.TimeoutError:
+					writer.write(b': keep-alive\n\n')  # Also detects closed connections.
+				await writer.drain()
+		finally:
+			self.subscribers.discard(queue)
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+
+class StagedFile:
+	"""A text that is being written (or has been written) to a file in the staging area, by a `Stager`."""
+
+	def __init__(self, path: str, future: 'Future[None]') -> None:
+		self.path: str = path
+		self.future: 'Future[None]' = future
+
+	def wait(self) -> str:
+		"""Wait for the file to be written, and return its path."""
+		self.future.result()
+		return self.path
+
+	def read(self) -> str:
+		with open(self.wait(), 'r', encoding='utf-8') as stagedFile:
+			return stagedFile.read()
+
+
+class Stager:
+	"""
+	Writes texts (i.e. the outputs of pages) to files in a staging directory, with a pool of writer threads, so that
+	the outputs do not have to be kept in memory, and so that disk I/O overlaps with processing. The staging directory
+	is created inside `parentDir`, which should be on the same file system as the output directory, so that staged
+	files can be hard-linked into place (see `OutputWriter.writeStaged`).
+	"""
+
+	def __init__(self, parentDir: str, threads: int) -> None:
+		self.threads: int = threads
+		self.stagingDir: str = tempfile.mkdtemp(prefix='.alteza-staging-', dir=parentDir)
+		self.pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='stager')
+		self.stagedFiles: Dict[str, StagedFile] = {}  # Maps a name to its latest staged file.
+		self.stagedCount: int = 0
+		self.stagedBytes: int = 0
+
+	@staticmethod
+	def write(path: str, data: bytes) -> None:
+		# The file is renamed into place, so that files previously hard-linked from the staging area are unaffected:
+		tmpPath = path + '.tmp'
+		with open(tmpPath, 'wb') as stagedFile:
+			stagedFile.write(data)
+		os.replace(tmpPath, path)
+
+	def stage(self, name: str, text: str) -> StagedFile:
+		previous = self.stagedFiles.get(name)
+		if previous is not None:
+			previous.wait()  # Never write the same file from two threads at once.
+			path = previous.path
+		else:
+			path = os.path.join(self.stagingDir, f'{len(self.stagedFiles)}.staged')
+		data = text.encode('utf-8')
+		stagedFile = self.stagedFiles[name] = StagedFile(path, self.pool.submit(Stager.write, path, data))
+		self.stagedCount += 1
+		self.stagedBytes += len(data)
+		return stagedFile
+
+	def wait(self) -> None:
+		"""Wait for all staged files to be written (raising the first error encountered while writing, if any)."""
+		pending: List[StagedFile] = list(self.stagedFiles.values())
+		for stagedFile in pending:
+			stagedFile.wait()
+
+	def close(self) -> None:
+		self.pool.shutdown(wait=True, cancel_futures=True)
+		shutil.rmtree(self.stagingDir, ignore_errors=True)
@@ -0,0 +1,131 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pypage import PypageExec, exec_tree, parse  # type: ignore
+
+from .bytecode import CodeCache, LocatedExpression
+from .cache import hashText
+
+
+class TemplateCache:  # pylint: disable=too-few-public-methods
+	"""
+	Parsed PyPage templates (layouts, and files that are `inject`ed or `include`d), so that a template used by many
+	pages is parsed only once. Templates are keyed by name, and a cached template is only reused if the hash of
+	its content is unchanged.
+	"""
+
+	def __init__(self) -> None:
+		self.trees: Dict[str, Tuple[str, Any]] = {}  # Maps a template name to its content hash & parse tree.
+		self.hits: int = 0
+		self.misses: int = 0
+
+	def parse(self, name: str, source: str) -> Any:
+		contentHash = hashText(source)
+		if name in self.trees and self.trees[name][0] == contentHash:
+			self.hits += 1
+			return self.trees[name][1]
+		self.misses += 1
+		tree = locateExpressions(parse(source), name)
+		self.trees[name] = (contentHash, tree)
+		return tree
+
+
+def locateExpressions(tree: Any, fileName: str) -> Any:
+	"""Record the file & line of the expression of each block tag (e.g. `{% for ... %}`) in a PyPage parse tree."""
+	worklist: List[Any] = [tree]
+	while worklist:
+		node = worklist.pop()
+		for attribute in ('expr', 'genexpr'):  # The expressions evaluated by `if`/`elif`/`while`, and by `for`.
+			expression = getattr(node, attribute, None)
+			if isinstance(expression, str) and not isinstance(expression, LocatedExpression):
+				setattr(node, attribute, LocatedExpression(expression, fileName, node.loc[0]))
+		worklist.extend(getattr(node, 'children', []))
+		if getattr(node, 'continuation', None) is not None:
+			worklist.append(node.continuation)  # An `elif` or `else`, following an `if`.
+	return tree
+
+
+class TemplateExec(PypageExec):  # type: ignore
+	"""
+	Executes a PyPage parse tree like `PypageExec` does, except that the `inject` and `include` functions use a
+	`TemplateCache`, that `include` can be given the name of a partial (in the name registry), and that code is
+	compiled with a `CodeCache` (as being from `fileName`, at the lines it is at).
+	"""
+
+	# pylint: disable=too-many-arguments, too-many-positional-arguments
+	def __init__(
+		self,
+		env: Dict[str, Any],
+		templateCache: TemplateCache,
+		resolvePartial: Callable[[str], Optional[str]],  # Maps a name to a file path, or `None` if it is not a name.
+		codeCache: CodeCache,
+		fileName: str,
+	) -> None:
+		super().__init__(env)
+		self.templateCache: TemplateCache = templateCache
+		self.resolvePartial: Callable[[str], Optional[str]] = resolvePartial
+		self.codeCache: CodeCache = codeCache
+		self.fileName: str = fileName
+		self.lineNumber: int = 1  # The line of the code tag being run.
+
+	def run(self, code: str, loc: Tuple[int, int]) -> str:
+		self.lineNumber = loc[0]
+		if '\n' in code:
+			return super().run(code, loc)  # Which runs the code with `_exec`.
+		# Like `PypageExec.run` does with single-line code, except that the expression is evaluated with `raw_eval`:
+		self.output = ''  # pylint: disable=attribute-defined-outside-init
+		result = self.raw_eval(code)
+		return str(result) if result else self.output
+
+	def _exec(self, code: str) -> None:
+		exec(self.codeCache.compile(code, self.fileName, 'exec', self.lineNumber), self.env)
+
+	def raw_eval(self, code: str) -> Any:
+		# pylint: disable=eval-used
+		if isinstance(code, LocatedExpression):  # The expression of a block tag.
+			return eval(self.codeCache.compile(code, code.fileName, 'eval', code.lineNumber), self.env)
+		return eval(self.codeCache.compile(code, self.fileName, 'eval', self.lineNumber), self.env)
+
+	def inject(self, filepath: str) -> None:
+		self.output += self.runFile(filepath)
+
+	def include(self, filepath: str) -> None:
+		partialPath = self.resolvePartial(filepath)
+		if partialPath is None:
+			super().include(filepath)  # Include the raw contents of the file at `filepath`.
+		else:
+			self.output += self.runFile(partialPath)
+
+	def runFile(self, filepath: str) -> str:
+		with open(filepath, 'r', encoding='utf-8') as templateFile:
+			source = templateFile.read()
+		# Like PyPage's own `inject`, the file is executed in (and can modify) the current environment:
+		output = runPyPage(
+			source, self.env, self.templateCache, self.resolvePartial, self.codeCache, os.path.abspath(filepath)
+		)
+		# Running the file re-bound `write`, `inject`, etc. in the environment to another `TemplateExec`. Restore them:
+		self.env |= {'write': self.write, 'inject': self.inject, 'include': self.include, 'exists': self.exists}
+		return output
+
+
+def runPyPage(
+	# pylint: disable=too-many-arguments, too-many-positional-arguments
+	source: str,
+	env: Dict[str, Any],
+	templateCache: TemplateCache,
+	resolvePartial: Callable[[str], Optional[str]],
+	codeCache: CodeCache,
+	templateName: Optional[str] = None,
+	fileName: Optional[str] = None,
+) -> str:
+	"""
+	Run PyPage on `source`. If a `templateName` is given, its parse tree is cached (or taken from the cache). Code in
+	`source` is compiled as being from `fileName` (which defaults to `templateName`), so tracebacks point at it.
+	"""
+	fileName = fileName or templateName or '<pypage>'
+	tree = (
+		locateExpressions(parse(source), fileName)
+		if templateName is None
+		else templateCache.parse(templateName, source)
+	)
+	return exec_tree(tree, TemplateExec(env, templateCache, resolvePartial, codeCache, fileName))
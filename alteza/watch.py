@@ -0,0 +1,37 @@
+import os
+import time
+from typing import Optional, Set
+
+from watchdog.events import FileSystemEventHandler, FileSystemEvent, DirModifiedEvent, EVENT_TYPE_OPENED
+
+from .crawl import CrawlConfig, isHidden
+
+
+class WatchdogEventHandler(FileSystemEventHandler):
+	def __init__(self, contentDir: str) -> None:
+		self.contentDirAbsPath: str = os.path.abspath(contentDir)
+		self.timeOfMostRecentEvent: Optional[int] = None
+		self.pathsOfChangedFiles: Set[str] = set()
+		# Whether files or directories were created, deleted or moved (which requires a full rebuild):
+		self.structureChanged: bool = False
+
+	def on_any_event(self, event: FileSystemEvent) -> None:
+		if event.event_type == EVENT_TYPE_OPENED:
+			return  # Files merely being read (e.g. by Alteza itself) is not a change.
+		for eventPath in filter(None, (event.src_path, event.dest_path)):
+			relPath = os.path.relpath(eventPath, self.contentDirAbsPath)
+			if CrawlConfig.ignoreRules.matchesPathOrAncestor(relPath, event.is_directory):
+				return
+		if '__pycache__' in event.src_path or '__pycache__' in event.dest_path:
+			return
+		if isHidden(os.path.basename(os.path.normpath(event.src_path))):
+			return
+		if isinstance(event, DirModifiedEvent) and event.src_path == self.contentDirAbsPath:
+			return
+
+		if event.event_type in ('created', 'deleted', 'moved'):
+			self.structureChanged = True
+		changedPath = event.src_path or event.dest_path
+		if not os.path.isdir(changedPath):
+			self.pathsOfChangedFiles.add(os.path.abspath(changedPath))
+		self.timeOfMostRecentEvent = max(self.timeOfMostRecentEvent or 0, time.time_ns())
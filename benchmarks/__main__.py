@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import sys
+import tempfile
+from typing import List, Optional
+
+from tap import Tap
+
+from .suite import compareResults, readResults, runSuite, writeResults
+from .synthetic import SiteSpec
+
+
+class BenchmarkArgs(Tap):  # pyre-ignore[13]
+	scales: List[int] = [100, 1000]  # Numbers of pages of the synthetic sites to benchmark.
+	depth: int = 4  # Maximum directory depth.
+	pages_per_dir: int = 20  # Average number of pages per directory.
+	link_density: int = 5  # Links from each page to other pages.
+	config_nesting: int = 2  # Directories up to this depth have their own config file.
+	templates: int = 3  # Number of layout templates.
+	assets: int = 0  # Number of static assets, per 100 pages.
+	asset_kb: int = 16  # Size of each static asset.
+	git_commits: int = 0  # Commit each synthetic site into a git repository, with this many commits (0 for no git).
+	repeat: int = 3  # Number of builds at each scale.
+	cold: bool = False  # Clear persistent caches & indexes before each build.
+	alteza_args: List[str] = []  # Extra arguments for Alteza (e.g. `--jobs 4`), passed as a single quoted string each.
+	output: Optional[str] = None  # Write the results (as JSON) to this file.
+	baseline: Optional[str] = None  # Compare the results against the results stored in this file.
+	threshold: float = 0.2  # Flag phases that are slower than the baseline by more than this fraction...
+	noise_floor_ms: float = 5.0  # ...and by more than this many milliseconds.
+	work_dir: Optional[str] = None  # Directory to generate the sites in (a temporary directory by default).
+
+	def specs(self) -> List[SiteSpec]:
+		return [
+			SiteSpec(
+				pages=pages,
+				depth=self.depth,
+				pagesPerDir=self.pages_per_dir,
+				linkDensity=self.link_density,
+				configNesting=self.config_nesting,
+				templates=self.templates,
+				assets=pages * self.assets // 100,
+				assetKb=self.asset_kb,
+				gitCommits=self.git_commits,
+			)
+			for pages in self.scales
+		]
+
+
+def main() -> int:
+	args = BenchmarkArgs().parse_args()
+	altezaArgs = [arg for altezaArg in args.alteza_args for arg in altezaArg.split()]
+	workDir = args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix='alteza-benchmark-')
+	try:
+		results = runSuite(args.specs(), workDir, altezaArgs, args.repeat, args.cold)
+	finally:
+		if args.work_dir is None:
+			shutil.rmtree(workDir, ignore_errors=True)
+
+	if args.output is not None:
+		writeResults(results, args.output)
+		print(f'Wrote the results to {os.path.abspath(args.output)}.')
+	if args.baseline is not None:
+		regressions = compareResults(readResults(args.baseline), results, args.threshold, args.noise_floor_ms)
+		print(f'{regressions} regression(s) found.')
+		return 1 if regressions > 0 else 0
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,155 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess  # nosec B404
+import sys
+from dataclasses import asdict
+from typing import Any, Dict, List
+
+import alteza
+from alteza.content import Args
+from alteza.driver import Driver
+from alteza.util import AltezaException
+from alteza.version import version as alteza_version
+
+from .synthetic import SiteSpec, generateSite
+
+# Bumped whenever the structure of the results (see `runSuite`) changes:
+resultsFormat: int = 2
+
+
+def runBuild(contentDir: str, outputDir: str, altezaArgs: List[str]) -> Dict[str, float]:
+	"""Build the site at `contentDir` (in this process), and return the time taken by each phase (in ms)."""
+	args = Args().parse_args(['--content', contentDir, '--output', outputDir, '--clear_output_dir'] + altezaArgs)
+	driver = Driver(args)
+	log = io.StringIO()
+	with contextlib.redirect_stdout(log):
+		result = driver.makeSite()
+	if result != 0:
+		print(log.getvalue())
+		raise AltezaException(f'The benchmark build of {contentDir} failed.')
+	return driver.phaseTimes
+
+
+def measureImportTime() -> float:
+	"""Time how long a fresh Python process takes to import Alteza (which is most of its startup time), in ms."""
+	code = 'import time; t = time.perf_counter(); import alteza.driver; print((time.perf_counter() - t) * 1000)'
+	# The working directory is where the `alteza` package being benchmarked is (so that it is the one imported):
+	packageParentDir = os.path.dirname(os.path.dirname(os.path.abspath(alteza.__file__)))
+	completed = subprocess.run(  # nosec B603
+		[sys.executable, '-c', code], cwd=packageParentDir, capture_output=True, text=True, check=True
+	)
+	return float(completed.stdout.strip())
+
+
+def clearPersistentState(contentDir: str, cacheDir: str) -> None:
+	"""Delete the state kept across builds (caches & the git commit date index), so that the next build is cold."""
+	shutil.rmtree(cacheDir, ignore_errors=True)
+	shutil.rmtree(os.path.join(contentDir, '.git', 'alteza'), ignore_errors=True)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+	return {
+		'min': round(min(samples), 3),
+		'median': round(statistics.median(samples), 3),
+		'max': round(max(samples), 3),
+	}
+
+
+def runScale(spec: SiteSpec, workDir: str, altezaArgs: List[str], repeat: int, cold: bool) -> Dict[str, Any]:
+	contentDir = os.path.join(workDir, f'content-{spec.pages}')
+	outputDir = os.path.join(workDir, f'output-{spec.pages}')
+	cacheDir = os.path.join(workDir, f'cache-{spec.pages}')
+	shutil.rmtree(contentDir, ignore_errors=True)
+	fileCount = generateSite(spec, contentDir)
+
+	samples: Dict[str, List[float]] = {}
+	for _ in range(repeat):
+		if cold:
+			clearPersistentState(contentDir, cacheDir)
+		for phase, elapsedMilliseconds in runBuild(
+			contentDir, outputDir, altezaArgs + ['--cache_dir', cacheDir]
+		).items():
+			samples.setdefault(phase, []).append(elapsedMilliseconds)
+
+	return {
+		'spec': asdict(spec),
+		'files': fileCount,
+		'phases': {phase: summarize(phaseSamples) for phase, phaseSamples in samples.items()},
+	}
+
+
+def runSuite(specs: List[SiteSpec], workDir: str, altezaArgs: List[str], repeat: int, cold: bool) -> Dict[str, Any]:
+	importTimes = summarize([measureImportTime() for _ in range(max(repeat, 5))])
+	print(f'Importing Alteza took {importTimes["median"]:.2f} ms (median; min {importTimes["min"]:.2f} ms).')
+	results: Dict[str, Any] = {}
+	for spec in specs:
+		print(f'Benchmarking a site with {spec.pages} pages...', flush=True)
+		results[str(spec.pages)] = runScale(spec, workDir, altezaArgs, repeat, cold)
+		for phase, times in results[str(spec.pages)]['phases'].items():
+			print(f'  {phase:>10}: {times["median"]:10.2f} ms (median of {repeat}; min {times["min"]:.2f} ms)')
+	return {
+		'format': resultsFormat,
+		'alteza': alteza_version,
+		'python': f'{platform.python_implementation()} {platform.python_version()}',
+		'altezaArgs': altezaArgs,
+		'repeat': repeat,
+		'cold': cold,
+		'importTime': importTimes,
+		'results': results,
+	}
+
+
+def writeResults(results: Dict[str, Any], filePath: str) -> None:
+	with open(filePath, 'w', encoding='utf-8') as resultsFile:
+		json.dump(results, resultsFile, indent=2, sort_keys=True)
+		resultsFile.write('\n')
+
+
+def readResults(filePath: str) -> Dict[str, Any]:
+	with open(filePath, 'r', encoding='utf-8') as resultsFile:
+		results: Dict[str, Any] = json.load(resultsFile)
+	if results.get('format') != resultsFormat:
+		raise AltezaException(f'{filePath} is not in the current benchmark results format ({resultsFormat}).')
+	return results
+
+
+def compareResults(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, noiseFloorMs: float) -> int:
+	"""
+	Compare the median time of each phase at each scale against a baseline, and print the comparison. A phase has
+	regressed if it is slower by more than `threshold` (a fraction), and by more than `noiseFloorMs`.
+	Returns the number of regressions.
+	"""
+	regressions = 0
+	before, after = baseline['importTime']['median'], current['importTime']['median']
+	if after - before > noiseFloorMs and (after - before) / before > threshold:
+		print(f'Importing Alteza: {before:.2f} ms -> {after:.2f} ms  <-- REGRESSION')
+		regressions += 1
+	else:
+		print(f'Importing Alteza: {before:.2f} ms -> {after:.2f} ms')
+	for scale, result in current['results'].items():
+		baselineResult = baseline['results'].get(scale)
+		if baselineResult is None:
+			print(f'Scale {scale}: not in the baseline.')
+			continue
+		if baselineResult['spec'] != result['spec']:
+			print(f'Scale {scale}: the site spec differs from the baseline, so it is not compared.')
+			continue
+		print(f'Scale {scale}:')
+		for phase, times in result['phases'].items():
+			if phase not in baselineResult['phases']:
+				continue
+			before, after = baselineResult['phases'][phase]['median'], times['median']
+			change = (after - before) / before if before > 0 else 0.0
+			verdict = ''
+			if after - before > noiseFloorMs and change > threshold:
+				verdict = '  <-- REGRESSION'
+				regressions += 1
+			elif before - after > noiseFloorMs and -change > threshold:
+				verdict = '  (improved)'
+			print(f'  {phase:>10}: {before:10.2f} ms -> {after:10.2f} ms ({change:+.1%}){verdict}')
+	return regressions
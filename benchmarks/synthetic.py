@@ -0,0 +1,183 @@
+import os
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import pygit2  # type: ignore
+
+# pylint: disable=no-member
+
+words: Tuple[str, ...] = tuple(
+	(
+		'alteza static site generator page markdown template layout config directory asset link index python render '
+		'build output content crawl name registry turtle squirrel lizard kitten section article note draft idea'
+	).split()
+)
+
+
+@dataclass
+class SiteSpec:  # pylint: disable=too-many-instance-attributes
+	"""The shape of a synthetic content directory (see `generateSite`)."""
+
+	pages: int  # Number of (non-index) Markdown pages.
+	depth: int = 4  # Maximum depth of the directory tree.
+	pagesPerDir: int = 20  # Average number of pages in each directory.
+	linkDensity: int = 5  # Number of links (half of them wiki-links) from each page to other pages.
+	configNesting: int = 2  # Directories up to this depth have their own `__config__.py` file.
+	templates: int = 3  # Number of layout templates (which directory configs pick from).
+	assets: int = 0  # Number of static asset files (each linked to by one page).
+	assetKb: int = 16  # Size of each asset file.
+	codeBlockEvery: int = 4  # Every n-th page has a syntax-highlighted code block.
+	gitCommits: int = 0  # If non-zero, the content is committed into a new git repository with this many commits.
+
+
+def paragraph(rng: random.Random, wordCount: int) -> str:
+	return ' '.join(rng.choice(words) for _ in range(wordCount)).capitalize() + '.'
+
+
+def writeFile(root: str, relPath: str, data: str | bytes, writtenPaths: List[str]) -> None:
+	absPath = os.path.join(root, relPath)
+	os.makedirs(os.path.dirname(absPath), exist_ok=True)
+	if isinstance(data, str):
+		with open(absPath, 'w', encoding='utf-8') as someFile:
+			someFile.write(data)
+	else:
+		with open(absPath, 'wb') as someFile:
+			someFile.write(data)
+	writtenPaths.append(relPath)
+
+
+def generateDirTree(spec: SiteSpec, rng: random.Random) -> List[str]:
+	"""Returns the relative paths of the directories of the site ('' being the root), each parent before its children."""
+	dirPaths: List[str] = ['']
+	expandable: List[int] = [0]  # Indices (in `dirPaths`) of directories that are not at the maximum depth.
+	depths: List[int] = [0]
+	for i in range(1, max(1, spec.pages // spec.pagesPerDir)):
+		parent = rng.choice(expandable)
+		dirPaths.append(os.path.join(dirPaths[parent], f'section{i}'))
+		depths.append(depths[parent] + 1)
+		if depths[-1] < spec.depth:
+			expandable.append(i)
+	return dirPaths
+
+
+def generatePage(spec: SiteSpec, rng: random.Random, i: int, assetIndices: List[int]) -> str:
+	lines = [f'title: Page {i}', f'number: {i}', '---', '', f'Page {i}', '-------', '', paragraph(rng, 40), '']
+	for linkIndex in range(spec.linkDensity):
+		target = f'page{rng.randrange(spec.pages)}'
+		if linkIndex % 2 == 0:
+			lines.append(f'See [[{target}]].')
+		else:
+			lines.append(f'Read [{target}]({{{{ link("{target}") }}}}) too.')
+	lines += ['', paragraph(rng, 60), '']
+	for assetIndex in assetIndices:
+		lines.append(f'Download [asset {assetIndex}]({{{{ link("asset{assetIndex}") }}}}).')
+	if spec.codeBlockEvery > 0 and i % spec.codeBlockEvery == 0:
+		lines += ['', '    :::python', f'    def page{i}(x):', f'        return x * {i}  # {paragraph(rng, 6)}', '']
+	lines += ['', 'This page was last updated on {{ lastModified() }}.', '']
+	return '\n'.join(lines)
+
+
+indexPage: str = """title: {title}
+---
+{paragraph}
+
+<ul>
+{{{{
+for d in dir.subDirs:
+    if d.hasIndexPage:
+        write('<li><a href="%s">%s</a></li>' % (link(d), d.title))
+for p in dir.pages:
+    write('<li><a href="%s">%s</a></li>' % (link(p), p.title))
+}}}}
+</ul>
+"""
+
+layoutTemplate: str = """{{% capture body %}}
+{{{{ page.crumbs() }}}}
+<h1 class="layout{k}">{{{{ title if exists('title') else page.realName }}}}</h1>
+{{{{ content }}}}
+{{% endcapture %}}
+{{{{ inject(path('skeleton')) }}}}
+"""
+
+skeletonTemplate: str = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <title>{{ title if exists('title') else 'A page' }}</title>
+    <link rel="stylesheet" href="{{ link('site-style') }}">
+</head>
+<body>
+{{ body }}
+</body>
+</html>
+"""
+
+
+def commitToGit(root: str, paths: List[str], commitCount: int) -> None:
+	"""Commit `paths` into a new git repository at `root`, in `commitCount` commits (with deterministic dates)."""
+	repo = pygit2.init_repository(root)
+	index = repo.index  # type: ignore[attr-defined]
+	batchSize = -(-len(paths) // commitCount)
+	for commitIndex in range(commitCount):
+		for path in paths[commitIndex * batchSize : (commitIndex + 1) * batchSize]:
+			index.add(path)
+		index.write()
+		tree = index.write_tree()
+		signature = pygit2.Signature('Benchmark', 'benchmark@example.com', 1700000000 + commitIndex * 3600, 0)
+		parents = [] if repo.head_is_unborn else [repo.head.target]
+		repo.create_commit('HEAD', signature, signature, f'Commit {commitIndex}', tree, parents)
+
+
+def writeDirFiles(spec: SiteSpec, rng: random.Random, root: str, dirPaths: List[str], writtenPaths: List[str]) -> None:
+	"""Write the index page of every directory, and the config files of directories up to `spec.configNesting`."""
+	for dirIndex, dirPath in enumerate(dirPaths):
+		title = 'Home' if dirPath == '' else f'Section {dirIndex}'
+		writeFile(
+			root,
+			os.path.join(dirPath, 'index.md'),
+			indexPage.format(title=title, paragraph=paragraph(rng, 30)),
+			writtenPaths,
+		)
+		depth = 0 if dirPath == '' else dirPath.count(os.sep) + 1
+		if dirPath == '':
+			config = "layout = 'layout0'\npygments_style = 'sas'\ndir.title = 'Home'\n"
+		elif depth <= spec.configNesting:
+			config = f"layout = 'layout{rng.randrange(spec.templates)}'\nsection_number = {dirIndex}\n"
+		else:
+			continue
+		writeFile(root, os.path.join(dirPath, '__config__.py'), config, writtenPaths)
+
+
+def generateSite(spec: SiteSpec, root: str, seed: int = 0) -> int:
+	"""
+	Generate a synthetic content directory at `root` (which must not exist yet), and return the number of files
+	in it. The same spec & seed always produce the same content.
+	"""
+	rng = random.Random(seed)
+	os.makedirs(root)
+	writtenPaths: List[str] = []
+
+	dirPaths = generateDirTree(spec, rng)
+	writeDirFiles(spec, rng, root, dirPaths, writtenPaths)
+
+	assetsByPage: List[List[int]] = [[] for _ in range(spec.pages)]
+	for assetIndex in range(spec.assets):
+		assetsByPage[assetIndex % spec.pages].append(assetIndex)
+		writeFile(
+			root, os.path.join('assets', f'asset{assetIndex}.bin'), rng.randbytes(spec.assetKb * 1024), writtenPaths
+		)
+	writeFile(root, os.path.join('assets', 'site-style.css'), 'body { font-family: sans-serif; }\n', writtenPaths)
+
+	for k in range(spec.templates):
+		writeFile(root, os.path.join('templates', f'layout{k}.html'), layoutTemplate.format(k=k), writtenPaths)
+	writeFile(root, os.path.join('templates', 'skeleton.html'), skeletonTemplate, writtenPaths)
+
+	for i in range(spec.pages):
+		pagePath = os.path.join(rng.choice(dirPaths), f'page{i}.md')
+		writeFile(root, pagePath, generatePage(spec, rng, i, assetsByPage[i]), writtenPaths)
+
+	if spec.gitCommits > 0:
+		commitToGit(root, writtenPaths, spec.gitCommits)
+	return len(writtenPaths)
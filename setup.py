@@ -23,6 +23,12 @@ setup(
 		'tqdm >= 4.67.1',
 		'pygit2 >= 1.16.2',
 	],
+	extras_require={
+		# Optional dependencies, for optional features:
+		'images': ['Pillow >= 10.0.0'],  # For --responsive_images.
+		'compression': ['Brotli >= 1.0.0'],  # For .br copies with --precompress.
+		'zstd': ['zstandard >= 0.18.0'],  # For .tar.zst archives with --archive.
+	},
 	long_description=open('README.md').read(),
 	long_description_content_type='text/markdown',
 	url=repo_url,